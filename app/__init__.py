@@ -5,6 +5,7 @@
 а также инициализацию базы данных и CSRF-защиты.
 """
 
+import os
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_wtf.csrf import CSRFProtect
@@ -12,20 +13,68 @@ from flask_wtf.csrf import CSRFProtect
 db = SQLAlchemy()
 csrf = CSRFProtect()
 
-def create_app():
+def create_app(config_name=None, test_config=None):
     """
     Создает и настраивает приложение Flask.
 
+    Args:
+        config_name (str): Имя конфигурации из config.config ('development', 'production'
+            или 'testing'). По умолчанию берется из переменной окружения FLASK_CONFIG,
+            а если она не задана, используется 'development'.
+        test_config (dict): Параметры, которые заменяют значения конфигурации (для тестов).
+
     Returns:
         Flask: Настроенное приложение Flask.
     """
+    from config import config
+
     app = Flask(__name__)
-    app.config.from_object('config.DevelopmentConfig')
+    app.config.from_object(config[config_name or os.environ.get('FLASK_CONFIG', 'development')])
+    if test_config:
+        app.config.update(test_config)
+
+    if app.config['PROXY_FIX_X_FOR']:
+        from werkzeug.middleware.proxy_fix import ProxyFix
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['PROXY_FIX_X_FOR'], x_proto=1)
+
+    from .logs import init_logging
+    init_logging(app)
+
+    from .instrumentation import init_instrumentation
+    init_instrumentation(app)
 
     db.init_app(app)
     csrf.init_app(app)
 
+    from .sessions import init_sessions
+    init_sessions(app)
+
+    from .versions import shared_versions
+    shared_versions.init_app(app)
+
+    from .auth import login_throttle
+    login_throttle.init_app(app)
+
+    from .slots import slot_holds
+    slot_holds.init_app(app)
+
+    from .pdf import init_pdf
+    init_pdf(app)
+
+    from .pdf_jobs import pdf_jobs
+    pdf_jobs.init_app(app)
+
+    from .events import event_bus
+    event_bus.init_app(app)
+
     from .routes import main
     app.register_blueprint(main)
 
+    from .rollups import fold_stats_command, rebuild_stats_command
+    app.cli.add_command(rebuild_stats_command)
+    app.cli.add_command(fold_stats_command)
+
+    from .migrations import upgrade_db_command
+    app.cli.add_command(upgrade_db_command)
+
     return app
@@ -0,0 +1,391 @@
+"""
+Аутентификация пользователей.
+
+Этот файл содержит поиск учетной записи по email одним запросом сразу среди
+сотрудников и клиентов, хэширование паролей с параметрами из конфигурации
+(хэш, созданный с другими параметрами, пересчитывается при успешном входе),
+ограничение числа неудачных попыток входа (счетчики общие для рабочих
+процессов сервера), кэш профиля вошедшего пользователя, чтобы страницы не
+запрашивали его из базы на каждый запрос, и декоратор проверки роли для
+маршрутов, который сверяет роль с этим профилем. Изменение или удаление
+пользователя сбрасывает его профиль в кэшах всех рабочих процессов через
+общие версии (app/versions.py).
+"""
+
+from collections import deque, namedtuple
+from functools import lru_cache, wraps
+from threading import Lock
+import os
+import sqlite3
+import time
+from flask import current_app, g, redirect, session, url_for
+from sqlalchemy import literal_column, select, update
+from werkzeug.security import check_password_hash, generate_password_hash
+from .models import Client, Employee
+from .versions import shared_versions
+from . import db
+
+Identity = namedtuple('Identity', ['kind', 'id', 'password', 'role'])
+UserProfile = namedtuple('UserProfile', ['id', 'role', 'name', 'email', 'phone'])
+
+
+def hash_password(password):
+    """
+    Хэширует пароль с параметрами PASSWORD_HASH_METHOD.
+
+    :param password: Пароль (str).
+    :return: Хэш пароля (str).
+    """
+    return generate_password_hash(password, method=current_app.config['PASSWORD_HASH_METHOD'])
+
+
+@lru_cache(maxsize=8)
+def _hash_prefix(method):
+    return generate_password_hash('', method=method).split('$', 1)[0]
+
+
+def needs_rehash(password_hash):
+    """
+    Проверяет, создан ли хэш с параметрами, отличными от текущих.
+
+    :param password_hash: Сохраненный хэш пароля (str).
+    :return: True, если хэш нужно пересчитать (bool).
+    """
+    return password_hash.split('$', 1)[0] != _hash_prefix(current_app.config['PASSWORD_HASH_METHOD'])
+
+
+def find_identity(email):
+    """
+    Находит сотрудника или клиента по email одним запросом.
+
+    Если email есть в обеих таблицах, возвращается сотрудник.
+
+    :param email: Email (str).
+    :return: Объект Identity или None.
+    """
+    employees = select(
+        literal_column("'employee'").label('kind'), Employee.id, Employee.password, Employee.role
+    ).where(Employee.email == email)
+    clients = select(
+        literal_column("'client'"), Client.id, Client.password, literal_column("'client'")
+    ).where(Client.email == email)
+    rows = db.session.execute(employees.union_all(clients)).all()
+    rows.sort(key=lambda row: row[0].strip() != 'employee')
+    if not rows:
+        return None
+    kind, user_id, password, role = rows[0]
+    return Identity(kind.strip(), user_id, password, role.strip() if role else role)
+
+
+def authenticate(email, password):
+    """
+    Проверяет email и пароль и при необходимости пересчитывает хэш пароля.
+
+    :param email: Email (str).
+    :param password: Пароль (str).
+    :return: Объект Identity или None, если учетные данные неверны.
+    """
+    identity = find_identity(email)
+    if identity is None or not identity.password or not check_password_hash(identity.password, password):
+        return None
+    if needs_rehash(identity.password):
+        model = Employee if identity.kind == 'employee' else Client
+        db.session.execute(
+            update(model).where(model.id == identity.id).values(password=hash_password(password))
+        )
+        db.session.commit()
+    return identity
+
+
+class MemoryFailureStore:
+    """Неудачные попытки входа в памяти процесса."""
+
+    max_keys = 10000
+
+    def __init__(self):
+        self._failures = {}
+        self._lock = Lock()
+
+    def count(self, key, since):
+        """
+        Считает неудачи ключа начиная с момента since.
+
+        :param key: Ключ ('email:...' или 'ip:...').
+        :param since: Начало окна (timestamp).
+        :return: Число неудач (int).
+        """
+        with self._lock:
+            return len(self._recent(key, since)) if key in self._failures else 0
+
+    def add(self, key, failed_at, since):
+        """
+        Учитывает неудачу ключа.
+
+        :param key: Ключ.
+        :param failed_at: Время неудачи (timestamp).
+        :param since: Начало окна; более ранние неудачи можно забыть (timestamp).
+        """
+        with self._lock:
+            if len(self._failures) >= self.max_keys:
+                for existing in list(self._failures):
+                    if not self._recent(existing, since):
+                        del self._failures[existing]
+            self._recent(key, since).append(failed_at)
+
+    def clear(self, key):
+        """
+        Забывает неудачи ключа.
+
+        :param key: Ключ.
+        """
+        with self._lock:
+            self._failures.pop(key, None)
+
+    def _recent(self, key, since):
+        failures = self._failures.setdefault(key, deque())
+        while failures and failures[0] <= since:
+            failures.popleft()
+        return failures
+
+
+class SqliteFailureStore:
+    """
+    Неудачные попытки входа в файле SQLite, общем для рабочих процессов сервера.
+
+    Соединение открывается отдельно в каждом процессе.
+    """
+
+    cleanup_every = 1000
+
+    def __init__(self, path):
+        """
+        :param path: Путь к файлу базы (str).
+        """
+        self.path = path
+        self._connection = None
+        self._pid = None
+        self._lock = Lock()
+        self._adds = 0
+
+    def count(self, key, since):
+        """См. MemoryFailureStore.count."""
+        with self._lock:
+            return self._connect().execute(
+                'SELECT COUNT(*) FROM login_failures WHERE key = ? AND failed_at > ?', (key, since)
+            ).fetchone()[0]
+
+    def add(self, key, failed_at, since):
+        """См. MemoryFailureStore.add."""
+        with self._lock:
+            connection = self._connect()
+            connection.execute('INSERT INTO login_failures (key, failed_at) VALUES (?, ?)', (key, failed_at))
+            self._adds += 1
+            if self._adds % self.cleanup_every == 0:
+                connection.execute('DELETE FROM login_failures WHERE failed_at <= ?', (since,))
+
+    def clear(self, key):
+        """См. MemoryFailureStore.clear."""
+        with self._lock:
+            self._connect().execute('DELETE FROM login_failures WHERE key = ?', (key,))
+
+    def _connect(self):
+        if self._connection is None or self._pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('CREATE TABLE IF NOT EXISTS login_failures (key TEXT NOT NULL, failed_at REAL NOT NULL)')
+            connection.execute('CREATE INDEX IF NOT EXISTS ix_login_failures_key ON login_failures (key, failed_at)')
+            self._connection = connection
+            self._pid = os.getpid()
+        return self._connection
+
+
+class LoginThrottle:
+    """
+    Счетчик неудачных попыток входа в скользящем окне.
+
+    Попытки учитываются отдельно по email и по IP-адресу: вход отклоняется,
+    пока в окне LOGIN_FAILURE_WINDOW накоплено LOGIN_MAX_FAILURES неудач для
+    email или LOGIN_MAX_FAILURES_PER_IP неудач для IP-адреса. Хранилище
+    выбирается параметром LOGIN_THROTTLE_BACKEND: 'sqlite' (общий для
+    рабочих процессов файл LOGIN_THROTTLE_DB_PATH) или 'memory'.
+    """
+
+    def __init__(self):
+        self.store = MemoryFailureStore()
+
+    def init_app(self, app):
+        """
+        Выбирает хранилище неудачных попыток по настройке LOGIN_THROTTLE_BACKEND.
+
+        :param app: Приложение Flask.
+        """
+        if app.config['LOGIN_THROTTLE_BACKEND'] == 'sqlite':
+            self.store = SqliteFailureStore(app.config['LOGIN_THROTTLE_DB_PATH'])
+        else:
+            self.store = MemoryFailureStore()
+
+    def is_blocked(self, email, ip):
+        """
+        Проверяет, нужно ли отклонить попытку входа.
+
+        :param email: Email из формы входа (str).
+        :param ip: IP-адрес клиента (str).
+        :return: True, если вход нужно отклонить (bool).
+        """
+        since = self._window_start()
+        return (
+            self.store.count(_email_key(email), since) >= current_app.config['LOGIN_MAX_FAILURES']
+            or self.store.count(_ip_key(ip), since) >= current_app.config['LOGIN_MAX_FAILURES_PER_IP']
+        )
+
+    def fail(self, email, ip):
+        """
+        Учитывает неудачную попытку входа.
+
+        :param email: Email из формы входа (str).
+        :param ip: IP-адрес клиента (str).
+        """
+        now = time.time()
+        since = self._window_start(now)
+        for key in (_email_key(email), _ip_key(ip)):
+            self.store.add(key, now, since)
+
+    def reset(self, email):
+        """
+        Сбрасывает счетчик email после успешного входа.
+
+        :param email: Email из формы входа (str).
+        """
+        self.store.clear(_email_key(email))
+
+    def _window_start(self, now=None):
+        return (now or time.time()) - current_app.config['LOGIN_FAILURE_WINDOW']
+
+
+def _email_key(email):
+    return f'email:{email.lower()}'
+
+
+def _ip_key(ip):
+    return f'ip:{ip}'
+
+
+login_throttle = LoginThrottle()
+
+
+class UserCache:
+    """
+    Профили пользователей в памяти процесса со сроком жизни USER_CACHE_TTL.
+
+    Профиль из кэша используется, только пока не изменилась общая версия
+    пользователя, которую увеличивает invalidate в любом рабочем процессе.
+    """
+
+    max_size = 10000
+
+    def __init__(self):
+        self._profiles = {}
+        self._lock = Lock()
+
+    def get(self, role, user_id):
+        """
+        Возвращает профиль пользователя, загружая его из базы по истечении срока жизни.
+
+        :param role: Роль из сессии ('client', 'mechanic' или 'manager').
+        :param user_id: Идентификатор пользователя.
+        :return: Объект UserProfile или None, если пользователь не найден.
+        """
+        key = _user_key(role, user_id)
+        if key is None:
+            return None
+        version = shared_versions.get(_version_key(key))
+        now = time.monotonic()
+        with self._lock:
+            entry = self._profiles.get(key)
+        if entry and entry[0] > now and entry[1] == version:
+            profile = entry[2]
+            return profile if profile and profile.role == role else None
+        model = Employee if key[0] == 'employee' else Client
+        user = db.session.get(model, user_id)
+        profile = None
+        if user is not None:
+            user_role = (getattr(user, 'role', None) or 'client').strip()
+            profile = UserProfile(user.id, user_role, user.name, user.email, user.phone)
+        with self._lock:
+            if len(self._profiles) >= self.max_size:
+                self._profiles.clear()
+            self._profiles[key] = (now + current_app.config['USER_CACHE_TTL'], version, profile)
+        return profile if profile and profile.role == role else None
+
+    def invalidate(self, role, user_id):
+        """
+        Сбрасывает профиль пользователя в кэшах всех процессов после
+        фиксации изменения его данных.
+
+        :param role: Роль пользователя.
+        :param user_id: Идентификатор пользователя.
+        """
+        key = _user_key(role, user_id)
+        if key is None:
+            return
+        with self._lock:
+            self._profiles.pop(key, None)
+        shared_versions.bump(_version_key(key))
+
+
+def _user_key(role, user_id):
+    if user_id is None:
+        return None
+    if role == 'client':
+        return ('client', user_id)
+    if role in ('mechanic', 'manager'):
+        return ('employee', user_id)
+    return None
+
+
+def _version_key(key):
+    return f'user:{key[0]}:{key[1]}'
+
+
+user_cache = UserCache()
+
+
+def get_user_profile():
+    """
+    Возвращает профиль пользователя текущей сессии.
+
+    В пределах одного запроса профиль загружается не более одного раза.
+
+    :return: Объект UserProfile или None.
+    """
+    if 'user_profile' not in g:
+        g.user_profile = user_cache.get(session.get('role'), session.get('user_id'))
+    return g.user_profile
+
+
+def role_required(*roles, denied=None):
+    """
+    Пропускает в маршрут только пользователей с одной из указанных ролей.
+
+    Роль из сессии сверяется с профилем пользователя (get_user_profile): если
+    пользователь удален или его роль изменилась, сессия очищается и доступ
+    запрещается. Профиль берется из кэша, пока его не сбросил invalidate.
+
+    :param roles: Допустимые роли ('client', 'mechanic', 'manager').
+    :param denied: Функция, возвращающая ответ при отказе; по умолчанию
+        перенаправление на главную страницу.
+    :return: Декоратор маршрута.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapped(*args, **kwargs):
+            role = session.get('role')
+            if role not in roles:
+                return denied() if denied else redirect(url_for('main.index'))
+            if get_user_profile() is None:
+                session.clear()
+                return denied() if denied else redirect(url_for('main.index'))
+            return view(*args, **kwargs)
+        return wrapped
+    return decorator
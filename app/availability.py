@@ -0,0 +1,103 @@
+"""
+Кэширование свободных слотов.
+
+Этот файл содержит версии дней записи и кэш рассчитанных слотов. Версия дня
+(booking_days.version) увеличивается в той же транзакции, что добавляет или
+удаляет заказ на эту дату. Состав механиков меняется без изменения версий
+дней, поэтому в ключ входит и список механиков: тройка (дата, версия,
+механики) вместе с длительностью услуг и удержаниями слотов однозначно
+определяет результат. Повторный запрос стоит чтения версий и списка
+механиков, а ETag из тех же ключей позволяет клиенту получить 304 Not Modified.
+"""
+
+from collections import OrderedDict
+from hashlib import sha1
+from threading import Lock
+import time
+from .models import BookingDay, Employee
+from . import db
+
+
+def day_versions(start_date, end_date):
+    """
+    Возвращает версии дней периода.
+
+    :param start_date: Первая дата периода (datetime.date).
+    :param end_date: Последняя дата периода включительно (datetime.date).
+    :return: Словарь {дата: версия}; для дней без записей версия равна 0.
+    """
+    return dict(
+        db.session.query(BookingDay.day, BookingDay.version)
+        .filter(BookingDay.day >= start_date, BookingDay.day <= end_date)
+        .all()
+    )
+
+
+def mechanic_roster():
+    """
+    Возвращает идентификаторы механиков, между которыми распределяются записи.
+
+    :return: Кортеж идентификаторов по возрастанию.
+    """
+    return tuple(
+        mechanic_id for mechanic_id, in
+        db.session.query(Employee.id).filter(Employee.role == 'mechanic').order_by(Employee.id)
+    )
+
+
+def availability_etag(keys):
+    """
+    Вычисляет ETag ответа по ключам кэша его дней.
+
+    :param keys: Список ключей кэша слотов.
+    :return: ETag (str).
+    """
+    return sha1(repr(keys).encode()).hexdigest()
+
+
+class SlotMemo:
+    """
+    LRU-кэш рассчитанных слотов по ключу (дата, версия, механики, длительность, удержания).
+
+    Срок жизни записей ограничивает устаревание из-за изменений, которые не
+    попадают в ключ.
+    """
+
+    def __init__(self, max_size=1000):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key):
+        """
+        Возвращает слоты по ключу.
+
+        :param key: Ключ кэша.
+        :return: Список слотов или None, если записи нет или она устарела.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, key, slots, ttl):
+        """
+        Сохраняет слоты по ключу.
+
+        :param key: Ключ кэша.
+        :param slots: Список слотов.
+        :param ttl: Срок жизни записи в секундах (int).
+        """
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, slots)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+
+slot_memo = SlotMemo()
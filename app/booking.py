@@ -0,0 +1,279 @@
+"""
+Оформление записи на ремонт.
+
+Этот файл содержит функции, которые создают запись клиента одной транзакцией:
+автомобиль (по VIN), заказ, связи заказа с услугами, задачу для механика
+и изменения дневной сводки (строки stat_deltas) сохраняются одним коммитом, а при
+ошибке транзакция откатывается целиком.
+После коммита публикуются события о занятом слоте и новой задаче механика.
+
+Перед вставкой заказа транзакция блокирует строку дня записи и повторно
+проверяет занятость механиков, поэтому два клиента не могут занять одного
+механика в одно время, а записи на разные дни не мешают друг другу: кроме
+строки своего дня транзакция ничего не обновляет, только добавляет строки.
+"""
+
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import insert, or_, select, update
+from sqlalchemy.exc import DatabaseError, IntegrityError, OperationalError
+from .models import BookingDay, Car, Order, OrderService, Task
+from .catalog import summarize_services
+from .slots import to_minutes
+from .scheduler import load_workshop_schedule
+from .rollups import record_order, record_task_status
+from .events import publish_slot, publish_task, slot_event, task_event
+from . import db
+
+LOCK_CONFLICT_MARKERS = ('lock conflict', 'update conflicts', 'deadlock', 'database is locked')
+
+
+class SlotUnavailableError(ValueError):
+    """Выбранное время уже занято или находится вне рабочего дня."""
+
+
+class BookingDayLockError(Exception):
+    """Строка дня записи не видна транзакции, и заблокировать день не удалось."""
+
+
+class CarOwnershipError(ValueError):
+    """Автомобиль с указанным VIN или госномером принадлежит другому клиенту."""
+
+
+def calculate_end_time(appointment_date, appointment_time, services):
+    """
+    Рассчитывает время окончания заказа на основе выбранных услуг.
+
+    :param appointment_date: Дата записи (datetime.date).
+    :param appointment_time: Время начала (datetime.time).
+    :param services: Список услуг.
+    :return: Время окончания (datetime.time).
+    """
+    total_duration, _ = summarize_services(services)
+    return (datetime.combine(appointment_date, appointment_time) + timedelta(minutes=total_duration)).time()
+
+
+def create_task_for_order(order_id, employee_id):
+    """
+    Добавляет задачу для заказа в текущую транзакцию.
+
+    :param order_id: Идентификатор заказа.
+    :param employee_id: Идентификатор механика.
+    :return: Новая задача.
+    """
+    new_task = Task(
+        employee_id=employee_id,
+        order_id=order_id,
+        status='pending'
+    )
+    db.session.add(new_task)
+    return new_task
+
+
+def upsert_car(client_id, car_model, car_year, vin, license_plate):
+    """
+    Находит автомобиль клиента по VIN или госномеру и обновляет его данные или создает новый.
+
+    Если VIN новый, а госномер уже указан у автомобиля клиента, обновляется
+    этот автомобиль: госномер уникален, и второй автомобиль с ним создать нельзя.
+
+    :param client_id: Идентификатор клиента.
+    :param car_model: Модель автомобиля из справочника.
+    :param car_year: Год выпуска.
+    :param vin: VIN номер.
+    :param license_plate: Государственный номер.
+    :return: Автомобиль, добавленный в текущую транзакцию.
+    :raises CarOwnershipError: Если VIN или госномер принадлежат автомобилю другого клиента.
+    :raises ValueError: Если VIN и госномер указаны у двух разных автомобилей клиента.
+    """
+    cars = Car.query.filter(or_(Car.vin == vin, Car.license_plate == license_plate)).all()
+    if any(existing.client_id != client_id for existing in cars):
+        raise CarOwnershipError("Автомобиль с таким VIN или госномером зарегистрирован на другого клиента")
+    by_vin = next((existing for existing in cars if existing.vin == vin), None)
+    by_plate = next((existing for existing in cars if existing.license_plate == license_plate), None)
+    if by_vin is not None and by_plate is not None and by_vin is not by_plate:
+        raise ValueError(f"Госномер {license_plate} уже указан у другого вашего автомобиля (VIN {by_plate.vin})")
+    car = by_vin or by_plate
+    if car is None:
+        car = Car()
+        db.session.add(car)
+    car.vin = vin
+    car.client_id = client_id
+    car.car_model_id = car_model.id
+    car.car_year = car_year
+    car.license_plate = license_plate
+    return car
+
+
+def ensure_booking_day(appointment_date):
+    """
+    Создает строку дня записи, если ее еще нет, в отдельной транзакции.
+
+    Строка фиксируется до начала транзакции записи, поэтому она видна всем
+    следующим транзакциям, в том числе при изоляции SNAPSHOT.
+
+    :param appointment_date: Дата записи (datetime.date).
+    """
+    exists = select(BookingDay.day).where(BookingDay.day == appointment_date)
+    try:
+        with db.engine.begin() as connection:
+            if connection.execute(exists).first() is None:
+                connection.execute(insert(BookingDay).values(day=appointment_date, version=0))
+    except IntegrityError:
+        pass
+
+
+def lock_booking_day(appointment_date):
+    """
+    Блокирует строку дня записи до конца текущей транзакции.
+
+    Обновление версии удерживает блокировку строки, поэтому параллельные
+    записи на ту же дату выполняются по очереди. Строку заранее создает
+    ensure_booking_day.
+
+    :param appointment_date: Дата записи (datetime.date).
+    :return: True, если строка найдена и заблокирована (bool).
+    """
+    bump = (
+        update(BookingDay)
+        .where(BookingDay.day == appointment_date)
+        .values(version=BookingDay.version + 1)
+        .execution_options(synchronize_session=False)
+    )
+    return bool(db.session.execute(bump).rowcount)
+
+
+def touch_booking_day(appointment_date):
+    """
+    Увеличивает версию дня записи, создавая строку дня при необходимости.
+
+    Используется при удалении заказа: освобождение времени не требует
+    блокировки, но версия дня должна измениться.
+
+    :param appointment_date: Дата записи (datetime.date).
+    """
+    if lock_booking_day(appointment_date):
+        return
+    try:
+        with db.session.begin_nested():
+            db.session.add(BookingDay(day=appointment_date, version=1))
+    except IntegrityError:
+        lock_booking_day(appointment_date)
+
+
+def is_lock_conflict(error):
+    """
+    Проверяет, вызвана ли ошибка базы данных конфликтом блокировок.
+
+    Firebird сообщает о конфликте обновления и взаимной блокировке как о
+    DatabaseError, SQLite - как об OperationalError.
+
+    :param error: Исключение sqlalchemy.exc.DBAPIError.
+    :return: True, если транзакцию можно повторить (bool).
+    """
+    if isinstance(error, IntegrityError):
+        return False
+    if isinstance(error, OperationalError):
+        return True
+    message = str(error.orig).lower()
+    return any(marker in message for marker in LOCK_CONFLICT_MARKERS)
+
+
+def assign_mechanic(appointment_date, start_time, end_time):
+    """
+    Выбирает механика для интервала записи по текущему расписанию мастерской.
+
+    :param appointment_date: Дата записи (datetime.date).
+    :param start_time: Время начала (datetime.time).
+    :param end_time: Время окончания (datetime.time).
+    :return: Идентификатор механика.
+    :raises SlotUnavailableError: Если на интервале нет свободного механика.
+    """
+    duration = to_minutes(end_time) - to_minutes(start_time)
+    schedule = load_workshop_schedule(appointment_date, horizon=duration)
+    mechanic_id = schedule.assign(to_minutes(start_time), duration)
+    if mechanic_id is None:
+        raise SlotUnavailableError("Выбранное время уже занято")
+    return mechanic_id
+
+
+def create_booking(client_id, car_model, car_year, vin, license_plate, appointment_date, appointment_time, services):
+    """
+    Создает запись на ремонт одной транзакцией.
+
+    Строка дня создается заранее отдельной транзакцией. Если блокировка дня
+    завершилась конфликтом обновления (параллельная запись на ту же дату уже
+    зафиксирована) или транзакция еще не видит строку дня, попытка
+    повторяется после отката в новой транзакции, которая видит
+    зафиксированные изменения.
+
+    :param client_id: Идентификатор клиента.
+    :param car_model: Модель автомобиля из справочника.
+    :param car_year: Год выпуска.
+    :param vin: VIN номер.
+    :param license_plate: Государственный номер.
+    :param appointment_date: Дата записи (datetime.date).
+    :param appointment_time: Время записи (str 'ЧЧ:ММ').
+    :param services: Список выбранных услуг.
+    :return: Созданный заказ.
+    :raises SlotUnavailableError: Если выбранное время уже занято или день не удалось заблокировать.
+    :raises ValueError: Если не выбраны услуги.
+    """
+    if not services:
+        raise ValueError("Не выбрано ни одной услуги")
+    start_time = datetime.strptime(appointment_time, '%H:%M').time()
+    end_time = calculate_end_time(appointment_date, start_time, services)
+    ensure_booking_day(appointment_date)
+    attempts = max(current_app.config['BOOKING_LOCK_RETRIES'], 1)
+    for attempt in range(attempts):
+        try:
+            return _insert_booking(
+                client_id, car_model, car_year, vin, license_plate,
+                appointment_date, start_time, end_time, services
+            )
+        except BookingDayLockError:
+            if attempt + 1 == attempts:
+                raise SlotUnavailableError("Не удалось заблокировать день записи")
+        except DatabaseError as e:
+            if not is_lock_conflict(e):
+                raise
+            if attempt + 1 == attempts:
+                raise SlotUnavailableError("Не удалось заблокировать день записи") from e
+
+
+def _insert_booking(client_id, car_model, car_year, vin, license_plate, appointment_date, start_time, end_time, services):
+    try:
+        if not lock_booking_day(appointment_date):
+            raise BookingDayLockError(appointment_date)
+        mechanic_id = assign_mechanic(appointment_date, start_time, end_time)
+        car = upsert_car(client_id, car_model, car_year, vin, license_plate)
+        new_order = Order(
+            client_id=client_id,
+            car=car,
+            car_brand=car_model.brand,
+            car_model=car_model.model_name,
+            appointment_date=appointment_date,
+            appointment_time=start_time,
+            end_time=end_time,
+            car_model_id=car_model.id
+        )
+        db.session.add(new_order)
+        db.session.flush()
+        db.session.execute(
+            insert(OrderService),
+            [{'order_id': new_order.id, 'service_id': service.id, 'price': service.price}
+             for service in {service.id: service for service in services}.values()]
+        )
+        record_order(new_order, services, car_model.id)
+        new_task = create_task_for_order(new_order.id, mechanic_id)
+        record_task_status(new_task, None, new_task.status)
+        db.session.flush()
+        slot = slot_event(appointment_date, start_time, end_time)
+        task = task_event(new_task, new_task.status)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    publish_slot('slot_taken', slot)
+    publish_task(task)
+    return new_order
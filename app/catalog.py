@@ -0,0 +1,218 @@
+"""
+Доступ к каталогу услуг и моделей автомобилей.
+
+Этот файл содержит кэш справочников в памяти процесса и функции для получения
+услуг по списку идентификаторов, а также для подсчета суммарной длительности
+и стоимости. Кэш сбрасывается при каждом изменении справочника менеджером
+во всех рабочих процессах: изменение увеличивает общую версию справочника
+(app/versions.py), а кэш процесса перечитывает справочник, как только
+версия его записей отстает от общей.
+"""
+
+from collections import namedtuple
+from threading import Lock
+import time
+
+from flask import current_app
+from .models import Service, CarModel
+from .versions import shared_versions
+
+ServiceEntry = namedtuple('ServiceEntry', ['id', 'service_name', 'description', 'price', 'duration'])
+CarModelEntry = namedtuple('CarModelEntry', ['id', 'brand', 'model_name'])
+
+
+class CatalogCache:
+    """
+    Версионированный кэш справочника.
+
+    Хранит неизменяемые копии строк справочника, поэтому записи можно
+    безопасно использовать вне сессии базы данных. Каждый сброс увеличивает
+    общую для процессов версию справочника; записи, загруженные при более
+    старой версии, при следующем чтении перечитываются.
+    """
+
+    def __init__(self, name, loader):
+        """
+        :param name: Название справочника (str).
+        :param loader: Функция, загружающая записи справочника из базы данных.
+        """
+        self.name = name
+        self.loader = loader
+        self.hits = 0
+        self.misses = 0
+        self._entries = None
+        self._by_id = {}
+        self._loaded_at = 0.0
+        self._loaded_version = None
+        self._lock = Lock()
+
+    @property
+    def version(self):
+        """Общая для процессов версия справочника (int)."""
+        return shared_versions.get(f'catalog:{self.name}')
+
+    def _is_fresh(self, version):
+        ttl = current_app.config.get('CATALOG_CACHE_TTL')
+        return (
+            self._entries is not None
+            and self._loaded_version == version
+            and (not ttl or time.monotonic() - self._loaded_at < ttl)
+        )
+
+    def _reload(self, version):
+        entries = tuple(self.loader())
+        self._entries = entries
+        self._by_id = {entry.id: entry for entry in entries}
+        self._loaded_at = time.monotonic()
+        self._loaded_version = version
+
+    def all(self):
+        """
+        Возвращает все записи справочника.
+
+        :return: Кортеж записей.
+        """
+        version = self.version
+        with self._lock:
+            if self._is_fresh(version):
+                self.hits += 1
+            else:
+                self.misses += 1
+                self._reload(version)
+            return self._entries
+
+    def get_many(self, ids):
+        """
+        Возвращает записи по идентификаторам.
+
+        Если какой-то идентификатор не найден, справочник перечитывается один раз:
+        запись могла быть добавлена в другом процессе. Такое перечитывание
+        выполняется не чаще раза в CATALOG_MISS_RELOAD_SECONDS, поэтому запросы
+        с несуществующими идентификаторами не сбрасывают кэш на каждом обращении.
+
+        :param ids: Список идентификаторов (int).
+        :return: Словарь {идентификатор: запись} для найденных записей.
+        """
+        self.all()
+        interval = current_app.config['CATALOG_MISS_RELOAD_SECONDS']
+        with self._lock:
+            if (any(entry_id not in self._by_id for entry_id in ids)
+                    and time.monotonic() - self._loaded_at >= interval):
+                self.misses += 1
+                self._reload(self._loaded_version)
+            return {entry_id: self._by_id[entry_id] for entry_id in ids if entry_id in self._by_id}
+
+    def invalidate(self):
+        """Сбрасывает кэш во всех процессах, увеличивая общую версию справочника."""
+        with self._lock:
+            self._entries = None
+            self._by_id = {}
+        shared_versions.bump(f'catalog:{self.name}')
+
+    def stats(self):
+        """
+        Возвращает счетчики кэша.
+
+        :return: Словарь с версией, числом попаданий и промахов.
+        """
+        return {'version': self.version, 'hits': self.hits, 'misses': self.misses}
+
+
+def _load_services():
+    return [
+        ServiceEntry(service.id, service.service_name, service.description, service.price, service.duration)
+        for service in Service.query.order_by(Service.id).all()
+    ]
+
+
+def _load_car_models():
+    return [
+        CarModelEntry(model.id, model.brand, model.model_name)
+        for model in CarModel.query.order_by(CarModel.id).all()
+    ]
+
+
+services_cache = CatalogCache('services', _load_services)
+car_models_cache = CatalogCache('car_models', _load_car_models)
+
+
+def catalog_stats():
+    """
+    Возвращает счетчики всех кэшей справочников.
+
+    :return: Словарь {название справочника: счетчики}.
+    """
+    return {cache.name: cache.stats() for cache in (services_cache, car_models_cache)}
+
+
+def parse_ids(ids):
+    """
+    Приводит идентификаторы к целым числам, отбрасывая некорректные.
+
+    :param ids: Список идентификаторов (str или int).
+    :return: Список идентификаторов (int) в исходном порядке.
+    """
+    parsed = []
+    for value in ids or []:
+        try:
+            parsed.append(int(value))
+        except (TypeError, ValueError):
+            continue
+    return parsed
+
+
+def list_services():
+    """
+    Возвращает все услуги из кэша.
+
+    :return: Кортеж записей ServiceEntry.
+    """
+    return services_cache.all()
+
+
+def get_services(service_ids):
+    """
+    Возвращает услуги по списку идентификаторов из кэша справочника.
+
+    :param service_ids: Список идентификаторов услуг.
+    :return: Список записей ServiceEntry в порядке переданных идентификаторов.
+    """
+    ids = parse_ids(service_ids)
+    if not ids:
+        return []
+    found = services_cache.get_many(ids)
+    return [found[service_id] for service_id in ids if service_id in found]
+
+
+def list_car_models():
+    """
+    Возвращает все модели автомобилей из кэша.
+
+    :return: Кортеж записей CarModelEntry.
+    """
+    return car_models_cache.all()
+
+
+def get_car_model(model_id):
+    """
+    Возвращает модель автомобиля по идентификатору из кэша справочника.
+
+    :param model_id: Идентификатор модели.
+    :return: Запись CarModelEntry или None.
+    """
+    ids = parse_ids([model_id])
+    if not ids:
+        return None
+    return car_models_cache.get_many(ids).get(ids[0])
+
+
+def summarize_services(services):
+    """
+    Считает суммарную длительность и стоимость услуг.
+
+    :param services: Список услуг.
+    :return: Кортеж (длительность в минутах, стоимость).
+    """
+    total_duration = sum(service.duration for service in services)
+    total_price = sum(service.price for service in services)
+    return total_duration, total_price
@@ -0,0 +1,487 @@
+"""
+Уведомления об изменениях в реальном времени.
+
+Этот файл содержит шину событий, через которую маршруты сообщают об
+изменениях расписания (слот занят или освобожден) и статусов задач, и
+форматирование событий для потока server-sent events. Подписчики получают
+события из очереди в памяти, поэтому открытое соединение не держит
+соединение с базой данных и не выполняет запросов, пока ничего не меняется.
+
+Брокер выбирается параметром EVENT_BROKER. Брокер по умолчанию
+(SqliteBroker) передает события через файл SQLite, общий для рабочих
+процессов gunicorn на одном сервере; MemoryBroker доставляет события только
+подписчикам того же процесса и подходит для тестов и запуска в одном
+процессе. Другой брокер (например, поверх Redis при нескольких серверах)
+должен иметь тот же интерфейс: конструктор принимает приложение,
+publish(channel, name, data) публикует событие, а
+subscribe(channels, last_event_id) возвращает подписку с методами
+get(timeout) и close().
+
+Каждый поток /events занимает поток рабочего процесса, поэтому число
+одновременно открытых потоков в процессе ограничено EVENT_MAX_STREAMS, а
+сам поток длится не дольше EVENT_STREAM_SECONDS.
+"""
+
+from collections import namedtuple
+from threading import Lock, Thread
+import json
+import logging
+import os
+import queue
+import sqlite3
+import time
+from werkzeug.utils import import_string
+
+logger = logging.getLogger(__name__)
+
+Event = namedtuple('Event', ['channel', 'name', 'data', 'id'], defaults=(None,))
+
+SLOTS_CHANNEL = 'slots'
+TASKS_CHANNEL = 'tasks'
+RESYNC = Event(None, 'resync', {})
+
+
+def task_channel(employee_id):
+    """
+    Возвращает канал задач механика.
+
+    :param employee_id: Идентификатор механика.
+    :return: Имя канала (str).
+    """
+    return f'{TASKS_CHANNEL}:{employee_id}'
+
+
+class Subscription:
+    """
+    Очередь событий одного подписчика.
+
+    Если подписчик не успевает забирать события и очередь заполнена, новые
+    события отбрасываются, а следующим он получит событие resync: клиенту
+    нужно заново загрузить данные.
+    """
+
+    def __init__(self, broker, channels, queue_size):
+        self.broker = broker
+        self.channels = frozenset(channels)
+        self._queue = queue.Queue(queue_size)
+        self._overflowed = False
+
+    def put(self, event):
+        """
+        Добавляет событие в очередь без ожидания.
+
+        :param event: Объект Event.
+        """
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            self._overflowed = True
+
+    def get(self, timeout):
+        """
+        Ждет следующее событие.
+
+        :param timeout: Сколько секунд ждать (float).
+        :return: Объект Event или None, если за это время событий не было.
+        """
+        if self._overflowed:
+            self._overflowed = False
+            with self._queue.mutex:
+                self._queue.queue.clear()
+            return RESYNC
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        """Отписывается от всех каналов."""
+        self.broker.unsubscribe(self)
+
+
+class MemoryBroker:
+    """Публикация и подписка внутри одного процесса."""
+
+    def __init__(self, app):
+        """
+        :param app: Приложение Flask.
+        """
+        self.queue_size = app.config['EVENT_QUEUE_SIZE']
+        self._subscribers = {}
+        self._lock = Lock()
+
+    def publish(self, channel, name, data):
+        """
+        Рассылает событие подписчикам канала.
+
+        :param channel: Имя канала (str).
+        :param name: Имя события (str).
+        :param data: Данные события (словарь, сериализуемый в JSON).
+        """
+        event = Event(channel, name, data)
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for subscription in subscribers:
+            subscription.put(event)
+
+    def subscribe(self, channels, last_event_id=None):
+        """
+        Подписывается на каналы.
+
+        :param channels: Имена каналов.
+        :param last_event_id: Не используется: события в памяти не повторяются.
+        :return: Объект Subscription.
+        """
+        subscription = Subscription(self, channels, self.queue_size)
+        with self._lock:
+            self._register(subscription)
+        return subscription
+
+    def _register(self, subscription):
+        for channel in subscription.channels:
+            self._subscribers.setdefault(channel, set()).add(subscription)
+
+    def unsubscribe(self, subscription):
+        """
+        Удаляет подписку со всех ее каналов.
+
+        :param subscription: Объект Subscription.
+        """
+        with self._lock:
+            for channel in subscription.channels:
+                subscribers = self._subscribers.get(channel)
+                if subscribers is None:
+                    continue
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[channel]
+
+    def subscriber_count(self):
+        """
+        Возвращает число открытых подписок.
+
+        :return: Число подписок (int).
+        """
+        with self._lock:
+            return len({subscription for subscribers in self._subscribers.values() for subscription in subscribers})
+
+
+class SqliteBroker(MemoryBroker):
+    """
+    Публикация и подписка через файл SQLite, общий для рабочих процессов сервера.
+
+    publish записывает событие в таблицу events, а поток опроса в каждом
+    процессе раз в EVENT_POLL_SECONDS читает новые строки и раздает их
+    подписчикам своего процесса. События хранятся EVENT_REPLAY_SECONDS:
+    переподключившийся браузер передает номер последнего полученного события
+    (Last-Event-ID) и получает пропущенные; если их уже удалили, он получает
+    событие resync.
+    """
+
+    cleanup_every = 1000
+
+    def __init__(self, app):
+        """
+        :param app: Приложение Flask.
+        """
+        super().__init__(app)
+        self.path = app.config['EVENT_DB_PATH']
+        self.poll_seconds = app.config['EVENT_POLL_SECONDS']
+        self.replay_seconds = app.config['EVENT_REPLAY_SECONDS']
+        self._connection = None
+        self._pid = None
+        self._db_lock = Lock()
+        self._poller_pid = None
+        self._cursor = 0
+        self._publishes = 0
+
+    def publish(self, channel, name, data):
+        """
+        Записывает событие в таблицу; подписчикам его раздают потоки опроса.
+
+        :param channel: Имя канала (str).
+        :param name: Имя события (str).
+        :param data: Данные события (словарь, сериализуемый в JSON).
+        """
+        now = time.time()
+        with self._db_lock:
+            connection = self._connect()
+            connection.execute(
+                'INSERT INTO events (channel, name, data, created_at) VALUES (?, ?, ?, ?)',
+                (channel, name, json.dumps(data, ensure_ascii=False), now)
+            )
+            self._publishes += 1
+            if self._publishes % self.cleanup_every == 0:
+                connection.execute('DELETE FROM events WHERE created_at <= ?', (now - self.replay_seconds,))
+
+    def subscribe(self, channels, last_event_id=None):
+        """
+        Подписывается на каналы и, если передан last_event_id, ставит в очередь
+        пропущенные с тех пор события.
+
+        :param channels: Имена каналов.
+        :param last_event_id: Номер последнего полученного события (int) или None.
+        :return: Объект Subscription.
+        """
+        self._start_poller()
+        subscription = Subscription(self, channels, self.queue_size)
+        with self._lock:
+            self._register(subscription)
+            if last_event_id is not None and last_event_id < self._cursor:
+                for event in self._missed(subscription.channels, last_event_id):
+                    subscription.put(event)
+        return subscription
+
+    def _missed(self, channels, last_event_id):
+        marks = ', '.join('?' for _ in channels)
+        with self._db_lock:
+            connection = self._connect()
+            first_id = connection.execute('SELECT MIN(id) FROM events').fetchone()[0]
+            if first_id is None or first_id > last_event_id + 1:
+                return [RESYNC]
+            rows = connection.execute(
+                f'SELECT id, channel, name, data FROM events WHERE id > ? AND id <= ? AND channel IN ({marks}) ORDER BY id',
+                (last_event_id, self._cursor, *channels)
+            ).fetchall()
+        return [Event(channel, name, json.loads(data), event_id) for event_id, channel, name, data in rows]
+
+    def _start_poller(self):
+        with self._lock:
+            if self._poller_pid == os.getpid():
+                return
+            with self._db_lock:
+                self._cursor = self._connect().execute('SELECT COALESCE(MAX(id), 0) FROM events').fetchone()[0]
+            self._poller_pid = os.getpid()
+        Thread(target=self._poll, name='event-poller', daemon=True).start()
+
+    def _poll(self):
+        pid = os.getpid()
+        while self._poller_pid == pid:
+            time.sleep(self.poll_seconds)
+            try:
+                with self._db_lock:
+                    rows = self._connect().execute(
+                        'SELECT id, channel, name, data FROM events WHERE id > ? ORDER BY id', (self._cursor,)
+                    ).fetchall()
+            except sqlite3.Error:
+                logger.exception("Не удалось прочитать события из %s", self.path)
+                continue
+            with self._lock:
+                for event_id, channel, name, data in rows:
+                    if event_id <= self._cursor:
+                        continue
+                    event = Event(channel, name, json.loads(data), event_id)
+                    for subscription in self._subscribers.get(channel, ()):
+                        subscription.put(event)
+                    self._cursor = event_id
+
+    def stop(self):
+        """Останавливает поток опроса этого процесса."""
+        self._poller_pid = None
+
+    def _connect(self):
+        if self._connection is None or self._pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS events (id INTEGER PRIMARY KEY AUTOINCREMENT, channel TEXT NOT NULL, '
+                'name TEXT NOT NULL, data TEXT NOT NULL, created_at REAL NOT NULL)'
+            )
+            self._connection = connection
+            self._pid = os.getpid()
+        return self._connection
+
+
+class EventStream:
+    """
+    Тело ответа /events.
+
+    Сервер вызывает close() и при завершении потока, и при обрыве соединения,
+    даже если итерация еще не началась, поэтому подписка и место в лимите
+    потоков процесса освобождаются всегда.
+    """
+
+    def __init__(self, bus, subscription):
+        """
+        :param bus: Объект EventBus.
+        :param subscription: Подписка брокера.
+        """
+        self.bus = bus
+        self.subscription = subscription
+        self._chunks = iter_sse(subscription, bus.keepalive, bus.stream_seconds)
+        self._closed = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self._chunks)
+
+    def close(self):
+        """Закрывает подписку и освобождает место в лимите потоков."""
+        if self._closed:
+            return
+        self._closed = True
+        self._chunks.close()
+        self.subscription.close()
+        self.bus.release_stream()
+
+
+class EventBus:
+    """Точка публикации событий приложения поверх выбранного брокера."""
+
+    def __init__(self):
+        self.broker = None
+        self.keepalive = 15
+        self.stream_seconds = 60
+        self.max_streams = 4
+        self.retry_after = 30
+        self._streams = 0
+        self._lock = Lock()
+
+    def init_app(self, app):
+        """
+        Создает брокер по настройке EVENT_BROKER.
+
+        :param app: Приложение Flask.
+        """
+        self.broker = import_string(app.config['EVENT_BROKER'])(app)
+        self.keepalive = app.config['EVENT_KEEPALIVE_SECONDS']
+        self.stream_seconds = app.config['EVENT_STREAM_SECONDS']
+        self.max_streams = app.config['EVENT_MAX_STREAMS']
+        self.retry_after = app.config['EVENT_RETRY_AFTER']
+
+    def publish(self, channel, name, data):
+        """
+        Публикует событие; ошибка брокера не прерывает запрос, изменивший данные.
+
+        :param channel: Имя канала (str).
+        :param name: Имя события (str).
+        :param data: Данные события (словарь, сериализуемый в JSON).
+        """
+        if self.broker is None:
+            return
+        try:
+            self.broker.publish(channel, name, data)
+        except Exception:
+            logger.exception("Не удалось опубликовать событие %s в канал %s", name, channel)
+
+    def open_stream(self, channels, last_event_id=None):
+        """
+        Открывает поток событий, если в процессе не исчерпан лимит EVENT_MAX_STREAMS.
+
+        :param channels: Имена каналов.
+        :param last_event_id: Номер последнего полученного клиентом события (int) или None.
+        :return: Объект EventStream или None, если лимит исчерпан.
+        """
+        with self._lock:
+            if self._streams >= self.max_streams:
+                return None
+            self._streams += 1
+        try:
+            subscription = self.broker.subscribe(channels, last_event_id)
+        except Exception:
+            self.release_stream()
+            raise
+        return EventStream(self, subscription)
+
+    def release_stream(self):
+        """Освобождает место в лимите потоков процесса."""
+        with self._lock:
+            self._streams -= 1
+
+    def subscriber_count(self):
+        """
+        Возвращает число открытых подписок, если брокер его сообщает.
+
+        :return: Число подписок (int) или None.
+        """
+        count = getattr(self.broker, 'subscriber_count', None)
+        return count() if count else None
+
+
+event_bus = EventBus()
+
+
+def slot_event(appointment_date, start_time, end_time):
+    """
+    Формирует данные события о слоте.
+
+    :param appointment_date: Дата записи (datetime.date).
+    :param start_time: Время начала (datetime.time).
+    :param end_time: Время окончания (datetime.time).
+    :return: Словарь данных события.
+    """
+    return {
+        'date': appointment_date.isoformat(),
+        'start': start_time.strftime('%H:%M'),
+        'end': end_time.strftime('%H:%M') if end_time else None,
+    }
+
+
+def task_event(task, status):
+    """
+    Формирует данные события о задаче.
+
+    :param task: Задача.
+    :param status: Новый статус задачи или None, если задача удалена.
+    :return: Словарь данных события.
+    """
+    return {'task_id': task.id, 'order_id': task.order_id, 'employee_id': task.employee_id, 'status': status}
+
+
+def publish_slot(name, data):
+    """
+    Публикует событие о слоте ('slot_taken' или 'slot_freed').
+
+    :param name: Имя события (str).
+    :param data: Данные из slot_event.
+    """
+    event_bus.publish(SLOTS_CHANNEL, name, data)
+
+
+def publish_task(data):
+    """
+    Публикует событие о задаче механику и менеджерам.
+
+    :param data: Данные из task_event.
+    """
+    event_bus.publish(task_channel(data['employee_id']), 'task_status', data)
+    event_bus.publish(TASKS_CHANNEL, 'task_status', data)
+
+
+def format_sse(event):
+    """
+    Форматирует событие для потока text/event-stream.
+
+    :param event: Объект Event.
+    :return: Текст события (str).
+    """
+    event_id = f"id: {event.id}\n" if event.id is not None else ""
+    return f"{event_id}event: {event.name}\ndata: {json.dumps(event.data, ensure_ascii=False)}\n\n"
+
+
+def iter_sse(subscription, keepalive, duration, retry_ms=3000):
+    """
+    Генерирует поток server-sent events из подписки.
+
+    Пока событий нет, каждые keepalive секунд отправляется комментарий, чтобы
+    прокси не закрывали соединение. Через duration секунд поток завершается,
+    и браузер переподключается сам: так рабочий поток или процесс gunicorn
+    не остается занятым одним клиентом бесконечно. Подписку закрывает
+    вызывающий код (EventStream.close).
+
+    :param subscription: Подписка брокера.
+    :param keepalive: Интервал комментариев в секундах (float).
+    :param duration: Длительность потока в секундах (float).
+    :param retry_ms: Задержка переподключения браузера в миллисекундах (int).
+    """
+    deadline = time.monotonic() + duration
+    yield f"retry: {retry_ms}\n\n"
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return
+        event = subscription.get(timeout=min(keepalive, remaining))
+        yield format_sse(event) if event is not None else ": keepalive\n\n"
@@ -0,0 +1,99 @@
+"""
+Выгрузка заказов для бухгалтерии.
+
+Этот файл содержит построчную выгрузку заказов вместе с услугами, ценами,
+механиком и статусом задачи в CSV. Строки читаются из базы серверным курсором
+порциями и сразу отдаются клиенту, поэтому выгрузка за несколько лет
+выполняется с постоянным расходом памяти. Текстовые ячейки, которые
+табличный редактор принял бы за формулу, экранируются апострофом.
+
+Период выгрузки, как и период отчетов по дневным сводкам, отсчитывается по
+дате создания заказа, а цены берутся на момент записи, поэтому выгрузка за
+период сходится с итогами отчета за тот же период.
+"""
+
+from datetime import datetime, time, timedelta
+from io import StringIO
+import csv
+from .utils import translate_status
+from .models import Client, Employee, Order, OrderService, Service, Task
+from sqlalchemy import func
+from . import db
+
+CSV_HEADER = [
+    'Номер заказа', 'Дата записи', 'Время записи', 'Создан', 'Клиент', 'Телефон',
+    'Марка', 'Модель', 'Услуга', 'Цена', 'Механик', 'Статус'
+]
+FORMULA_PREFIXES = ('=', '+', '-', '@')
+
+
+def escape_cell(value):
+    """
+    Экранирует текстовую ячейку, начинающуюся с символа формулы.
+
+    :param value: Значение ячейки.
+    :return: Значение с апострофом в начале, если это строка, начинающаяся с символа формулы.
+    """
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def order_lines_query(start_date=None, end_date=None):
+    """
+    Строит запрос строк заказов: одна строка на каждую услугу заказа.
+
+    :param start_date: Начальная дата создания заказа (datetime.date или None).
+    :param end_date: Конечная дата создания заказа включительно (datetime.date или None).
+    :return: Запрос SQLAlchemy.
+    """
+    query = (
+        db.session.query(
+            Order.id, Order.appointment_date, Order.appointment_time, Order.created_at,
+            Client.name, Client.phone, Order.car_brand, Order.car_model,
+            Service.service_name, func.coalesce(OrderService.price, Service.price), Employee.name, Task.status
+        )
+        .select_from(OrderService)
+        .join(Order, Order.id == OrderService.order_id)
+        .join(Service, Service.id == OrderService.service_id)
+        .join(Client, Client.id == Order.client_id)
+        .outerjoin(Task, Task.order_id == Order.id)
+        .outerjoin(Employee, Employee.id == Task.employee_id)
+    )
+    if start_date:
+        query = query.filter(Order.created_at >= datetime.combine(start_date, time.min))
+    if end_date:
+        query = query.filter(Order.created_at < datetime.combine(end_date + timedelta(days=1), time.min))
+    return query.order_by(Order.id, Service.id)
+
+
+def iter_orders_csv(start_date=None, end_date=None, batch_size=1000):
+    """
+    Формирует CSV со строками заказов по частям.
+
+    :param start_date: Начальная дата создания заказа (datetime.date или None).
+    :param end_date: Конечная дата создания заказа включительно (datetime.date или None).
+    :param batch_size: Количество строк, читаемых из базы и отдаваемых за раз (int).
+    :return: Генератор частей CSV (str).
+    """
+    buffer = StringIO()
+    writer = csv.writer(buffer)
+    buffer.write('\ufeff')
+    writer.writerow(CSV_HEADER)
+    rows = order_lines_query(start_date, end_date).execution_options(stream_results=True, yield_per=batch_size)
+    for count, row in enumerate(rows, 1):
+        (order_id, appointment_date, appointment_time, created_at, client_name, client_phone,
+         car_brand, car_model, service_name, price, mechanic_name, status) = row
+        writer.writerow([
+            order_id,
+            appointment_date.isoformat() if appointment_date else '',
+            appointment_time.strftime('%H:%M') if appointment_time else '',
+            created_at.strftime('%Y-%m-%d %H:%M') if created_at else '',
+            *map(escape_cell, (client_name, client_phone, car_brand, car_model, service_name)), price,
+            escape_cell(mechanic_name or ''), translate_status(status) if status else ''
+        ])
+        if count % batch_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
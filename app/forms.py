@@ -9,6 +9,7 @@ from flask_wtf import FlaskForm
 from wtforms import StringField, IntegerField, SubmitField, SelectField, DateField, SelectMultipleField
 from wtforms.validators import DataRequired
 from .models import *
+from .catalog import list_services, list_car_models
 
 class CarForm(FlaskForm):
     """
@@ -39,7 +40,7 @@ class CarForm(FlaskForm):
     def __init__(self, *args, **kwargs):
         """Инициализирует форму и заполняет выпадающий список моделями автомобилей."""
         super(CarForm, self).__init__(*args, **kwargs)
-        self.car_model.choices = [(model.id, f"{model.brand} {model.model_name}") for model in CarModel.query.all()]
+        self.car_model.choices = [(model.id, f"{model.brand} {model.model_name}") for model in list_car_models()]
 
 class SelectServicesForm(FlaskForm):
     """
@@ -56,4 +57,4 @@ class SelectServicesForm(FlaskForm):
     def __init__(self, *args, **kwargs):
         """Инициализирует форму и загружает список услуг."""
         super(SelectServicesForm, self).__init__(*args, **kwargs)
-        self.services.choices = [(service.id, service.service_name, service.price) for service in Service.query.all()]
+        self.services.choices = [(service.id, service.service_name, service.price) for service in list_services()]
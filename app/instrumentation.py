@@ -0,0 +1,503 @@
+"""
+Метрики работы приложения.
+
+Этот файл содержит пул соединений с замером времени ожидания свободного
+соединения и счетчики пула, по которым подбираются pool_size и max_overflow
+для конкретной нагрузки, а также замер каждого запроса: время ответа,
+число SQL-запросов и время работы базы данных по каждому маршруту. Метрики
+отдаются в текстовом формате Prometheus на /metrics вместе с числом
+открытых потоков событий. Доступ к /metrics открыт только адресам из
+METRICS_ALLOWED_IPS и запросам с токеном METRICS_TOKEN.
+
+Счетчики ведет каждый рабочий процесс gunicorn. Чтобы /metrics, попадая в
+любой процесс, отдавал итог по всем, при METRICS_BACKEND = 'sqlite' фоновый
+поток каждого процесса раз в METRICS_FLUSH_SECONDS (и процесс перед ответом
+на /metrics) записывает снимок своих значений в общий файл METRICS_DB_PATH,
+а /metrics суммирует снимки. Счетчики завершившихся процессов переносятся в общий
+архив, поэтому итог не уменьшается при перезапуске процессов; их
+показатели-состояния (gauge) отбрасываются. Значения процесса, не успевшие
+попасть в снимок до его завершения, теряются.
+"""
+
+from bisect import bisect_left
+from collections import defaultdict
+from threading import Lock, Thread
+import hmac
+import logging
+import os
+import sqlite3
+import time
+from flask import abort, current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import QueuePool
+from .events import event_bus
+from . import db
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+FAMILIES = {
+    'http_request_duration_seconds': ('histogram', 'Request latency by endpoint.'),
+    'db_queries_per_request': ('histogram', 'SQL statements executed per request.'),
+    'db_seconds_total': ('counter', 'Time spent in SQL statements by endpoint.'),
+    'db_pool_checkouts_total': ('counter', 'Connections checked out of the pool.'),
+    'db_pool_timeouts_total': ('counter', 'Pool checkouts that timed out.'),
+    'db_pool_wait_seconds_total': ('counter', 'Time spent waiting for a pooled connection.'),
+    'db_pool_size': ('gauge', 'Configured pool size, summed over workers.'),
+    'db_checked_out': ('gauge', 'Connections in use, summed over workers.'),
+    'db_checked_in': ('gauge', 'Idle pooled connections, summed over workers.'),
+    'db_overflow': ('gauge', 'Overflow connections, summed over workers.'),
+    'event_stream_subscribers': ('gauge', 'Open /events streams, summed over workers.'),
+}
+
+
+class PoolMetrics:
+    """Счетчики выдачи соединений из пула."""
+
+    def __init__(self):
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self._lock = Lock()
+
+    def record(self, waited, timed_out=False):
+        """
+        Учитывает одну попытку получить соединение.
+
+        :param waited: Время ожидания в секундах (float).
+        :param timed_out: True, если соединение так и не было получено (bool).
+        """
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+
+    def stats(self, pool=None):
+        """
+        Возвращает счетчики вместе с текущим состоянием пула.
+
+        :param pool: Пул соединений движка или None.
+        :return: Словарь со счетчиками.
+        """
+        with self._lock:
+            stats = {
+                'checkouts': self.checkouts,
+                'timeouts': self.timeouts,
+                'wait_total_ms': round(self.wait_total * 1000, 3),
+                'wait_avg_ms': round(self.wait_total * 1000 / self.checkouts, 3) if self.checkouts else 0.0,
+                'wait_max_ms': round(self.wait_max * 1000, 3),
+            }
+        if isinstance(pool, QueuePool):
+            stats.update({
+                'pool_size': pool.size(),
+                'checked_out': pool.checkedout(),
+                'checked_in': pool.checkedin(),
+                'overflow': pool.overflow(),
+            })
+        return stats
+
+
+pool_metrics = PoolMetrics()
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool, замеряющий время ожидания свободного соединения."""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except Exception:
+            pool_metrics.record(time.perf_counter() - started, timed_out=True)
+            raise
+        pool_metrics.record(time.perf_counter() - started)
+        return connection
+
+
+class Histogram:
+    """Накопительная гистограмма с фиксированными границами корзин."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+
+    def observe(self, value):
+        """
+        Учитывает одно значение.
+
+        :param value: Наблюдаемое значение (float).
+        """
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.total += value
+
+    def samples(self, name, labels):
+        """
+        Возвращает значения гистограммы для render_samples.
+
+        :param name: Имя метрики (str).
+        :param labels: Метки в виде строки 'key="value",...' (str).
+        :return: Список кортежей (метрика, имя значения, метки, значение).
+        """
+        samples = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            samples.append((name, f'{name}_bucket', f'{labels},le="{bound}"', cumulative))
+        cumulative += self.counts[-1]
+        samples.append((name, f'{name}_bucket', f'{labels},le="+Inf"', cumulative))
+        samples.append((name, f'{name}_sum', labels, round(self.total, 6)))
+        samples.append((name, f'{name}_count', labels, cumulative))
+        return samples
+
+
+class RequestMetrics:
+    """Время ответа, число SQL-запросов и время базы данных по маршрутам."""
+
+    def __init__(self):
+        self.latency = defaultdict(lambda: Histogram(LATENCY_BUCKETS))
+        self.queries = defaultdict(lambda: Histogram(QUERY_COUNT_BUCKETS))
+        self.db_seconds = defaultdict(float)
+        self._lock = Lock()
+
+    def record(self, endpoint, method, elapsed, query_count, db_seconds):
+        """
+        Учитывает один обработанный запрос.
+
+        :param endpoint: Имя маршрута Flask (str).
+        :param method: HTTP-метод (str).
+        :param elapsed: Время обработки в секундах (float).
+        :param query_count: Число выполненных SQL-запросов (int).
+        :param db_seconds: Суммарное время SQL-запросов в секундах (float).
+        """
+        key = (endpoint, method)
+        with self._lock:
+            self.latency[key].observe(elapsed)
+            self.queries[key].observe(query_count)
+            self.db_seconds[key] += db_seconds
+
+    def samples(self):
+        """
+        Возвращает значения всех метрик запросов для render_samples.
+
+        :return: Список кортежей (метрика, имя значения, метки, значение).
+        """
+        samples = []
+        with self._lock:
+            keys = sorted(self.latency)
+            for key in keys:
+                samples.extend(self.latency[key].samples('http_request_duration_seconds', _labels(key)))
+            for key in keys:
+                samples.extend(self.queries[key].samples('db_queries_per_request', _labels(key)))
+            for key in keys:
+                samples.append(('db_seconds_total', 'db_seconds_total', _labels(key), round(self.db_seconds[key], 6)))
+        return samples
+
+
+request_metrics = RequestMetrics()
+
+
+def _labels(key):
+    endpoint, method = key
+    return f'endpoint="{endpoint}",method="{method}"'
+
+
+def _pool_samples(pool):
+    stats = pool_metrics.stats(pool)
+    samples = [
+        ('db_pool_checkouts_total', 'db_pool_checkouts_total', '', stats['checkouts']),
+        ('db_pool_timeouts_total', 'db_pool_timeouts_total', '', stats['timeouts']),
+        ('db_pool_wait_seconds_total', 'db_pool_wait_seconds_total', '', stats['wait_total_ms'] / 1000),
+    ]
+    for name in ('pool_size', 'checked_out', 'checked_in', 'overflow'):
+        if name in stats:
+            samples.append((f'db_{name}', f'db_{name}', '', stats[name]))
+    return samples
+
+
+def _event_samples():
+    count = event_bus.subscriber_count()
+    if count is None:
+        return []
+    return [('event_stream_subscribers', 'event_stream_subscribers', '', count)]
+
+
+def process_samples():
+    """
+    Возвращает текущие значения всех метрик этого процесса.
+
+    :return: Список кортежей (метрика, имя значения, метки, значение).
+    """
+    return request_metrics.samples() + _pool_samples(db.engine.pool) + _event_samples()
+
+
+def render_samples(samples):
+    """
+    Форматирует значения метрик в текстовом формате Prometheus.
+
+    :param samples: Кортежи (метрика, имя значения, метки, значение).
+    :return: Текст метрик (str).
+    """
+    by_family = defaultdict(list)
+    for family, name, labels, value in samples:
+        by_family[family].append((name, labels, value))
+    lines = []
+    for family, (kind, help_text) in FAMILIES.items():
+        if family not in by_family:
+            continue
+        lines.extend([f'# HELP {family} {help_text}', f'# TYPE {family} {kind}'])
+        for name, labels, value in by_family[family]:
+            value = int(value) if float(value).is_integer() else value
+            lines.append(f'{name}{{{labels}}} {value}' if labels else f'{name} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class SqliteMetricsStore:
+    """
+    Снимки метрик рабочих процессов в файле SQLite, общем для процессов сервера.
+
+    Каждый процесс хранит под своим идентификатором ('pid:время запуска')
+    последний снимок своих значений. Соединение открывается отдельно в
+    каждом процессе.
+    """
+
+    archive = 'archive'
+
+    def __init__(self, path):
+        """
+        :param path: Путь к файлу базы (str).
+        """
+        self.path = path
+        self._connection = None
+        self._pid = None
+        self._worker = None
+        self._lock = Lock()
+
+    def publish(self, samples):
+        """
+        Заменяет снимок текущего процесса.
+
+        :param samples: Кортежи (метрика, имя значения, метки, значение).
+        """
+        with self._lock:
+            connection = self._connect()
+            rows = [
+                (self._worker, seq, family, name, labels, value, FAMILIES[family][0] == 'gauge')
+                for seq, (family, name, labels, value) in enumerate(samples)
+            ]
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                connection.execute('DELETE FROM metric_samples WHERE worker = ?', (self._worker,))
+                connection.executemany(
+                    'INSERT INTO metric_samples (worker, seq, family, name, labels, value, gauge) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?)', rows
+                )
+                connection.execute('COMMIT')
+            except Exception:
+                connection.execute('ROLLBACK')
+                raise
+
+    def collect(self):
+        """
+        Суммирует снимки всех процессов, предварительно перенося счетчики
+        завершившихся процессов в архив.
+
+        :return: Список кортежей (метрика, имя значения, метки, значение).
+        """
+        with self._lock:
+            connection = self._connect()
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                workers = [
+                    worker for worker, in connection.execute(
+                        'SELECT DISTINCT worker FROM metric_samples WHERE worker != ?', (self.archive,)
+                    )
+                ]
+                for worker in workers:
+                    if _pid_alive(int(worker.split(':', 1)[0])):
+                        continue
+                    connection.execute(
+                        'INSERT INTO metric_samples (worker, seq, family, name, labels, value, gauge) '
+                        'SELECT ?, seq, family, name, labels, value, gauge FROM metric_samples '
+                        'WHERE worker = ? AND gauge = 0 '
+                        'ON CONFLICT (worker, family, name, labels) DO UPDATE SET value = value + excluded.value',
+                        (self.archive, worker)
+                    )
+                    connection.execute('DELETE FROM metric_samples WHERE worker = ?', (worker,))
+                connection.execute('COMMIT')
+            except Exception:
+                connection.execute('ROLLBACK')
+                raise
+            return connection.execute(
+                'SELECT family, name, labels, SUM(value) FROM metric_samples '
+                'GROUP BY family, name, labels ORDER BY MIN(seq)'
+            ).fetchall()
+
+    def _connect(self):
+        if self._connection is None or self._pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS metric_samples (worker TEXT NOT NULL, seq INTEGER NOT NULL, '
+                'family TEXT NOT NULL, name TEXT NOT NULL, labels TEXT NOT NULL, value REAL NOT NULL, '
+                'gauge INTEGER NOT NULL, PRIMARY KEY (worker, family, name, labels))'
+            )
+            self._connection = connection
+            self._pid = os.getpid()
+            self._worker = f'{self._pid}:{time.time()}'
+        return self._connection
+
+
+class MetricsExporter:
+    """Выдача метрик процесса или суммы по всем процессам (METRICS_BACKEND)."""
+
+    def __init__(self):
+        self.store = None
+        self.flush_seconds = 5
+        self._flusher_pid = None
+        self._lock = Lock()
+
+    def init_app(self, app):
+        """
+        Выбирает хранилище снимков по настройке METRICS_BACKEND.
+
+        :param app: Приложение Flask.
+        """
+        self.store = SqliteMetricsStore(app.config['METRICS_DB_PATH']) if app.config['METRICS_BACKEND'] == 'sqlite' else None
+        self.flush_seconds = app.config['METRICS_FLUSH_SECONDS']
+        self._flusher_pid = None
+
+    def flush(self):
+        """Записывает снимок метрик процесса в общее хранилище."""
+        if self.store is not None:
+            self.store.publish(process_samples())
+
+    def start_flusher(self, app):
+        """
+        Запускает в текущем процессе поток, записывающий снимок раз в
+        METRICS_FLUSH_SECONDS, если он еще не запущен.
+
+        :param app: Приложение Flask.
+        """
+        if self.store is None or self._flusher_pid == os.getpid():
+            return
+        with self._lock:
+            if self._flusher_pid == os.getpid():
+                return
+            self._flusher_pid = os.getpid()
+        Thread(target=self._flush_forever, args=(app, self._flusher_pid), name='metrics-flusher', daemon=True).start()
+
+    def _flush_forever(self, app, pid):
+        while self._flusher_pid == pid:
+            time.sleep(self.flush_seconds)
+            try:
+                with app.app_context():
+                    self.flush()
+            except Exception:
+                logger.warning("Не удалось записать снимок метрик", exc_info=True)
+
+    def render(self):
+        """
+        Возвращает метрики в текстовом формате Prometheus.
+
+        :return: Текст метрик (str).
+        """
+        if self.store is None:
+            return render_samples(process_samples())
+        self.flush()
+        return render_samples(self.store.collect())
+
+
+metrics_exporter = MetricsExporter()
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info['query_started'].pop()
+    if has_request_context() and 'query_count' in g:
+        g.query_count += 1
+        g.db_seconds += time.perf_counter() - started
+
+
+@event.listens_for(Engine, 'handle_error')
+def _handle_error(context):
+    if getattr(context, 'is_pre_ping', False) or context.connection is None:
+        return
+    started = context.connection.info.get('query_started')
+    if started:
+        started.pop()
+
+
+def _metrics_allowed(app):
+    if request.remote_addr in app.config['METRICS_ALLOWED_IPS']:
+        return True
+    token = app.config['METRICS_TOKEN']
+    header = request.headers.get('Authorization', '')
+    return bool(token) and hmac.compare_digest(header, f'Bearer {token}')
+
+
+def _start_request():
+    g.request_started = time.perf_counter()
+    g.query_count = 0
+    g.db_seconds = 0.0
+
+
+def _finish_request(exc):
+    if 'request_started' not in g:
+        return
+    request_metrics.record(
+        request.endpoint or 'unknown', request.method,
+        time.perf_counter() - g.request_started, g.query_count, g.db_seconds
+    )
+    metrics_exporter.start_flusher(current_app._get_current_object())
+
+
+def init_instrumentation(app):
+    """
+    Подключает замер пула соединений и запросов.
+
+    Класс пула с замером ожидания подставляется, если в настройках движка
+    не задан свой. Вызывается до инициализации расширения базы данных.
+
+    :param app: Приложение Flask.
+    """
+    options = dict(app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {}))
+    if 'poolclass' not in options and 'pool_size' in options:
+        options['poolclass'] = InstrumentedQueuePool
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+
+    if not app.config.get('METRICS_ENABLED', True):
+        return
+    metrics_exporter.init_app(app)
+    app.before_request(_start_request)
+    app.teardown_request(_finish_request)
+
+    def metrics():
+        if not _metrics_allowed(app):
+            abort(403)
+        return app.response_class(metrics_exporter.render(), mimetype='text/plain; version=0.0.4')
+
+    app.add_url_rule('/metrics', 'metrics', metrics)
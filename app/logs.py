@@ -0,0 +1,75 @@
+"""
+Настройка журналирования.
+
+Этот файл содержит настройку логов приложения: уровень для всего приложения
+и для отдельных модулей берется из конфигурации, записи выводятся в текстовом
+или JSON-формате, а частые отладочные события с пометкой SAMPLED
+записываются лишь в заданной доле случаев, чтобы отладочный режим не
+замедлял горячие маршруты.
+"""
+
+from datetime import datetime, timezone
+import json
+import logging
+import random
+
+HANDLER_NAME = 'skodaexpert'
+TEXT_FORMAT = '%(asctime)s %(levelname)s %(name)s: %(message)s'
+SAMPLED = {'sampled': True}
+
+
+class SamplingFilter(logging.Filter):
+    """Пропускает только долю записей, помеченных как SAMPLED."""
+
+    def __init__(self, rate):
+        """
+        :param rate: Доля пропускаемых помеченных записей от 0 до 1 (float).
+        """
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        if not getattr(record, 'sampled', False) or self.rate >= 1:
+            return True
+        return random.random() < self.rate
+
+
+class JsonFormatter(logging.Formatter):
+    """Выводит запись одной строкой JSON."""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+def init_logging(app):
+    """
+    Настраивает журналирование по конфигурации приложения.
+
+    Повторный вызов заменяет обработчик, добавленный предыдущим вызовом.
+
+    :param app: Приложение Flask.
+    """
+    handler = logging.StreamHandler()
+    handler.set_name(HANDLER_NAME)
+    if app.config['LOG_FORMAT'] == 'json':
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+    handler.addFilter(SamplingFilter(app.config['LOG_DEBUG_SAMPLE_RATE']))
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        if existing.get_name() == HANDLER_NAME:
+            root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(app.config['LOG_LEVEL'])
+    for name, level in app.config['LOG_LEVELS'].items():
+        logging.getLogger(name).setLevel(level)
@@ -0,0 +1,150 @@
+"""
+Версионные изменения схемы базы данных.
+
+Этот файл содержит упорядоченный список миграций и команду flask upgrade-db,
+которая применяет к базе еще не примененные миграции. Номер каждой
+примененной миграции записывается в таблицу schema_migrations, поэтому
+повторный запуск ничего не меняет. Новые таблицы и индексы, объявленные
+в моделях, попадают в существующую базу только через новую миграцию.
+"""
+
+from datetime import datetime
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, inspect, select, text, update
+from .models import BookingDay, Car, Client, DailyStat, Employee, Order, OrderService, Service, StatDelta, Task
+from . import db
+
+schema_metadata = MetaData()
+
+LEGACY_CREATED_AT = datetime(2000, 1, 1)
+
+schema_migrations = Table(
+    'schema_migrations', schema_metadata,
+    Column('version', Integer, primary_key=True),
+    Column('description', String(200), nullable=False),
+    Column('applied_at', DateTime, nullable=False),
+)
+
+
+def _create_table(model):
+    def apply(connection):
+        model.__table__.create(connection, checkfirst=True)
+    return apply
+
+
+def _create_indexes(*names):
+    def apply(connection):
+        indexes = {
+            index.name: index
+            for model in (Employee, Client, Order, Task)
+            for index in model.__table__.indexes
+        }
+        for name in names:
+            indexes[name].create(connection, checkfirst=True)
+    return apply
+
+
+def _require_created_at(*models):
+    def apply(connection):
+        for model in models:
+            table = model.__table__
+            connection.execute(
+                update(table).where(table.c.created_at.is_(None)).values(created_at=LEGACY_CREATED_AT)
+            )
+            if connection.dialect.name == 'firebird':
+                connection.execute(text(f'ALTER TABLE {table.name} ALTER COLUMN created_at SET NOT NULL'))
+    return apply
+
+
+def _add_columns(*columns):
+    def apply(connection):
+        for column in columns:
+            table = column.table
+            existing = {info['name'].lower() for info in inspect(connection).get_columns(table.name)}
+            if column.name.lower() not in existing:
+                column_type = column.type.compile(dialect=connection.dialect)
+                connection.execute(text(f'ALTER TABLE {table.name} ADD {column.name} {column_type}'))
+    return apply
+
+
+def _store_booked_values(connection):
+    _add_columns(OrderService.__table__.c.price, Order.__table__.c.car_model_id)(connection)
+    order_services = OrderService.__table__
+    orders = Order.__table__
+    connection.execute(
+        update(order_services)
+        .where(order_services.c.price.is_(None))
+        .values(price=select(Service.price).where(Service.id == order_services.c.service_id).scalar_subquery())
+    )
+    connection.execute(
+        update(orders)
+        .where(orders.c.car_model_id.is_(None))
+        .values(car_model_id=select(Car.car_model_id).where(Car.id == orders.c.car_id).scalar_subquery())
+    )
+
+
+MIGRATIONS = [
+    (1, 'Таблица booking_days для блокировки дня записи', _create_table(BookingDay)),
+    (2, 'Таблица daily_stats для дневных сводок', _create_table(DailyStat)),
+    (3, 'Индексы keyset-пагинации списков', _create_indexes(
+        'ix_employees_role_created_at_id', 'ix_clients_created_at_id',
+        'ix_orders_created_at_id', 'ix_orders_client_created_at_id'
+    )),
+    (4, 'Индексы расписания и задач механиков', _create_indexes(
+        'ix_orders_appointment', 'ix_tasks_employee_status'
+    )),
+    (5, 'Обязательное created_at у сотрудников, клиентов и заказов', _require_created_at(
+        Employee, Client, Order
+    )),
+    (6, 'Цены услуг и модель автомобиля на момент записи', _store_booked_values),
+    (7, 'Таблица stat_deltas для изменений дневных сводок', _create_table(StatDelta)),
+]
+
+
+def applied_versions():
+    """
+    Возвращает номера уже примененных миграций.
+
+    :return: Множество номеров (set).
+    """
+    with db.engine.begin() as connection:
+        schema_metadata.create_all(connection, checkfirst=True)
+    with db.engine.connect() as connection:
+        return {version for version, in connection.execute(select(schema_migrations.c.version))}
+
+
+def upgrade():
+    """
+    Применяет все еще не примененные миграции по порядку.
+
+    Каждая миграция выполняется в своей транзакции вместе с записью
+    ее номера в schema_migrations.
+
+    :return: Список примененных миграций (пары номер, описание).
+    """
+    done = applied_versions()
+    applied = []
+    for version, description, apply in MIGRATIONS:
+        if version in done:
+            continue
+        with db.engine.begin() as connection:
+            apply(connection)
+            connection.execute(schema_migrations.insert().values(
+                version=version, description=description, applied_at=datetime.utcnow()
+            ))
+        applied.append((version, description))
+    return applied
+
+
+@click.command('upgrade-db')
+@with_appcontext
+def upgrade_db_command():
+    """Применяет к базе данных недостающие миграции схемы."""
+    applied = upgrade()
+    for version, description in applied:
+        click.echo(f"Применена миграция {version}: {description}")
+    if not applied:
+        click.echo("Схема базы данных актуальна")
+    elif any(version == 2 for version, _ in applied):
+        click.echo("Заполните дневные сводки командой flask rebuild-stats")
@@ -6,23 +6,29 @@ from . import db
 class Employee(db.Model):
     """Модель сотрудника."""
     __tablename__ = 'employees'
+    __table_args__ = (
+        db.Index('ix_employees_role_created_at_id', 'role', 'created_at', 'id', firebird_descending=True),
+    )
     id = db.Column(Integer, primary_key=True)
     name = db.Column(String(255))
     email = db.Column(String(255), unique=True)
     phone = db.Column(String(20))
     password = db.Column("PASSWORD", String(255))
     role = db.Column(String(50))
-    created_at = db.Column(DateTime, default=datetime.utcnow)
+    created_at = db.Column(DateTime, default=datetime.utcnow, nullable=False)
 
 class Client(db.Model):
     """Модель клиента."""
     __tablename__ = 'clients'
+    __table_args__ = (
+        db.Index('ix_clients_created_at_id', 'created_at', 'id', firebird_descending=True),
+    )
     id = db.Column(Integer, primary_key=True)
     name = db.Column(String(100), nullable=False)
     email = db.Column(String(100), nullable=False, unique=True)
     phone = db.Column(String(15), nullable=False, unique=True)
     password = db.Column(String(200), nullable=False)
-    created_at = db.Column(DateTime, default=datetime.utcnow)
+    created_at = db.Column(DateTime, default=datetime.utcnow, nullable=False)
     last_name = db.Column(String(100), nullable=False)
     first_name = db.Column(String(100), nullable=False)
     middle_name = db.Column(String(100))
@@ -58,28 +64,40 @@ class Service(db.Model):
 
 class Order(db.Model):
     __tablename__ = 'orders'
+    __table_args__ = (
+        db.Index('ix_orders_created_at_id', 'created_at', 'id', firebird_descending=True),
+        db.Index('ix_orders_client_created_at_id', 'client_id', 'created_at', 'id', firebird_descending=True),
+        db.Index('ix_orders_appointment', 'appointment_date', 'appointment_time'),
+    )
     id = db.Column(Integer, primary_key=True)
     client_id = db.Column(Integer, ForeignKey('clients.id'), nullable=False)
     car_id = db.Column(Integer, ForeignKey('cars.id'), nullable=False)
     car_brand = db.Column(String(100), nullable=False)
     car_model = db.Column(String(100), nullable=False)
-    created_at = db.Column(DateTime, default=datetime.utcnow)
+    created_at = db.Column(DateTime, default=datetime.utcnow, nullable=False)
     appointment_date = db.Column(Date, nullable=False)
     appointment_time = db.Column(Time, nullable=False)
     end_time = db.Column(Time, nullable=False)
+    car_model_id = db.Column(Integer, ForeignKey('car_models.id'))
     services = db.relationship('Service', secondary='order_services', backref='orders')
     car = db.relationship('Car', backref='orders')
     client = db.relationship('Client', backref='orders')
-    tasks = db.relationship('Task', back_populates='order')
+    tasks = db.relationship('Task', back_populates='order', cascade='all, delete-orphan')
 
 class OrderService(db.Model):
     """Модель связи заказа и услуги."""
     __tablename__ = 'order_services'
     order_id = db.Column(Integer, ForeignKey('orders.id'), primary_key=True)
     service_id = db.Column(Integer, ForeignKey('services.id'), primary_key=True)
+    price = db.Column(Float)
+
+TASK_STATUSES = ('pending', 'in_progress', 'completed')
 
 class Task(db.Model):
     __tablename__ = 'tasks'
+    __table_args__ = (
+        db.Index('ix_tasks_employee_status', 'employee_id', 'status'),
+    )
     id = db.Column(Integer, primary_key=True)
     employee_id = db.Column(Integer, ForeignKey('employees.id'), nullable=False)
     order_id = db.Column(Integer, ForeignKey('orders.id'), nullable=False)
@@ -104,3 +122,44 @@ class OrderHistory(db.Model):
     client_id = db.Column(Integer, ForeignKey('clients.id'), nullable=False)
     car_id = db.Column(Integer, ForeignKey('cars.id'), nullable=False)
     created_at = db.Column(DateTime, default=datetime.utcnow)
+
+class BookingDay(db.Model):
+    """Модель блокировки дня записи: строка блокируется на время оформления заказа на эту дату."""
+    __tablename__ = 'booking_days'
+    day = db.Column(Date, primary_key=True)
+    version = db.Column(Integer, nullable=False, default=0)
+
+class DailyStat(db.Model):
+    """
+    Модель дневной сводки для статистики и отчетов.
+
+    Показатели (metric):
+    - orders: количество заказов и выручка за день (item_id = 0);
+    - service: количество и выручка по услуге (item_id = id услуги);
+    - car_model: количество заказов по модели автомобиля (item_id = id модели);
+    - task: количество задач механика в статусе label (item_id = id механика).
+    """
+    __tablename__ = 'daily_stats'
+    stat_date = db.Column(Date, primary_key=True)
+    metric = db.Column(String(20), primary_key=True)
+    item_id = db.Column(Integer, primary_key=True, default=0)
+    label = db.Column(String(50), primary_key=True, default='')
+    quantity = db.Column(Integer, nullable=False, default=0)
+    amount = db.Column(Float, nullable=False, default=0)
+
+class StatDelta(db.Model):
+    """
+    Модель изменения дневной сводки, еще не перенесенного в daily_stats.
+
+    Транзакции заказов и задач только добавляют сюда строки и не обновляют
+    общие строки daily_stats, поэтому не конфликтуют друг с другом.
+    Изменения переносит в daily_stats функция fold_stat_deltas.
+    """
+    __tablename__ = 'stat_deltas'
+    id = db.Column(Integer, primary_key=True)
+    stat_date = db.Column(Date, nullable=False)
+    metric = db.Column(String(20), nullable=False)
+    item_id = db.Column(Integer, nullable=False, default=0)
+    label = db.Column(String(50), nullable=False, default='')
+    quantity = db.Column(Integer, nullable=False, default=0)
+    amount = db.Column(Float, nullable=False, default=0)
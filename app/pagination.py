@@ -0,0 +1,69 @@
+"""
+Постраничный вывод списков.
+
+Этот файл содержит keyset-пагинацию по паре (created_at, id): каждая следующая
+страница выбирается условием «строго раньше последней показанной записи»,
+поэтому время выборки не зависит от номера страницы и размера таблицы.
+"""
+
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import namedtuple
+from datetime import datetime
+from sqlalchemy import and_, or_
+
+Page = namedtuple('Page', ['items', 'next_cursor'])
+
+
+def encode_cursor(created_at, item_id):
+    """
+    Кодирует позицию записи в строку курсора.
+
+    :param created_at: Время создания записи (datetime).
+    :param item_id: Идентификатор записи (int).
+    :return: Курсор (str).
+    """
+    raw = f"{created_at.isoformat()}|{item_id}"
+    return urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    Декодирует курсор в позицию записи.
+
+    :param cursor: Курсор (str) или None.
+    :return: Кортеж (created_at, id) или None, если курсор пустой или некорректный.
+    """
+    if not cursor:
+        return None
+    try:
+        raw = urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        created_at, item_id = raw.rsplit('|', 1)
+        return datetime.fromisoformat(created_at), int(item_id)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def paginate(query, model, cursor=None, per_page=50):
+    """
+    Возвращает страницу записей, отсортированных от новых к старым.
+
+    :param query: Запрос с уже примененными фильтрами.
+    :param model: Модель с полями created_at и id.
+    :param cursor: Курсор последней записи предыдущей страницы (str) или None.
+    :param per_page: Количество записей на странице (int).
+    :return: Объект Page со списком записей и курсором следующей страницы.
+    """
+    position = decode_cursor(cursor)
+    if position:
+        created_at, item_id = position
+        query = query.filter(or_(
+            model.created_at < created_at,
+            and_(model.created_at == created_at, model.id < item_id)
+        ))
+    rows = query.order_by(model.created_at.desc(), model.id.desc()).limit(per_page + 1).all()
+    items = rows[:per_page]
+    next_cursor = None
+    if len(rows) > per_page:
+        last = items[-1]
+        next_cursor = encode_cursor(last.created_at, last.id)
+    return Page(items, next_cursor)
@@ -0,0 +1,224 @@
+"""
+Формирование PDF-документов.
+
+Этот файл содержит отрисовку заказ-нарядов и отчета менеджера. Шрифт и логотип
+загружаются один раз при запуске приложения, постоянная шапка документа описывается
+один раз как form XObject и переиспользуется на каждой странице, а для
+каждого заказа рисуются только его собственные поля.
+
+Изображения записываются в PDF без кодирования ASCII85: без C-расширения
+rl_accel ReportLab кодирует их на Python заново в каждом документе, и на
+логотип уходило больше половины времени отрисовки заказ-наряда.
+"""
+
+from io import BytesIO
+from threading import Lock
+import logging
+import os
+from reportlab import rl_config
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.units import inch
+from reportlab.lib.utils import ImageReader
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+from reportlab.platypus import Table, TableStyle
+
+logger = logging.getLogger(__name__)
+
+FONT_NAME = 'Arial'
+FALLBACK_FONT_NAME = 'Helvetica'
+HEADER_FORM = 'order_header'
+REPORT_TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+    ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black),
+])
+
+
+class PdfResources:
+    """Шрифт и логотип, общие для всех документов процесса."""
+
+    def __init__(self):
+        self.font_name = FALLBACK_FONT_NAME
+        self.logo = None
+        self.loaded = False
+        self._lock = Lock()
+
+    def load(self, font_path, logo_path):
+        """
+        Регистрирует шрифт и читает логотип, если это еще не сделано.
+
+        :param font_path: Путь к TTF-файлу шрифта.
+        :param logo_path: Путь к изображению логотипа.
+        """
+        with self._lock:
+            if self.loaded:
+                return
+            rl_config.useA85 = 0
+            try:
+                pdfmetrics.registerFont(TTFont(FONT_NAME, font_path))
+                self.font_name = FONT_NAME
+            except Exception as e:
+                logger.error("Не удалось зарегистрировать шрифт %s: %s", font_path, e)
+            if logo_path and os.path.exists(logo_path):
+                self.logo = ImageReader(logo_path)
+            self.loaded = True
+
+
+resources = PdfResources()
+
+
+def init_pdf(app):
+    """
+    Загружает ресурсы PDF при создании приложения.
+
+    :param app: Приложение Flask.
+    """
+    resources.load(app.config['PDF_FONT_PATH'], app.config['PDF_LOGO_PATH'])
+
+
+def order_sheet(order):
+    """
+    Собирает данные заказа, необходимые для заказ-наряда.
+
+    :param order: Объект заказа.
+    :return: Словарь с полями заказ-наряда.
+    :raises ValueError: Если время или дата записи не указаны.
+    """
+    if not order.appointment_date or not order.appointment_time:
+        raise ValueError("Время и дата записи не могут быть None")
+    return {
+        'id': order.id,
+        'client_name': order.client.name,
+        'client_phone': order.client.phone,
+        'car': f"{order.car_brand} {order.car_model}",
+        'car_year': order.car.car_year,
+        'license_plate': order.car.license_plate,
+        'vin': order.car.vin,
+        'appointment': f"{order.appointment_date.strftime('%d.%m.%Y')} {order.appointment_time}",
+        'services': [(service.service_name, service.price) for service in order.services],
+    }
+
+
+def _define_header(pdf):
+    pdf.beginForm(HEADER_FORM)
+    if resources.logo is not None:
+        pdf.drawImage(resources.logo, 1 * inch, 10.5 * inch, width=1.5 * inch, height=0.75 * inch)
+    pdf.setFont(resources.font_name, 14)
+    pdf.drawString(2.5 * inch, 10.75 * inch, "Автосервис SkodaExpert")
+    pdf.endForm()
+
+
+def draw_order_page(pdf, sheet):
+    """
+    Рисует заказ-наряд на текущей странице.
+
+    :param pdf: Холст ReportLab.
+    :param sheet: Данные заказ-наряда из order_sheet.
+    """
+    if not pdf.hasForm(HEADER_FORM):
+        _define_header(pdf)
+    pdf.doForm(HEADER_FORM)
+
+    pdf.setFont(resources.font_name, 12)
+    pdf.drawString(1 * inch, 9.5 * inch, f"Номер заказ-наряда: {sheet['id']}")
+    pdf.drawString(1 * inch, 9 * inch, f"Имя заказчика: {sheet['client_name']}")
+    pdf.drawString(1 * inch, 8.5 * inch, f"Телефон: {sheet['client_phone']}")
+    pdf.drawString(1 * inch, 8 * inch, f"Марка и модель авто: {sheet['car']}")
+    pdf.drawString(1 * inch, 7.5 * inch, f"Год выпуска: {sheet['car_year']}")
+    pdf.drawString(1 * inch, 7 * inch, f"Гос номер: {sheet['license_plate']}")
+    pdf.drawString(1 * inch, 6.5 * inch, f"VIN код: {sheet['vin']}")
+    pdf.drawString(1 * inch, 6 * inch, f"Время записи: {sheet['appointment']}")
+
+    pdf.drawString(1 * inch, 5.5 * inch, "Выбранные услуги:")
+    y_position = 5 * inch
+    total_price = 0
+
+    for service_name, price in sheet['services']:
+        pdf.drawString(1.5 * inch, y_position, f"- {service_name}: {price} руб.")
+        total_price += price
+        y_position -= 0.25 * inch
+
+    pdf.drawString(1 * inch, y_position - 0.5 * inch, f"Итоговая стоимость: {total_price} руб.")
+
+
+def render_order_pdf(sheet):
+    """
+    Формирует PDF заказ-наряда.
+
+    :param sheet: Данные заказ-наряда из order_sheet.
+    :return: Содержимое PDF (bytes).
+    """
+    buffer = BytesIO()
+    pdf = canvas.Canvas(buffer, pagesize=letter)
+    draw_order_page(pdf, sheet)
+    pdf.save()
+    return buffer.getvalue()
+
+
+def render_orders_pdf(sheets):
+    """
+    Формирует один многостраничный PDF из нескольких заказ-нарядов.
+
+    Шапка описывается один раз и переиспользуется на всех страницах.
+
+    :param sheets: Список данных заказ-нарядов из order_sheet.
+    :return: Содержимое PDF (bytes).
+    """
+    buffer = BytesIO()
+    pdf = canvas.Canvas(buffer, pagesize=letter)
+    for sheet in sheets:
+        draw_order_page(pdf, sheet)
+        pdf.showPage()
+    pdf.save()
+    return buffer.getvalue()
+
+
+def render_manager_report(report):
+    """
+    Формирует PDF общего отчета менеджера.
+
+    :param report: Данные отчета из generate_manager_report.
+    :return: Содержимое PDF (bytes).
+    """
+    buffer = BytesIO()
+    pdf = canvas.Canvas(buffer, pagesize=letter)
+    pdf.setFont("Helvetica-Bold", 16)
+    pdf.drawString(50, 750, "Общий отчет менеджера")
+    pdf.setFont("Helvetica", 12)
+    pdf.drawString(50, 720, f"Общее количество заказов: {report['total_orders']}")
+    pdf.drawString(50, 700, f"Общий доход: {report['total_revenue']} руб.")
+    pdf.setFont("Helvetica-Bold", 14)
+    pdf.drawString(50, 670, "Статистика по моделям автомобилей")
+    data = [["Марка", "Модель", "Количество заказов"]]
+    for item in report['orders_by_model']:
+        data.append([item['brand'], item['model_name'], str(item['order_count'])])
+    table = Table(data)
+    table.setStyle(REPORT_TABLE_STYLE)
+    table.wrapOn(pdf, 400, 200)
+    table.drawOn(pdf, 50, 550)
+    pdf.setFont("Helvetica-Bold", 14)
+    pdf.drawString(50, 500, "Финансовые показатели по услугам")
+    data = [["Услуга", "Доход (руб.)"]]
+    for item in report['revenue_by_service']:
+        data.append([item['service_name'], str(item['revenue'])])
+    table = Table(data)
+    table.setStyle(REPORT_TABLE_STYLE)
+    table.wrapOn(pdf, 400, 200)
+    table.drawOn(pdf, 50, 350)
+    pdf.showPage()
+    pdf.save()
+    return buffer.getvalue()
+
+
+RENDERERS = {
+    'order': render_order_pdf,
+    'orders': render_orders_pdf,
+    'manager_report': render_manager_report,
+}
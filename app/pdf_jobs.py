@@ -0,0 +1,269 @@
+"""
+Фоновая генерация PDF-документов.
+
+Этот файл содержит очередь заданий на отрисовку PDF. Документы рисуются в
+отдельном пуле процессов: отрисовка ReportLab не держит GIL рабочего
+процесса, поэтому остальные его потоки продолжают обслуживать запросы, а
+число одновременных отрисовок ограничено PDF_WORKERS. Поток запроса,
+заказавший документ, при этом ждет результата. Готовый файл сохраняется
+в кэш на диске под именем, равным хэшу данных документа. Пока данные заказа
+(услуги, цены, автомобиль) не меняются, повторные скачивания отдаются с
+диска без повторной отрисовки, а хэш используется как ETag.
+
+Размер кэша ограничен PDF_CACHE_MAX_BYTES и PDF_CACHE_MAX_AGE: после каждых
+prune_every отрисовок удаляются устаревшие файлы, а затем давно не
+запрошенные, пока кэш не уложится в лимит.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from hashlib import sha256
+from threading import RLock
+import json
+import os
+import tempfile
+import time
+import zipfile
+from .pdf import RENDERERS, resources
+
+
+def cache_key(kind, payload):
+    """
+    Вычисляет ключ документа по его данным.
+
+    :param kind: Вид документа ('order' или 'manager_report').
+    :param payload: Данные документа (словарь, сериализуемый в JSON).
+    :return: Шестнадцатеричный хэш (str).
+    """
+    raw = json.dumps([kind, payload], sort_keys=True, ensure_ascii=False, default=str)
+    return sha256(raw.encode('utf-8')).hexdigest()
+
+
+def _init_worker(font_path, logo_path):
+    resources.load(font_path, logo_path)
+
+
+def _render_to_file(kind, payload, path):
+    data = RENDERERS[kind](payload)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as tmp:
+            tmp.write(data)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return path
+
+
+class PdfJobQueue:
+    """
+    Пул процессов для отрисовки PDF с кэшем готовых файлов на диске.
+
+    Одинаковые задания, пришедшие одновременно, объединяются: второй запрос
+    ждет результата уже запущенной отрисовки.
+    """
+
+    prune_every = 50
+    keep_recent_seconds = 300
+
+    def __init__(self):
+        self.cache_dir = None
+        self.max_bytes = None
+        self.max_age = None
+        self._renders = 0
+        self.workers = 1
+        self.timeout = None
+        self.font_path = None
+        self.logo_path = None
+        self._executor = None
+        self._pending = {}
+        self._lock = RLock()
+
+    def init_app(self, app):
+        """
+        Читает настройки очереди из конфигурации приложения.
+
+        :param app: Приложение Flask.
+        """
+        self.cache_dir = app.config['PDF_CACHE_DIR']
+        self.workers = max(app.config['PDF_WORKERS'], 1)
+        self.timeout = app.config['PDF_RENDER_TIMEOUT']
+        self.font_path = app.config['PDF_FONT_PATH']
+        self.logo_path = app.config['PDF_LOGO_PATH']
+        self.max_bytes = app.config['PDF_CACHE_MAX_BYTES']
+        self.max_age = app.config['PDF_CACHE_MAX_AGE']
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def path_for(self, key):
+        """
+        Возвращает путь к файлу документа в кэше.
+
+        :param key: Ключ документа из cache_key.
+        :return: Путь к файлу (str).
+        """
+        return os.path.join(self.cache_dir, key[:2], f"{key}.pdf")
+
+    def render_many(self, kind, payloads):
+        """
+        Отрисовывает несколько документов параллельно в пуле процессов.
+
+        :param kind: Вид документов.
+        :param payloads: Список данных документов.
+        :return: Список путей к файлам PDF в том же порядке.
+        """
+        keys = [cache_key(kind, payload) for payload in payloads]
+        futures = []
+        with self._lock:
+            for key, payload in zip(keys, payloads):
+                if not self._touch(self.path_for(key)):
+                    futures.append(self._submit(kind, payload, key))
+        for future in futures:
+            future.result(timeout=self.timeout)
+        return [self.path_for(key) for key in keys]
+
+    def render(self, kind, payload, key=None):
+        """
+        Возвращает путь к готовому PDF, отрисовывая его в пуле при отсутствии в кэше.
+
+        :param kind: Вид документа ('order' или 'manager_report').
+        :param payload: Данные документа.
+        :param key: Заранее вычисленный ключ документа или None.
+        :return: Путь к файлу PDF (str).
+        :raises concurrent.futures.TimeoutError: Если отрисовка не уложилась в PDF_RENDER_TIMEOUT.
+        """
+        key = key or cache_key(kind, payload)
+        path = self.path_for(key)
+        if self._touch(path):
+            return path
+        with self._lock:
+            future = self._submit(kind, payload, key)
+        return future.result(timeout=self.timeout)
+
+    def prune(self):
+        """
+        Удаляет из кэша файлы старше PDF_CACHE_MAX_AGE, а затем самые давно
+        запрошенные, пока суммарный размер больше PDF_CACHE_MAX_BYTES.
+
+        Файлы, запрошенные за последние keep_recent_seconds, не удаляются:
+        их еще может отдавать текущий запрос.
+
+        :return: Количество удаленных файлов (int).
+        """
+        now = time.time()
+        files = []
+        for directory, _, names in os.walk(self.cache_dir):
+            for name in names:
+                if not name.endswith('.pdf'):
+                    continue
+                path = os.path.join(directory, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+        files.sort()
+        total = sum(size for _, size, _ in files)
+        removed = 0
+        for mtime, size, path in files:
+            if now - mtime < self.keep_recent_seconds:
+                break
+            if (not self.max_age or now - mtime <= self.max_age) and (not self.max_bytes or total <= self.max_bytes):
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+        return removed
+
+    def shutdown(self):
+        """Останавливает пул процессов."""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+
+    def _submit(self, kind, payload, key):
+        future = self._pending.get(key)
+        if future is None:
+            future = self._get_executor().submit(_render_to_file, kind, payload, self.path_for(key))
+            self._pending[key] = future
+            future.add_done_callback(lambda _: self._forget(key))
+        return future
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                initializer=_init_worker,
+                initargs=(self.font_path, self.logo_path)
+            )
+        return self._executor
+
+    def _forget(self, key):
+        with self._lock:
+            self._pending.pop(key, None)
+            self._renders += 1
+            due = self._renders % self.prune_every == 0
+        if due:
+            self.prune()
+
+    def _touch(self, path):
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return False
+        return True
+
+
+pdf_jobs = PdfJobQueue()
+
+
+class _ChunkWriter:
+    """Файлоподобный объект, накапливающий записанные байты до выдачи клиенту."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def iter_zip(files, chunk_size=64 * 1024):
+    """
+    Упаковывает файлы в ZIP-архив по частям, не собирая архив в памяти.
+
+    :param files: Список пар (имя в архиве, путь к файлу).
+    :param chunk_size: Размер читаемого блока в байтах (int).
+    :return: Генератор частей архива (bytes).
+    """
+    writer = _ChunkWriter()
+    with zipfile.ZipFile(writer, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for arcname, path in files:
+            with open(path, 'rb') as source, archive.open(arcname, 'w') as target:
+                while True:
+                    block = source.read(chunk_size)
+                    if not block:
+                        break
+                    target.write(block)
+                    data = writer.drain()
+                    if data:
+                        yield data
+            data = writer.drain()
+            if data:
+                yield data
+    data = writer.drain()
+    if data:
+        yield data
@@ -0,0 +1,330 @@
+"""
+Дневные сводки для статистики и отчетов.
+
+Этот файл содержит функции, которые поддерживают таблицу daily_stats
+в актуальном состоянии, поэтому отчеты за любой период считаются по
+нескольким сотням строк сводки, а не по всей истории заказов.
+
+Транзакция заказа или задачи не обновляет строки daily_stats: общие для
+всех заказов дня строки (например, число заказов за сегодня) иначе
+превращали бы любые две параллельные записи в конфликт обновления. Вместо
+этого она добавляет строки изменений в stat_deltas, а fold_stat_deltas
+отдельной короткой транзакцией переносит их в daily_stats. Отчеты
+суммируют обе таблицы, поэтому еще не перенесенные изменения в них видны.
+"""
+
+from collections import defaultdict, namedtuple
+from datetime import datetime
+import logging
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import func, insert, select, union_all, update
+from sqlalchemy.exc import DatabaseError, IntegrityError
+from .models import DailyStat, Order, OrderService, Service, Car, StatDelta, Task
+from . import db
+
+logger = logging.getLogger(__name__)
+
+BookedService = namedtuple('BookedService', ['id', 'price'])
+
+STAT_COLUMNS = ('stat_date', 'metric', 'item_id', 'label', 'quantity', 'amount')
+
+
+def bump_stat(stat_date, metric, item_id=0, label='', quantity=0, amount=0.0):
+    """
+    Прибавляет значения к строке сводки, создавая ее при необходимости.
+
+    Вызывается только при переносе изменений в fold_stat_deltas.
+
+    :param stat_date: Дата сводки (datetime.date).
+    :param metric: Показатель ('orders', 'service', 'car_model' или 'task').
+    :param item_id: Идентификатор услуги, модели или механика (int).
+    :param label: Дополнительный ключ, например статус задачи (str).
+    :param quantity: Прибавляемое количество (int).
+    :param amount: Прибавляемая сумма (float).
+    """
+    increment = (
+        update(DailyStat)
+        .where(
+            DailyStat.stat_date == stat_date,
+            DailyStat.metric == metric,
+            DailyStat.item_id == item_id,
+            DailyStat.label == label
+        )
+        .values(quantity=DailyStat.quantity + quantity, amount=DailyStat.amount + amount)
+        .execution_options(synchronize_session=False)
+    )
+    if db.session.execute(increment).rowcount:
+        return
+    try:
+        with db.session.begin_nested():
+            db.session.add(DailyStat(
+                stat_date=stat_date, metric=metric, item_id=item_id, label=label,
+                quantity=quantity, amount=amount
+            ))
+    except IntegrityError:
+        db.session.execute(increment)
+
+
+def add_stat_deltas(deltas):
+    """
+    Добавляет изменения сводки в текущую транзакцию одной вставкой.
+
+    :param deltas: Список словарей с ключами из STAT_COLUMNS.
+    """
+    if deltas:
+        db.session.execute(insert(StatDelta), deltas)
+
+
+def stat_delta(stat_date, metric, item_id=0, label='', quantity=0, amount=0.0):
+    """
+    Формирует строку изменения сводки для add_stat_deltas.
+
+    :return: Словарь значений строки stat_deltas.
+    """
+    return {
+        'stat_date': stat_date, 'metric': metric, 'item_id': item_id, 'label': label,
+        'quantity': quantity, 'amount': amount,
+    }
+
+
+def record_order(order, services, car_model_id, sign=1):
+    """
+    Учитывает заказ в сводке за день его создания.
+
+    :param order: Заказ.
+    :param services: Услуги заказа.
+    :param car_model_id: Идентификатор модели автомобиля.
+    :param sign: 1 при создании заказа, -1 при удалении.
+    """
+    stat_date = (order.created_at or datetime.utcnow()).date()
+    services = list({service.id: service for service in services}.values())
+    deltas = [stat_delta(stat_date, 'orders', quantity=sign, amount=sign * sum(service.price for service in services))]
+    deltas.extend(
+        stat_delta(stat_date, 'service', service.id, quantity=sign, amount=sign * service.price)
+        for service in services
+    )
+    deltas.append(stat_delta(stat_date, 'car_model', car_model_id, quantity=sign))
+    add_stat_deltas(deltas)
+
+
+def booked_services(order_id):
+    """
+    Возвращает услуги заказа с ценами на момент записи.
+
+    Для заказов, созданных до сохранения цен, берется текущая цена услуги.
+
+    :param order_id: Идентификатор заказа.
+    :return: Список объектов BookedService.
+    """
+    rows = (
+        db.session.query(OrderService.service_id, func.coalesce(OrderService.price, Service.price))
+        .join(Service, Service.id == OrderService.service_id)
+        .filter(OrderService.order_id == order_id)
+        .all()
+    )
+    return [BookedService(service_id, price) for service_id, price in rows]
+
+
+def forget_order(order):
+    """
+    Вычитает удаляемый заказ из сводки по ценам и модели автомобиля на момент записи.
+
+    :param order: Заказ.
+    """
+    car_model_id = order.car_model_id if order.car_model_id is not None else order.car.car_model_id
+    record_order(order, booked_services(order.id), car_model_id, sign=-1)
+
+
+def record_task_status(task, old_status, new_status):
+    """
+    Переносит задачу между статусами в сводке за день ее создания.
+
+    :param task: Задача.
+    :param old_status: Прежний статус или None для новой задачи.
+    :param new_status: Новый статус или None для удаленной задачи.
+    """
+    if old_status == new_status:
+        return
+    stat_date = (task.created_at or datetime.utcnow()).date()
+    deltas = []
+    if old_status:
+        deltas.append(stat_delta(stat_date, 'task', task.employee_id, old_status, quantity=-1))
+    if new_status:
+        deltas.append(stat_delta(stat_date, 'task', task.employee_id, new_status, quantity=1))
+    add_stat_deltas(deltas)
+
+
+def fold_stat_deltas(batch_size=1000):
+    """
+    Переносит пачку изменений из stat_deltas в daily_stats отдельной транзакцией.
+
+    Строки изменений сначала удаляются, поэтому две параллельные попытки
+    перенести одну пачку конфликтуют на удалении, и одна из них
+    откатывается; ее изменения остаются в stat_deltas до следующего вызова.
+
+    :param batch_size: Наибольшее число переносимых строк (int).
+    :return: Число перенесенных строк (int).
+    """
+    try:
+        rows = (
+            db.session.query(StatDelta.id, *(getattr(StatDelta, column) for column in STAT_COLUMNS))
+            .order_by(StatDelta.id)
+            .limit(batch_size)
+            .all()
+        )
+        if not rows:
+            db.session.rollback()
+            return 0
+        ids = [row[0] for row in rows]
+        deleted = (
+            db.session.query(StatDelta)
+            .filter(StatDelta.id.in_(ids))
+            .delete(synchronize_session=False)
+        )
+        if deleted != len(ids):
+            db.session.rollback()
+            return 0
+        totals = defaultdict(lambda: [0, 0.0])
+        for _, stat_date, metric, item_id, label, quantity, amount in rows:
+            totals[(stat_date, metric, item_id, label)][0] += quantity
+            totals[(stat_date, metric, item_id, label)][1] += amount
+        for (stat_date, metric, item_id, label), (quantity, amount) in totals.items():
+            bump_stat(stat_date, metric, item_id, label, quantity=quantity, amount=amount)
+        db.session.commit()
+    except DatabaseError:
+        db.session.rollback()
+        logger.warning("Не удалось перенести изменения сводки", exc_info=True)
+        return 0
+    return len(rows)
+
+
+def _stat_rows():
+    return union_all(
+        select(*(getattr(DailyStat, column) for column in STAT_COLUMNS)),
+        select(*(getattr(StatDelta, column) for column in STAT_COLUMNS)),
+    ).subquery()
+
+
+def summarize_stats(metrics, start_date=None, end_date=None):
+    """
+    Суммирует строки сводки и еще не перенесенные изменения за период.
+
+    :param metrics: Список показателей.
+    :param start_date: Начальная дата периода (datetime.date или None).
+    :param end_date: Конечная дата периода включительно (datetime.date или None).
+    :return: Список кортежей (показатель, item_id, label, количество, сумма).
+    """
+    stats = _stat_rows()
+    query = (
+        db.session.query(
+            stats.c.metric, stats.c.item_id, stats.c.label,
+            func.sum(stats.c.quantity), func.sum(stats.c.amount)
+        )
+        .filter(stats.c.metric.in_(metrics))
+    )
+    if start_date:
+        query = query.filter(stats.c.stat_date >= start_date)
+    if end_date:
+        query = query.filter(stats.c.stat_date <= end_date)
+    return query.group_by(stats.c.metric, stats.c.item_id, stats.c.label).all()
+
+
+def summarize_stats_by_date(metric, start_date=None, end_date=None):
+    """
+    Суммирует показатель по дням вместе с еще не перенесенными изменениями.
+
+    :param metric: Показатель.
+    :param start_date: Начальная дата периода (datetime.date или None).
+    :param end_date: Конечная дата периода включительно (datetime.date или None).
+    :return: Список кортежей (дата, количество, сумма), упорядоченный по дате.
+    """
+    stats = _stat_rows()
+    query = (
+        db.session.query(stats.c.stat_date, func.sum(stats.c.quantity), func.sum(stats.c.amount))
+        .filter(stats.c.metric == metric)
+    )
+    if start_date:
+        query = query.filter(stats.c.stat_date >= start_date)
+    if end_date:
+        query = query.filter(stats.c.stat_date <= end_date)
+    return query.group_by(stats.c.stat_date).order_by(stats.c.stat_date).all()
+
+
+def rebuild_daily_stats():
+    """
+    Пересчитывает всю сводку по заказам и задачам.
+
+    Используется для первичного заполнения таблицы и для сверки после
+    ручных правок данных.
+
+    :return: Количество строк сводки (int).
+    """
+    totals = defaultdict(lambda: [0, 0.0])
+
+    orders = (
+        db.session.query(Order.id, Order.created_at, func.coalesce(Order.car_model_id, Car.car_model_id))
+        .join(Car, Car.id == Order.car_id)
+        .yield_per(1000)
+    )
+    order_dates = {}
+    for order_id, created_at, car_model_id in orders:
+        if created_at is None:
+            continue
+        stat_date = created_at.date()
+        order_dates[order_id] = stat_date
+        totals[(stat_date, 'orders', 0, '')][0] += 1
+        totals[(stat_date, 'car_model', car_model_id, '')][0] += 1
+
+    order_services = (
+        db.session.query(OrderService.order_id, Service.id, func.coalesce(OrderService.price, Service.price))
+        .join(Service, Service.id == OrderService.service_id)
+        .yield_per(1000)
+    )
+    for order_id, service_id, price in order_services:
+        stat_date = order_dates.get(order_id)
+        if stat_date is None:
+            continue
+        totals[(stat_date, 'orders', 0, '')][1] += price
+        totals[(stat_date, 'service', service_id, '')][0] += 1
+        totals[(stat_date, 'service', service_id, '')][1] += price
+
+    tasks = db.session.query(Task.created_at, Task.employee_id, Task.status).yield_per(1000)
+    for created_at, employee_id, status in tasks:
+        if created_at is None:
+            continue
+        totals[(created_at.date(), 'task', employee_id, status or '')][0] += 1
+
+    try:
+        db.session.query(DailyStat).delete(synchronize_session=False)
+        db.session.query(StatDelta).delete(synchronize_session=False)
+        db.session.add_all([
+            DailyStat(stat_date=stat_date, metric=metric, item_id=item_id, label=label, quantity=quantity, amount=amount)
+            for (stat_date, metric, item_id, label), (quantity, amount) in totals.items()
+        ])
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return len(totals)
+
+
+@click.command('rebuild-stats')
+@with_appcontext
+def rebuild_stats_command():
+    """Пересчитывает дневные сводки по всей истории заказов."""
+    rows = rebuild_daily_stats()
+    click.echo(f"Сводка пересчитана: {rows} строк")
+
+
+@click.command('fold-stats')
+@with_appcontext
+def fold_stats_command():
+    """Переносит все накопленные изменения из stat_deltas в дневные сводки."""
+    total = 0
+    while True:
+        folded = fold_stat_deltas()
+        total += folded
+        if not folded:
+            break
+    click.echo(f"Перенесено изменений сводки: {total}")
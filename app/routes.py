@@ -1,41 +1,43 @@
 from datetime import datetime, timedelta, time, date
-from flask import Blueprint, render_template, request, redirect, url_for, session, flash, jsonify
-from werkzeug.security import generate_password_hash, check_password_hash
+from flask import (
+    Blueprint, current_app, render_template, request, redirect, url_for, session, flash, jsonify, send_file,
+    stream_with_context
+)
 from werkzeug.utils import secure_filename
 from .models import *
 from . import db, csrf
 from .utils import *
 from .forms import SelectServicesForm, CarForm
+from .slots import compute_free_slots, slot_holds
+from .booking import create_booking, calculate_end_time, touch_booking_day, SlotUnavailableError
+from .scheduler import load_workshop_schedules
+from .availability import day_versions, mechanic_roster, availability_etag, slot_memo
+from .pagination import paginate
+from .rollups import forget_order, record_task_status
+from .pdf import order_sheet
+from .pdf_jobs import pdf_jobs, cache_key, iter_zip
+from .exports import iter_orders_csv
+from .instrumentation import pool_metrics
+from .logs import SAMPLED
+from .auth import authenticate, hash_password, login_throttle, get_user_profile, role_required, user_cache
+from .sessions import rotate_session
+from .events import (
+    event_bus, publish_slot, publish_task, slot_event, task_event, task_channel,
+    SLOTS_CHANNEL, TASKS_CHANNEL
+)
+from .catalog import (
+    get_services, summarize_services, list_services, list_car_models, get_car_model,
+    services_cache, car_models_cache, catalog_stats, parse_ids
+)
 from sqlalchemy import text
+from sqlalchemy.orm import joinedload, selectinload
 import os
 import logging
 
-logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
 
 main = Blueprint('main', __name__)
 
-def calculate_end_time(appointment_time, service_ids):
-    """Рассчитывает время окончания заказа на основе выбранных услуг."""
-    total_duration = sum(Service.query.get(service_id).duration for service_id in service_ids)
-    return (datetime.strptime(appointment_time, '%H:%M') + timedelta(minutes=total_duration)).strftime('%H:%M')
-
-def create_task_for_order(order_id, employee_id):
-    """Создает задачу для заказа."""
-    new_task = Task(
-        employee_id=employee_id,
-        order_id=order_id,
-        status='pending'
-    )
-    db.session.add(new_task)
-    db.session.commit()
-
-def get_available_mechanic():
-    """Возвращает доступного механика."""
-    mechanic = Employee.query.filter_by(role='mechanic').first()
-    if not mechanic:
-        raise ValueError("Нет доступных механиков")
-    return mechanic
-
 def is_valid_appointment_date(date, appointment_time):
     """Проверяет валидность даты и времени записи."""
     current_time = datetime.now()
@@ -59,65 +61,200 @@ def get_available_slots_for_date(date_str, selected_service_ids):
         date_obj = date_str
     else:
         date_obj = datetime.strptime(date_str, '%Y-%m-%d').date()
+    slots, _ = get_available_slots_for_range(date_obj, date_obj, selected_service_ids)
+    return slots[date_obj.isoformat()]
 
-    existing_orders = Order.query.filter_by(appointment_date=date_obj).all()
-
-    total_duration = sum(Service.query.get(service_id).duration for service_id in selected_service_ids)
-
-    work_start = time(9, 0)
-    work_end = time(17, 0)
-    slot_duration = timedelta(minutes=30)
-    current_time = datetime.combine(date_obj, work_start)
-    available_slots = []
-
-    while current_time.time() < work_end:
-        slot_start_str = current_time.strftime('%H:%M')
-        slot_end_time = current_time + timedelta(minutes=total_duration)
+def get_available_slots_for_range(start_date, end_date, selected_service_ids):
+    """
+    Получает доступные слоты для каждого дня периода.
 
-        is_available = True
-        for order in existing_orders:
-            if order.end_time is None:
-                continue
+    Слоты дня берутся из кэша по версии дня, составу механиков, длительности
+    услуг и удержаниям; расписания загружаются одним запросом к заказам только
+    для дней, которых нет в кэше.
 
-            order_start = datetime.combine(date_obj, order.appointment_time)
-            order_end = datetime.combine(date_obj, order.end_time)
+    :return: Кортеж (словарь {дата ISO: слоты}, ETag).
+    """
+    total_duration, _ = summarize_services(get_services(selected_service_ids))
+    slot_minutes = current_app.config['BOOKING_SLOT_MINUTES']
+    days = [start_date + timedelta(days=offset) for offset in range((end_date - start_date).days + 1)]
+    versions = day_versions(start_date, end_date)
+    roster = mechanic_roster()
+    holds = {day: slot_holds.intervals(day, exclude_owner=session.get('user_id')) for day in days}
+    keys = {
+        day: (day, versions.get(day, 0), roster, total_duration, slot_minutes, tuple(sorted(holds[day])))
+        for day in days
+    }
+    slots = {day: slot_memo.get(key) for day, key in keys.items()}
+    missing = [day for day in days if slots[day] is None]
+    if missing:
+        schedules = load_workshop_schedules(missing[0], missing[-1], holds, horizon=total_duration)
+        for day in missing:
+            slots[day] = compute_free_slots(schedules[day], total_duration, slot_minutes=slot_minutes)
+            slot_memo.put(keys[day], slots[day], current_app.config['AVAILABILITY_MEMO_TTL'])
+    etag = availability_etag([keys[day] for day in days])
+    return {day.isoformat(): slots[day] for day in days}, etag
 
-            if not (slot_end_time <= order_start or current_time >= order_end):
-                is_available = False
-                break
-
-        available_slots.append((slot_start_str, is_available))
-        current_time += slot_duration
-
-    return available_slots
-
-def is_slot_available(slot_start_time, service_duration, booked_slots):
-    """Проверяет доступность слота."""
-    slot_end_time = (datetime.combine(datetime.today(), slot_start_time) + timedelta(minutes=service_duration)).time()
-
-    for booked_start, booked_end in booked_slots.values():
-        if booked_start is None or booked_end is None:
-            continue
+def availability_response(slots, etag):
+    """Возвращает JSON со слотами и ETag или 304, если у клиента та же версия."""
+    if etag in request.if_none_match:
+        response = current_app.response_class(status=304)
+    else:
+        response = jsonify(slots)
+    response.set_etag(etag)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
 
-        if slot_start_time < booked_end and slot_end_time > booked_start:
-            return False
+def order_details_options():
+    """Возвращает параметры загрузки заказа вместе с клиентом, автомобилем и услугами."""
+    return (
+        joinedload(Order.client),
+        joinedload(Order.car).joinedload(Car.car_model),
+        selectinload(Order.services),
+    )
 
-    return True
+def task_details_options():
+    """Возвращает параметры загрузки задачи вместе с заказом и его связями."""
+    return (
+        joinedload(Task.order).joinedload(Order.client),
+        joinedload(Task.order).joinedload(Order.car).joinedload(Car.car_model),
+        joinedload(Task.order).selectinload(Order.services),
+    )
 
 def get_mechanic_tasks(employee_id):
     """Получает задачи механика."""
     tasks = (
         Task.query
-        .join(Order, Task.order_id == Order.id)
-        .join(Car, Order.car_id == Car.id)
-        .join(Client, Order.client_id == Client.id)
-        .join(Service, Order.services)
+        .options(*task_details_options())
         .filter(Task.employee_id == employee_id)
-        .order_by(Order.appointment_date, Order.appointment_time)
         .all()
     )
     return tasks
 
+def get_mechanic_orders(employee_id, start_date=None, end_date=None, status=None):
+    """Получает заказы механика за период вместе с клиентами, автомобилями и услугами."""
+    query = (
+        Order.query
+        .options(*order_details_options())
+        .join(Task, Order.id == Task.order_id)
+        .filter(Task.employee_id == employee_id)
+    )
+    if status:
+        query = query.filter(Task.status == status)
+    if start_date:
+        query = query.filter(Order.appointment_date >= start_date)
+    if end_date:
+        query = query.filter(Order.appointment_date <= end_date)
+    return query.order_by(Order.appointment_date, Order.appointment_time).all()
+
+def parse_date_arg(name):
+    """Возвращает дату из параметра запроса или None, если параметр пустой или некорректный."""
+    value = request.args.get(name)
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date() if value else None
+    except ValueError:
+        return None
+
+def filter_orders(query):
+    """Применяет к запросу заказов фильтры по дате записи, статусу задачи и клиенту из параметров запроса."""
+    date_from = parse_date_arg('date_from')
+    date_to = parse_date_arg('date_to')
+    status = request.args.get('status')
+    client_id = request.args.get('client_id', type=int)
+    if date_from:
+        query = query.filter(Order.appointment_date >= date_from)
+    if date_to:
+        query = query.filter(Order.appointment_date <= date_to)
+    if status:
+        query = query.filter(Order.tasks.any(Task.status == status))
+    if client_id:
+        query = query.filter(Order.client_id == client_id)
+    return query
+
+def paginate_request(query, model):
+    """Возвращает страницу записей по курсору из параметров запроса и ссылку на следующую страницу."""
+    page = paginate(query, model, request.args.get('cursor'), current_app.config['PAGE_SIZE'])
+    next_url = None
+    if page.next_cursor:
+        args = request.args.to_dict()
+        args['cursor'] = page.next_cursor
+        next_url = url_for(request.endpoint, **args)
+    return page, next_url
+
+def order_to_dict(order):
+    """Преобразует заказ в словарь для JSON-ответа."""
+    return {
+        'id': order.id,
+        'client_id': order.client_id,
+        'car_brand': order.car_brand,
+        'car_model': order.car_model,
+        'appointment_date': order.appointment_date.isoformat() if order.appointment_date else None,
+        'appointment_time': order.appointment_time.strftime('%H:%M') if order.appointment_time else None,
+        'end_time': order.end_time.strftime('%H:%M') if order.end_time else None,
+        'created_at': order.created_at.isoformat() if order.created_at else None,
+    }
+
+def client_to_dict(client):
+    """Преобразует клиента в словарь для JSON-ответа."""
+    return {
+        'id': client.id,
+        'name': client.name,
+        'email': client.email,
+        'phone': client.phone,
+        'created_at': client.created_at.isoformat() if client.created_at else None,
+    }
+
+def employee_to_dict(employee):
+    """Преобразует сотрудника в словарь для JSON-ответа."""
+    return {
+        'id': employee.id,
+        'name': employee.name,
+        'email': employee.email,
+        'phone': employee.phone,
+        'role': employee.role,
+        'created_at': employee.created_at.isoformat() if employee.created_at else None,
+    }
+
+def page_to_json(page, serializer):
+    """Возвращает JSON-ответ со страницей записей и курсором следующей страницы."""
+    return jsonify({'items': [serializer(item) for item in page.items], 'next_cursor': page.next_cursor})
+
+
+def send_pdf(kind, payload, filename):
+    """
+    Отдает PDF из дискового кэша, отрисовывая его в фоновом пуле при необходимости.
+
+    Ключ документа служит ETag, поэтому повторный запрос с If-None-Match
+    получает 304 без обращения к пулу.
+
+    :param kind: Вид документа ('order' или 'manager_report').
+    :param payload: Данные документа.
+    :param filename: Имя файла для скачивания.
+    :return: Ответ Flask.
+    """
+    key = cache_key(kind, payload)
+    if key in request.if_none_match:
+        response = current_app.response_class(status=304)
+        response.set_etag(key)
+        return response
+    path = pdf_jobs.render(kind, payload, key)
+    response = send_file(
+        path, mimetype='application/pdf', as_attachment=True,
+        download_name=filename, etag=key, conditional=True
+    )
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+def client_access_denied():
+    """Возвращает на страницу входа пользователя, не вошедшего как клиент."""
+    flash("Доступ запрещен. Пожалуйста, войдите как клиент.", "error")
+    return redirect(url_for('main.login'))
+
+def slot_hold_denied():
+    """Возвращает JSON-отказ в удержании слота."""
+    return jsonify({'held': False}), 403
+
 @main.route('/')
 def index():
     """Обрабатывает главную страницу."""
@@ -135,19 +272,20 @@ def index():
 def login():
     """Обрабатывает вход пользователя."""
     if request.method == 'POST':
-        email = request.form.get('email')
-        password = request.form.get('password')
-        user = Employee.query.filter_by(email=email).first()
-        if not user:
-            user = Client.query.filter_by(email=email).first()
-        if user and check_password_hash(user.password, password):
-            session['user_id'] = user.id
-            if isinstance(user, Employee):
-                session['role'] = user.role
-            else:
-                session['role'] = 'client'
+        email = request.form.get('email') or ''
+        password = request.form.get('password') or ''
+        if login_throttle.is_blocked(email, request.remote_addr):
+            flash("Слишком много неудачных попыток входа. Повторите позже.", "error")
+            return render_template('login.html'), 429
+        identity = authenticate(email, password)
+        if identity:
+            login_throttle.reset(email)
+            rotate_session(session)
+            session['user_id'] = identity.id
+            session['role'] = identity.role
             return redirect(url_for('main.index'))
         else:
+            login_throttle.fail(email, request.remote_addr)
             flash("Неверный email или пароль", "error")
     return render_template('login.html')
 
@@ -162,7 +300,7 @@ def register():
         phone = request.form.get('phone')
         password = request.form.get('password')
         role = request.form.get('role')
-        hashed_password = generate_password_hash(password)
+        hashed_password = hash_password(password)
         name = f"{last_name} {first_name} {middle_name}".strip()
         if role == 'client':
             new_client = Client(
@@ -190,18 +328,15 @@ def register():
     return render_template('register.html')
 
 @main.route('/client_dashboard')
+@role_required('client', denied=client_access_denied)
 def client_dashboard():
     """Обрабатывает панель клиента."""
-    if 'role' in session and session['role'] == 'client':
-        user = Client.query.get(session['user_id'])
-        if user:
-            user_orders = Order.query.filter_by(client_id=session['user_id']).all()
-            return render_template('client/client_dashboard.html', user=user, orders=user_orders)
-        else:
-            flash("Клиент не найден", "error")
-            return redirect(url_for('main.login'))
+    user = get_user_profile()
+    if user:
+        user_orders = Order.query.options(selectinload(Order.tasks)).filter_by(client_id=session['user_id']).all()
+        return render_template('client/client_dashboard.html', user=user, orders=user_orders)
     else:
-        flash("Доступ запрещен. Пожалуйста, войдите как клиент.", "error")
+        flash("Клиент не найден", "error")
         return redirect(url_for('main.login'))
 
 @main.route('/appointment_success/<int:order_id>')
@@ -210,304 +345,344 @@ def appointment_success(order_id):
     return render_template('client/appointment_success.html', order_id=order_id)
 
 @main.route('/appointments', methods=['GET', 'POST'])
+@role_required('client')
 def appointments():
     """Обрабатывает запись на услугу."""
-    if 'role' in session and session['role'] == 'client':
-        car_form = CarForm()
-        selected_service_ids = session.get('selected_services', [])
-        if not selected_service_ids:
-            flash("Выберите услуги на странице выбора услуг", "error")
-            return redirect(url_for('main.select_services'))
-        if request.method == 'POST' and car_form.validate_on_submit():
-            try:
-                car_model = CarModel.query.get(car_form.car_model.data)
-                if not car_model:
-                    flash("Модель автомобиля не найдена", "error")
-                    return redirect(url_for('main.appointments'))
-                new_car = Car(
-                    client_id=session['user_id'],
-                    car_model_id=car_model.id,
-                    car_year=car_form.car_year.data,
-                    vin=car_form.vin.data,
-                    license_plate=car_form.license_plate.data
-                )
-                db.session.add(new_car)
-                db.session.commit()
-                end_time = calculate_end_time(car_form.appointment_time.data, selected_service_ids)
-                new_order = Order(
-                    client_id=session['user_id'],
-                    car_id=new_car.id,
-                    car_brand=car_model.brand,
-                    car_model=car_model.model_name,
-                    appointment_date=car_form.appointment_date.data,
-                    appointment_time=car_form.appointment_time.data,
-                    end_time=end_time
-                )
-                db.session.add(new_order)
-                db.session.commit()
-                for service_id in selected_service_ids:
-                    service = Service.query.get(service_id)
-                    if service:
-                        new_order.services.append(service)
-                create_task_for_order(new_order.id, get_available_mechanic().id)
-                db.session.commit()
-                flash("Запись успешно создана!", "success")
-                return redirect(url_for('main.appointment_success', order_id=new_order.id))
-            except Exception as e:
-                db.session.rollback()
-                flash(f"Ошибка при создании записи: {str(e)}", "error")
+    car_form = CarForm()
+    selected_service_ids = session.get('selected_services', [])
+    if not selected_service_ids:
+        flash("Выберите услуги на странице выбора услуг", "error")
+        return redirect(url_for('main.select_services'))
+    if request.method == 'POST' and car_form.validate_on_submit():
+        try:
+            car_model = get_car_model(car_form.car_model.data)
+            if not car_model:
+                flash("Модель автомобиля не найдена", "error")
                 return redirect(url_for('main.appointments'))
-        today = datetime.now().date()
-        selected_date = request.form.get('appointment_date', today)
-        available_slots = get_available_slots_for_date(selected_date, selected_service_ids)
-        return render_template(
-            'client/appointments.html',
-            available_slots=available_slots,
-            car_form=car_form,
-            today=today,
-            selected_date=selected_date,
-            selected_service_ids=selected_service_ids
-        )
-    return redirect(url_for('main.index'))
+            new_order = create_booking(
+                client_id=session['user_id'],
+                car_model=car_model,
+                car_year=car_form.car_year.data,
+                vin=car_form.vin.data,
+                license_plate=car_form.license_plate.data,
+                appointment_date=car_form.appointment_date.data,
+                appointment_time=car_form.appointment_time.data,
+                services=get_services(selected_service_ids)
+            )
+            slot_holds.release(session['user_id'])
+            flash("Запись успешно создана!", "success")
+            return redirect(url_for('main.appointment_success', order_id=new_order.id))
+        except SlotUnavailableError as e:
+            flash(f"{str(e)}. Выберите другое время.", "error")
+            return redirect(url_for('main.appointments'))
+        except ValueError as e:
+            db.session.rollback()
+            flash(f"Ошибка при создании записи: {str(e)}", "error")
+            return redirect(url_for('main.appointments'))
+        except Exception:
+            db.session.rollback()
+            logger.exception("Не удалось создать запись клиента %s", session['user_id'])
+            flash("Ошибка при создании записи. Попробуйте еще раз.", "error")
+            return redirect(url_for('main.appointments'))
+    today = datetime.now().date()
+    selected_date = request.form.get('appointment_date', today)
+    available_slots = get_available_slots_for_date(selected_date, selected_service_ids)
+    return render_template(
+        'client/appointments.html',
+        available_slots=available_slots,
+        car_form=car_form,
+        today=today,
+        selected_date=selected_date,
+        selected_service_ids=selected_service_ids
+    )
 
-@main.route('/get_available_slots', methods=['POST'])
+@main.route('/get_available_slots', methods=['GET', 'POST'])
 def get_available_slots():
     """Обрабатывает получение доступных слотов."""
-    data = request.json
-    selected_date = data.get('date')
-    selected_service_ids = data.get('services', [])
-    available_slots = get_available_slots_for_date(selected_date, selected_service_ids)
-    return jsonify(available_slots)
+    if request.method == 'GET':
+        selected_date = request.args.get('date')
+        selected_service_ids = parse_ids(request.args.get('services', '').split(','))
+    else:
+        data = request.json
+        selected_date = data.get('date')
+        selected_service_ids = data.get('services', [])
+    try:
+        date_obj = datetime.strptime(selected_date or '', '%Y-%m-%d').date()
+    except ValueError:
+        return jsonify({'error': "Некорректная дата"}), 400
+    slots, etag = get_available_slots_for_range(date_obj, date_obj, selected_service_ids)
+    return availability_response(slots[date_obj.isoformat()], etag)
+
+@main.route('/availability_calendar')
+def availability_calendar():
+    """Возвращает свободные слоты на каждый день периода одним ответом."""
+    try:
+        start_date = parse_report_date(request.args.get('start')) or datetime.now().date()
+        end_date = parse_report_date(request.args.get('end')) or start_date + timedelta(days=6)
+    except ValueError:
+        return jsonify({'error': "Некорректная дата"}), 400
+    max_days = current_app.config['CALENDAR_MAX_DAYS']
+    if end_date < start_date or (end_date - start_date).days >= max_days:
+        return jsonify({'error': f"Период должен содержать от 1 до {max_days} дней"}), 400
+    selected_service_ids = parse_ids(request.args.get('services', '').split(','))
+    return availability_response(*get_available_slots_for_range(start_date, end_date, selected_service_ids))
+
+@main.route('/hold_slot', methods=['POST'])
+@role_required('client', denied=slot_hold_denied)
+def hold_slot():
+    """Удерживает выбранный клиентом слот на время заполнения формы."""
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data, dict):
+        data = {}
+    try:
+        date_obj = datetime.strptime(data.get('date') or '', '%Y-%m-%d').date()
+        start_time = datetime.strptime(data.get('time') or '', '%H:%M').time()
+    except (TypeError, ValueError):
+        return jsonify({'held': False, 'error': 'Некорректная дата или время'}), 400
+    services = data.get('services')
+    selected_service_ids = parse_ids(services if isinstance(services, list) else [])
+    if not dict(get_available_slots_for_date(date_obj, selected_service_ids)).get(start_time.strftime('%H:%M')):
+        return jsonify({'held': False}), 409
+    end_time = calculate_end_time(date_obj, start_time, get_services(selected_service_ids))
+    slot_holds.hold(session['user_id'], date_obj, start_time, end_time, current_app.config['SLOT_HOLD_SECONDS'])
+    return jsonify({'held': True})
 
 @main.route('/order_details/<int:order_id>')
+@role_required('client')
 def order_details(order_id):
     """Обрабатывает детали заказа."""
-    if 'role' in session and session['role'] == 'client':
-        order = Order.query.get(order_id)
-        if not order:
-            flash("Заказ не найден", "error")
-            return redirect(url_for('main.client_dashboard'))
-        return render_template('client/order_details.html', order=order)
-    return redirect(url_for('main.index'))
+    order = Order.query.options(*order_details_options()).get(order_id)
+    if not order:
+        flash("Заказ не найден", "error")
+        return redirect(url_for('main.client_dashboard'))
+    return render_template('client/order_details.html', order=order)
 
 @main.route('/select_services', methods=['GET', 'POST'])
+@role_required('client')
 def select_services():
     """Обрабатывает выбор услуг."""
     form = SelectServicesForm()
-    if 'role' in session and session['role'] == 'client':
-        if form.validate_on_submit():
-            selected_services = request.form.getlist('services')
-            if not selected_services:
-                flash("Выберите хотя бы одну услугу", "error")
-                return redirect(url_for('main.select_services'))
-            session['selected_services'] = selected_services
-            return redirect(url_for('main.appointments'))
-        return render_template('client/select_services.html', form=form)
-    return redirect(url_for('main.index'))
+    if form.validate_on_submit():
+        selected_services = request.form.getlist('services')
+        if not selected_services:
+            flash("Выберите хотя бы одну услугу", "error")
+            return redirect(url_for('main.select_services'))
+        session['selected_services'] = selected_services
+        return redirect(url_for('main.appointments'))
+    return render_template('client/select_services.html', form=form)
 
 @main.route('/order_history')
+@role_required('client')
 def order_history():
     """Обрабатывает историю заказов."""
-    if 'role' in session and session['role'] == 'client':
-        user = Client.query.get(session['user_id'])
-        order_history = OrderHistory.query.filter_by(client_id=user.id).all()
-        return render_template('client/order_history.html', user=user, order_history=order_history)
-    return redirect(url_for('main.index'))
+    user = get_user_profile()
+    order_history = OrderHistory.query.filter_by(client_id=user.id).all()
+    return render_template('client/order_history.html', user=user, order_history=order_history)
 
 @main.route('/book_service', methods=['POST'])
+@role_required('client')
 def book_service():
     """Обрабатывает запись на услугу."""
-    if 'role' in session and session['role'] == 'client':
-        service_id = request.form.get('service_id')
-        if service_id:
-            flash("Вы успешно записались на ремонт!", "success")
-        else:
-            flash("Ошибка при записи на ремонт.", "error")
-        return redirect(url_for('main.client_dashboard'))
-    return redirect(url_for('main.index'))
+    service_id = request.form.get('service_id')
+    if service_id:
+        flash("Вы успешно записались на ремонт!", "success")
+    else:
+        flash("Ошибка при записи на ремонт.", "error")
+    return redirect(url_for('main.client_dashboard'))
 
 @main.route('/mechanic_dashboard')
+@role_required('mechanic')
 def mechanic_dashboard():
     """Обрабатывает панель механика."""
-    if 'role' in session and session['role'] == 'mechanic':
-        mechanic_id = session['user_id']
-        tasks = Task.query.filter_by(employee_id=mechanic_id).all()
-        return render_template('employee/mechanic/mechanic_dashboard.html', tasks=tasks)
-    return redirect(url_for('main.index'))
+    tasks = get_mechanic_tasks(session['user_id'])
+    return render_template('employee/mechanic/mechanic_dashboard.html', tasks=tasks)
 
 @main.route('/mechanic_orders_current_month')
+@role_required('mechanic')
 def mechanic_orders_current_month():
     """Обрабатывает заказы механика за текущий месяц."""
-    if 'role' in session and session['role'] == 'mechanic':
-        mechanic_id = session['user_id']
-        today = datetime.now().date()
-        first_day_of_month = today.replace(day=1)
-        last_day_of_month = (today.replace(day=1) + timedelta(days=32)).replace(day=1) - timedelta(days=1)
-        orders = (
-            Order.query
-            .join(Task, Order.id == Task.order_id)
-            .filter(
-                Task.employee_id == mechanic_id,
-                Order.appointment_date >= first_day_of_month,
-                Order.appointment_date <= last_day_of_month
-            )
-            .order_by(Order.appointment_date, Order.appointment_time)
-            .all()
-        )
-        return render_template('employee/mechanic/mechanic_tasks_current_month.html', orders=orders)
-    return redirect(url_for('main.index'))
+    mechanic_id = session['user_id']
+    today = datetime.now().date()
+    first_day_of_month = today.replace(day=1)
+    last_day_of_month = (today.replace(day=1) + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+    orders = get_mechanic_orders(mechanic_id, first_day_of_month, last_day_of_month)
+    return render_template('employee/mechanic/mechanic_tasks_current_month.html', orders=orders)
 
 @main.route('/task_details/<int:task_id>')
+@role_required('mechanic')
 def task_details(task_id):
     """Обрабатывает подробности задачи."""
-    if 'role' in session and session['role'] == 'mechanic':
-        task = Task.query.get(task_id)
-        if not task:
-            flash("Задача не найдена", "error")
-            return redirect(url_for('main.mechanic_dashboard'))
-        return render_template('employee/mechanic/task_details.html', task=task)
-    return redirect(url_for('main.index'))
+    task = Task.query.options(*task_details_options()).get(task_id)
+    if not task:
+        flash("Задача не найдена", "error")
+        return redirect(url_for('main.mechanic_dashboard'))
+    return render_template('employee/mechanic/task_details.html', task=task)
 
 @main.route('/generate_report')
+@role_required('mechanic')
 def generate_report():
     """Обрабатывает генерацию отчета."""
-    if 'role' in session and session['role'] == 'mechanic':
-        mechanic_id = session['user_id']
-        today = datetime.now().date()
-        first_day_of_month = today.replace(day=1)
-        last_day_of_month = (today.replace(day=1) + timedelta(days=32)).replace(day=1) - timedelta(days=1)
-        completed_orders = (
-            Order.query
-            .join(Task, Order.id == Task.order_id)
-            .filter(
-                Task.employee_id == mechanic_id,
-                Task.status == 'completed',
-                Order.appointment_date >= first_day_of_month,
-                Order.appointment_date <= last_day_of_month
-            )
-            .order_by(Order.appointment_date, Order.appointment_time)
-            .all()
-        )
-        report_data = []
-        total_revenue = 0
-        for order in completed_orders:
-            order_total = sum(service.price for service in order.services)
-            report_data.append({
-                'order_id': order.id,
-                'date': order.appointment_date,
-                'client': order.client.name,
-                'services': ', '.join([service.service_name for service in order.services]),
-                'total': order_total
-            })
-            total_revenue += order_total
-        return render_template('employee/mechanic/report.html', report_data=report_data, total_revenue=total_revenue)
-    return redirect(url_for('main.index'))
+    mechanic_id = session['user_id']
+    today = datetime.now().date()
+    first_day_of_month = today.replace(day=1)
+    last_day_of_month = (today.replace(day=1) + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+    completed_orders = get_mechanic_orders(mechanic_id, first_day_of_month, last_day_of_month, status='completed')
+    report_data = []
+    total_revenue = 0
+    for order in completed_orders:
+        order_total = sum(service.price for service in order.services)
+        report_data.append({
+            'order_id': order.id,
+            'date': order.appointment_date,
+            'client': order.client.name,
+            'services': ', '.join([service.service_name for service in order.services]),
+            'total': order_total
+        })
+        total_revenue += order_total
+    return render_template('employee/mechanic/report.html', report_data=report_data, total_revenue=total_revenue)
 
 @main.route('/update_task_status/<int:task_id>', methods=['POST'])
+@role_required('mechanic')
 def update_task_status(task_id):
     """Обрабатывает обновление статуса задачи."""
-    if 'role' in session and session['role'] == 'mechanic':
-        task = Task.query.get(task_id)
-        if task:
-            new_status = request.form.get('status')
-            logging.debug(f"Обновление статуса задачи {task_id} на {new_status}")
-            task.status = new_status
-            db.session.commit()
-            flash("Статус задачи обновлен", "success")
-        else:
-            logging.debug(f"Задача {task_id} не найдена")
-            flash("Задача не найдена", "error")
-        return redirect(url_for('main.mechanic_dashboard'))
-    return redirect(url_for('main.index'))
+    new_status = request.form.get('status')
+    if new_status not in TASK_STATUSES:
+        return "Некорректный статус задачи", 400
+    task = Task.query.get(task_id)
+    if task:
+        logger.debug("Обновление статуса задачи %s на %s", task_id, new_status, extra=SAMPLED)
+        record_task_status(task, task.status, new_status)
+        task.status = new_status
+        event = task_event(task, new_status)
+        db.session.commit()
+        publish_task(event)
+        flash("Статус задачи обновлен", "success")
+    else:
+        logger.debug("Задача %s не найдена", task_id)
+        flash("Задача не найдена", "error")
+    return redirect(url_for('main.mechanic_dashboard'))
 
 @main.route('/mechanic_all_orders')
+@role_required('mechanic')
 def mechanic_all_orders():
     """Обрабатывает все задачи механика."""
-    if 'role' in session and session['role'] == 'mechanic':
-        mechanic_id = session['user_id']
-        tasks = Task.query.filter_by(employee_id=mechanic_id).all()
-        return render_template('employee/mechanic/mechanic_all_orders.html', tasks=tasks)
-    return redirect(url_for('main.index'))
+    tasks = get_mechanic_tasks(session['user_id'])
+    return render_template('employee/mechanic/mechanic_all_orders.html', tasks=tasks)
 
 @main.route('/mechanic_statistics')
+@role_required('mechanic')
 def mechanic_statistics():
     """Обрабатывает статистику механика."""
-    if 'role' in session and session['role'] == 'mechanic':
-        user = Employee.query.get(session['user_id'])
-        return render_template('employee/mechanic/mechanic_statistics.html', user=user)
-    return redirect(url_for('main.index'))
+    user = get_user_profile()
+    return render_template('employee/mechanic/mechanic_statistics.html', user=user)
 
 @main.route('/mechanic_tasks_current_month')
+@role_required('mechanic')
 def mechanic_tasks_current_month():
     """Обрабатывает задачи механика за текущий месяц."""
-    if 'role' in session and session['role'] == 'mechanic':
-        user = Employee.query.get(session['user_id'])
-        today = datetime.now().date()
-        first_day_of_month = today.replace(day=1)
-        last_day_of_month = (today.replace(day=1) + timedelta(days=32)).replace(day=1) - timedelta(days=1)
-        tasks = Task.query.filter(
-            Task.employee_id == session['user_id'],
-            Task.created_at >= first_day_of_month,
-            Task.created_at <= last_day_of_month
-        ).all()
-        return render_template('employee/mechanic/mechanic_tasks_current_month.html', user=user, tasks=tasks)
-    return redirect(url_for('main.index'))
+    user = get_user_profile()
+    today = datetime.now().date()
+    first_day_of_month = today.replace(day=1)
+    last_day_of_month = (today.replace(day=1) + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+    tasks = Task.query.options(*task_details_options()).filter(
+        Task.employee_id == session['user_id'],
+        Task.created_at >= first_day_of_month,
+        Task.created_at <= last_day_of_month
+    ).all()
+    return render_template('employee/mechanic/mechanic_tasks_current_month.html', user=user, tasks=tasks)
 
 @main.route('/manager_dashboard')
+@role_required('manager')
 def manager_dashboard():
     """Обрабатывает панель менеджера."""
-    if 'role' in session and session['role'] == 'manager':
-        user = Employee.query.get(session['user_id'])
-        employees = Employee.query.filter(Employee.role.in_(['mechanic', 'manager'])).all()
-        services = Service.query.all()
-        return render_template('employee/manager/manager_dashboard.html', user=user, employees=employees, services=services)
-    return redirect(url_for('main.index'))
+    user = get_user_profile()
+    employees = Employee.query.filter(Employee.role.in_(['mechanic', 'manager'])).all()
+    services = list_services()
+    return render_template('employee/manager/manager_dashboard.html', user=user, employees=employees, services=services)
 
 @main.route('/edit_profile', methods=['GET', 'POST'])
+@role_required('client', 'mechanic', 'manager')
 def edit_profile():
     """Обрабатывает редактирование профиля."""
-    if 'role' in session:
-        user = get_current_user()
-        if request.method == 'POST':
-            user.name = request.form['name']
-            user.email = request.form['email']
-            user.phone = request.form['phone']
-            if request.form['password']:
-                user.password = generate_password_hash(request.form['password'])
-            if 'avatar' in request.files:
-                file = request.files['avatar']
-                if file.filename != '':
-                    filename = secure_filename(file.filename)
-                    file.save(os.path.join('static/avatars', filename))
-                    user.avatar = filename
-            db.session.commit()
-            flash("Профиль обновлен!", "success")
-            return redirect(url_for('main.index'))
-        return render_template('edit_profile.html', user=user)
-    return redirect(url_for('main.index'))
+    user = get_current_user()
+    if request.method == 'POST':
+        user.name = request.form['name']
+        user.email = request.form['email']
+        user.phone = request.form['phone']
+        if request.form['password']:
+            user.password = hash_password(request.form['password'])
+        if 'avatar' in request.files:
+            file = request.files['avatar']
+            if file.filename != '':
+                filename = secure_filename(file.filename)
+                file.save(os.path.join('static/avatars', filename))
+                user.avatar = filename
+        db.session.commit()
+        user_cache.invalidate(session['role'], user.id)
+        flash("Профиль обновлен!", "success")
+        return redirect(url_for('main.index'))
+    return render_template('edit_profile.html', user=user)
 
 @main.route('/view_orders')
+@role_required('manager')
 def view_orders():
     """Обрабатывает просмотр заказов."""
-    if 'role' in session and session['role'] == 'manager':
-        orders = Order.query.all()
-        return render_template('employee/manager/view_orders.html', orders=orders)
-    return redirect(url_for('main.index'))
+    page, next_url = paginate_request(filter_orders(Order.query), Order)
+    if request.args.get('format') == 'json':
+        return page_to_json(page, order_to_dict)
+    return render_template('employee/manager/view_orders.html', orders=page.items, next_url=next_url)
 
 @main.route('/generate_order_pdf/<int:order_id>')
 def generate_order_pdf(order_id):
     """Обрабатывает генерацию PDF заказа."""
-    order = Order.query.get(order_id)
+    order = Order.query.options(*order_details_options()).get(order_id)
     if not order:
         return "Заказ не найден", 404
     try:
-        buffer = generate_pdf(order)
+        sheet = order_sheet(order)
     except ValueError as e:
         return str(e), 400
-    response = make_response(buffer.getvalue())
-    response.headers["Content-Type"] = "application/pdf"
-    response.headers["Content-Disposition"] = f"attachment; filename=order_{order_id}.pdf"
-    return response
+    return send_pdf('order', sheet, f"order_{order_id}.pdf")
+
+@main.route('/export_orders')
+@role_required('manager')
+def export_orders():
+    """
+    Выгружает заказ-наряды за дату или период одним PDF или ZIP-архивом.
+
+    Если указана только одна граница периода, выгружается один этот день.
+    """
+    try:
+        date_from = parse_report_date(request.args.get('date_from'))
+        date_to = parse_report_date(request.args.get('date_to'))
+    except ValueError:
+        return "Некорректная дата", 400
+    if not date_from and not date_to:
+        flash("Укажите дату или период выгрузки", "error")
+        return redirect(url_for('main.view_orders'))
+    date_from, date_to = date_from or date_to, date_to or date_from
+    max_days = current_app.config['EXPORT_MAX_DAYS']
+    if date_to < date_from or (date_to - date_from).days >= max_days:
+        return f"Период выгрузки должен содержать от 1 до {max_days} дней", 400
+    orders = (
+        filter_orders(Order.query)
+        .options(*order_details_options())
+        .filter(Order.appointment_date.between(date_from, date_to))
+        .filter(Order.appointment_time.isnot(None))
+        .order_by(Order.appointment_date, Order.appointment_time, Order.id)
+        .all()
+    )
+    if not orders:
+        flash("За выбранный период заказов нет", "error")
+        return redirect(url_for('main.view_orders', **request.args.to_dict()))
+    sheets = [order_sheet(order) for order in orders]
+    if request.args.get('format') == 'zip':
+        paths = pdf_jobs.render_many('order', sheets)
+        files = [(f"order_{sheet['id']}.pdf", path) for sheet, path in zip(sheets, paths)]
+        response = current_app.response_class(iter_zip(files), mimetype='application/zip')
+        response.headers["Content-Disposition"] = "attachment; filename=orders.zip"
+        return response
+    return send_pdf('orders', sheets, 'orders.pdf')
 
 @main.route('/logout')
 def logout():
@@ -520,85 +695,80 @@ def logout():
     return redirect(url_for('main.index'))
 
 @main.route('/tasks')
+@role_required('mechanic')
 def tasks():
     """Обрабатывает задачи механика."""
-    if 'role' in session and session['role'] == 'mechanic':
-        employee_id = session['user_id']
-        tasks = Task.query.filter_by(employee_id=employee_id).all()
-        return render_template('employee/mechanic/tasks.html', tasks=tasks)
-    return redirect(url_for('main.index'))
+    tasks = Task.query.filter_by(employee_id=session['user_id']).all()
+    return render_template('employee/mechanic/tasks.html', tasks=tasks)
 
 @main.route('/reports')
+@role_required('manager')
 def reports():
     """Обрабатывает генерацию отчетов."""
-    if 'role' in session and session['role'] == 'manager':
-        try:
-            start_date = request.args.get('start_date')
-            end_date = request.args.get('end_date')
-            report = generate_manager_report(start_date, end_date)
-            return render_template('employee/manager/reports.html', **report)
-        except Exception as e:
-            logging.error(f"Error in reports: {e}")
-            return render_template('500.html'), 500
-    return redirect(url_for('main.index'))
+    try:
+        start_date = request.args.get('start_date')
+        end_date = request.args.get('end_date')
+        report = generate_manager_report(start_date, end_date)
+        return render_template('employee/manager/reports.html', **report)
+    except Exception as e:
+        logger.exception("Error in reports: %s", e)
+        return render_template('500.html'), 500
 
 @main.route('/export_report')
+@role_required('manager')
 def export_report():
     """Экспортирует отчет в PDF."""
     try:
         report = generate_manager_report()
-        buffer = BytesIO()
-        pdf = canvas.Canvas(buffer, pagesize=letter)
-        pdf.setFont("Helvetica-Bold", 16)
-        pdf.drawString(50, 750, "Общий отчет менеджера")
-        pdf.setFont("Helvetica", 12)
-        pdf.drawString(50, 720, f"Общее количество заказов: {report['total_orders']}")
-        pdf.drawString(50, 700, f"Общий доход: {report['total_revenue']} руб.")
-        pdf.setFont("Helvetica-Bold", 14)
-        pdf.drawString(50, 670, "Статистика по моделям автомобилей")
-        data = [["Марка", "Модель", "Количество заказов"]]
-        for item in report['orders_by_model']:
-            data.append([item.brand, item.model_name, str(item.order_count)])
-        table = Table(data)
-        table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-        ]))
-        table.wrapOn(pdf, 400, 200)
-        table.drawOn(pdf, 50, 550)
-        pdf.setFont("Helvetica-Bold", 14)
-        pdf.drawString(50, 500, "Финансовые показатели по услугам")
-        data = [["Услуга", "Доход (руб.)"]]
-        for item in report['revenue_by_service']:
-            data.append([item.service_name, str(item.revenue)])
-        table = Table(data)
-        table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-        ]))
-        table.wrapOn(pdf, 400, 200)
-        table.drawOn(pdf, 50, 350)
-        pdf.showPage()
-        pdf.save()
-        buffer.seek(0)
-        response = make_response(buffer.getvalue())
-        response.headers['Content-Type'] = 'application/pdf'
-        response.headers['Content-Disposition'] = 'attachment; filename=manager_report.pdf'
-        return response
+        return send_pdf('manager_report', report, 'manager_report.pdf')
     except Exception as e:
-        logging.error(f"Error in export_report: {e}")
+        logger.exception("Error in export_report: %s", e)
         return render_template('500.html'), 500
 
+@main.route('/export_orders_csv')
+@role_required('manager')
+def export_orders_csv():
+    """Выгружает строки заказов, созданных за период, с услугами, ценами, механиком и статусом в CSV."""
+    try:
+        start_date = parse_report_date(request.args.get('start_date'))
+        end_date = parse_report_date(request.args.get('end_date'))
+    except ValueError:
+        return "Некорректная дата", 400
+    response = current_app.response_class(
+        stream_with_context(iter_orders_csv(start_date, end_date)),
+        mimetype='text/csv'
+    )
+    response.headers["Content-Disposition"] = "attachment; filename=orders.csv"
+    return response
+
+@main.route('/events')
+@role_required('client', 'mechanic', 'manager')
+def events():
+    """
+    Поток server-sent events с изменениями расписания и задач.
+
+    Клиент получает события slot_taken и slot_freed, механик - task_status
+    своих задач, менеджер - и те и другие. Если в процессе уже открыто
+    EVENT_MAX_STREAMS потоков, возвращается 503 с Retry-After: страница
+    повторит подключение позже, а рабочие потоки остаются обычным запросам.
+    """
+    role = session['role']
+    if role == 'client':
+        channels = [SLOTS_CHANNEL]
+    elif role == 'mechanic':
+        channels = [task_channel(session['user_id'])]
+    else:
+        channels = [SLOTS_CHANNEL, TASKS_CHANNEL]
+    stream = event_bus.open_stream(channels, request.headers.get('Last-Event-ID', type=int))
+    if stream is None:
+        response = current_app.response_class(status=503)
+        response.headers["Retry-After"] = str(event_bus.retry_after)
+        return response
+    response = current_app.response_class(stream, mimetype='text/event-stream')
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
+
 @main.errorhandler(404)
 def page_not_found(e):
     """Обрабатывает ошибку 404."""
@@ -611,285 +781,315 @@ def internal_server_error(e):
     return render_template('500.html'), 500
 
 @main.route('/manage_employees', methods=['GET', 'POST'])
+@role_required('manager')
 def manage_employees():
     """Обрабатывает управление сотрудниками."""
-    if 'role' in session and session['role'] == 'manager':
-        if request.method == 'POST':
-            if 'add_employee' in request.form:
-                name = request.form.get('name')
-                email = request.form.get('email')
-                phone = request.form.get('phone')
-                password = request.form.get('password')
-                role = request.form.get('role')
-                existing_employee = Employee.query.filter_by(email=email).first()
-                if existing_employee:
-                    flash("Сотрудник с таким email уже существует", "error")
-                    return redirect(url_for('main.manage_employees'))
-                if password is None:
-                    flash("Пароль не может быть пустым", "error")
-                    return redirect(url_for('main.manage_employees'))
-                hashed_password = generate_password_hash(password)
-                new_employee = Employee(name=name, email=email, phone=phone, password=hashed_password, role=role)
-                db.session.add(new_employee)
+    if request.method == 'POST':
+        if 'add_employee' in request.form:
+            name = request.form.get('name')
+            email = request.form.get('email')
+            phone = request.form.get('phone')
+            password = request.form.get('password')
+            role = request.form.get('role')
+            existing_employee = Employee.query.filter_by(email=email).first()
+            if existing_employee:
+                flash("Сотрудник с таким email уже существует", "error")
+                return redirect(url_for('main.manage_employees'))
+            if password is None:
+                flash("Пароль не может быть пустым", "error")
+                return redirect(url_for('main.manage_employees'))
+            hashed_password = hash_password(password)
+            new_employee = Employee(name=name, email=email, phone=phone, password=hashed_password, role=role)
+            db.session.add(new_employee)
+            db.session.commit()
+            flash("Сотрудник успешно добавлен", "success")
+        elif 'edit_employee' in request.form:
+            employee_id = request.form.get('employee_id')
+            name = request.form.get('name')
+            email = request.form.get('email')
+            phone = request.form.get('phone')
+            password = request.form.get('password')
+            role = request.form.get('role')
+            employee = Employee.query.get(employee_id)
+            if employee:
+                if email != employee.email:
+                    existing_employee = Employee.query.filter_by(email=email).first()
+                    if existing_employee:
+                        flash("Сотрудник с таким email уже существует", "error")
+                        return redirect(url_for('main.manage_employees'))
+                employee.name = name
+                employee.email = email
+                employee.phone = phone
+                employee.role = role
+                if password is not None:
+                    hashed_password = hash_password(password)
+                    employee.password = hashed_password
                 db.session.commit()
-                flash("Сотрудник успешно добавлен", "success")
-            elif 'edit_employee' in request.form:
-                employee_id = request.form.get('employee_id')
-                name = request.form.get('name')
-                email = request.form.get('email')
-                phone = request.form.get('phone')
-                password = request.form.get('password')
-                role = request.form.get('role')
-                employee = Employee.query.get(employee_id)
-                if employee:
-                    if email != employee.email:
-                        existing_employee = Employee.query.filter_by(email=email).first()
-                        if existing_employee:
-                            flash("Сотрудник с таким email уже существует", "error")
-                            return redirect(url_for('main.manage_employees'))
-                    employee.name = name
-                    employee.email = email
-                    employee.phone = phone
-                    employee.role = role
-                    if password is not None:
-                        hashed_password = generate_password_hash(password)
-                        employee.password = hashed_password
-                    db.session.commit()
-                    flash("Сотрудник успешно отредактирован", "success")
-                else:
-                    flash("Сотрудник не найден", "error")
-            elif 'delete_employee' in request.form:
-                employee_id = request.form.get('employee_id')
-                employee = Employee.query.get(employee_id)
-                if employee:
-                    db.session.delete(employee)
-                    db.session.commit()
-                    flash("Сотрудник успешно удален", "success")
-                else:
-                    flash("Сотрудник не найден", "error")
-        employees = Employee.query.filter(Employee.role.in_(['mechanic', 'manager'])).all()
-        return render_template('employee/manager/manage_employees.html', employees=employees)
-    return redirect(url_for('main.index'))
+                user_cache.invalidate(employee.role, employee.id)
+                flash("Сотрудник успешно отредактирован", "success")
+            else:
+                flash("Сотрудник не найден", "error")
+        elif 'delete_employee' in request.form:
+            employee_id = request.form.get('employee_id')
+            employee = Employee.query.get(employee_id)
+            if employee:
+                db.session.delete(employee)
+                db.session.commit()
+                user_cache.invalidate(employee.role, employee.id)
+                flash("Сотрудник успешно удален", "success")
+            else:
+                flash("Сотрудник не найден", "error")
+    role = request.args.get('role')
+    roles = [role] if role in ('mechanic', 'manager') else ['mechanic', 'manager']
+    page, next_url = paginate_request(Employee.query.filter(Employee.role.in_(roles)), Employee)
+    if request.args.get('format') == 'json':
+        return page_to_json(page, employee_to_dict)
+    return render_template('employee/manager/manage_employees.html', employees=page.items, next_url=next_url)
 
 @main.route('/manage_services', methods=['GET', 'POST'])
+@role_required('manager')
 def manage_services():
     """Обрабатывает управление услугами."""
-    if 'role' in session and session['role'] == 'manager':
-        if request.method == 'POST':
-            if 'add_service' in request.form:
-                service_name = request.form.get('service_name')
-                description = request.form.get('description')
-                price = request.form.get('price')
-                duration = request.form.get('duration')
-                if service_name is None or price is None or duration is None:
-                    flash("Все поля должны быть заполнены", "error")
-                    return redirect(url_for('main.manage_services'))
-                new_service = Service(service_name=service_name, description=description, price=price, duration=duration)
-                db.session.add(new_service)
+    if request.method == 'POST':
+        if 'add_service' in request.form:
+            service_name = request.form.get('service_name')
+            description = request.form.get('description')
+            price = request.form.get('price')
+            duration = request.form.get('duration')
+            if service_name is None or price is None or duration is None:
+                flash("Все поля должны быть заполнены", "error")
+                return redirect(url_for('main.manage_services'))
+            new_service = Service(service_name=service_name, description=description, price=price, duration=duration)
+            db.session.add(new_service)
+            db.session.commit()
+            services_cache.invalidate()
+            flash("Услуга успешно добавлена", "success")
+        elif 'edit_service' in request.form:
+            service_id = request.form.get('service_id')
+            service_name = request.form.get('service_name')
+            description = request.form.get('description')
+            price = request.form.get('price')
+            duration = request.form.get('duration')
+            service = Service.query.get(service_id)
+            if service:
+                if service_name is not None:
+                    service.service_name = service_name
+                if description is not None:
+                    service.description = description
+                if price is not None:
+                    service.price = price
+                if duration is not None:
+                    service.duration = duration
                 db.session.commit()
-                flash("Услуга успешно добавлена", "success")
-            elif 'edit_service' in request.form:
-                service_id = request.form.get('service_id')
-                service_name = request.form.get('service_name')
-                description = request.form.get('description')
-                price = request.form.get('price')
-                duration = request.form.get('duration')
-                service = Service.query.get(service_id)
-                if service:
-                    if service_name is not None:
-                        service.service_name = service_name
-                    if description is not None:
-                        service.description = description
-                    if price is not None:
-                        service.price = price
-                    if duration is not None:
-                        service.duration = duration
-                    db.session.commit()
-                    flash("Услуга успешно отредактирована", "success")
-                else:
-                    flash("Услуга не найдена", "error")
-            elif 'delete_service' in request.form:
-                service_id = request.form.get('service_id')
-                service = Service.query.get(service_id)
-                if service:
-                    db.session.delete(service)
-                    db.session.commit()
-                    flash("Услуга успешно удалена", "success")
-                else:
-                    flash("Услуга не найдена", "error")
-        services = Service.query.all()
-        return render_template('employee/manager/manage_services.html', services=services)
-    return redirect(url_for('main.index'))
+                services_cache.invalidate()
+                flash("Услуга успешно отредактирована", "success")
+            else:
+                flash("Услуга не найдена", "error")
+        elif 'delete_service' in request.form:
+            service_id = request.form.get('service_id')
+            service = Service.query.get(service_id)
+            if service:
+                db.session.delete(service)
+                db.session.commit()
+                services_cache.invalidate()
+                flash("Услуга успешно удалена", "success")
+            else:
+                flash("Услуга не найдена", "error")
+    services = list_services()
+    return render_template('employee/manager/manage_services.html', services=services)
 
 @main.route('/manage_car_models', methods=['GET', 'POST'])
+@role_required('manager')
 def manage_car_models():
     """Управление списком автомобилей."""
-    if 'role' in session and session['role'] == 'manager':
-        if request.method == 'POST':
-            if 'add_model' in request.form:
-                model_name = request.form.get('model_name')
-                brand = request.form.get('brand')
-                new_model = CarModel(model_name=model_name, brand=brand)
-                db.session.add(new_model)
+    if request.method == 'POST':
+        if 'add_model' in request.form:
+            model_name = request.form.get('model_name')
+            brand = request.form.get('brand')
+            new_model = CarModel(model_name=model_name, brand=brand)
+            db.session.add(new_model)
+            db.session.commit()
+            car_models_cache.invalidate()
+            flash("Модель успешно добавлена", "success")
+        elif 'edit_model' in request.form:
+            model_id = request.form.get('model_id')
+            model_name = request.form.get('model_name')
+            brand = request.form.get('brand')
+            model = CarModel.query.get(model_id)
+            if model:
+                model.model_name = model_name
+                model.brand = brand
                 db.session.commit()
-                flash("Модель успешно добавлена", "success")
-            elif 'edit_model' in request.form:
-                model_id = request.form.get('model_id')
-                model_name = request.form.get('model_name')
-                brand = request.form.get('brand')
-                model = CarModel.query.get(model_id)
-                if model:
-                    model.model_name = model_name
-                    model.brand = brand
-                    db.session.commit()
-                    flash("Модель успешно отредактирована", "success")
-                else:
-                    flash("Модель не найдена", "error")
-            elif 'delete_model' in request.form:
-                model_id = request.form.get('model_id')
-                model = CarModel.query.get(model_id)
-                if model:
-                    db.session.delete(model)
-                    db.session.commit()
-                    flash("Модель успешно удалена", "success")
-                else:
-                    flash("Модель не найдена", "error")
-        car_models = CarModel.query.all()
-        return render_template('manage_car_models.html', car_models=car_models)
-    return redirect(url_for('main.index'))
+                car_models_cache.invalidate()
+                flash("Модель успешно отредактирована", "success")
+            else:
+                flash("Модель не найдена", "error")
+        elif 'delete_model' in request.form:
+            model_id = request.form.get('model_id')
+            model = CarModel.query.get(model_id)
+            if model:
+                db.session.delete(model)
+                db.session.commit()
+                car_models_cache.invalidate()
+                flash("Модель успешно удалена", "success")
+            else:
+                flash("Модель не найдена", "error")
+    car_models = list_car_models()
+    return render_template('manage_car_models.html', car_models=car_models)
+
+@main.route('/catalog_stats')
+@role_required('manager')
+def catalog_cache_stats():
+    """Возвращает счетчики кэша справочников."""
+    return jsonify(catalog_stats())
+
+@main.route('/pool_stats')
+@role_required('manager')
+def pool_stats():
+    """Возвращает счетчики пула соединений с базой данных."""
+    return jsonify(pool_metrics.stats(db.engine.pool))
 
 @main.route('/generate_full_report')
+@role_required('mechanic')
 def generate_full_report():
     """Обрабатывает генерацию отчета за все время."""
-    if 'role' in session and session['role'] == 'mechanic':
-        mechanic_id = session['user_id']
-        completed_orders = (
-            Order.query
-            .join(Task, Order.id == Task.order_id)
-            .filter(
-                Task.employee_id == mechanic_id,
-                Task.status == 'completed'
-            )
-            .order_by(Order.appointment_date, Order.appointment_time)
-            .all()
-        )
-        report_data = []
-        total_revenue = 0
-        for order in completed_orders:
-            order_total = sum(service.price for service in order.services)
-            report_data.append({
-                'order_id': order.id,
-                'date': order.appointment_date,
-                'client': order.client.name,
-                'services': ', '.join([service.service_name for service in order.services]),
-                'total': order_total
-            })
-            total_revenue += order_total
-        return render_template('employee/mechanic/report.html', report_data=report_data, total_revenue=total_revenue)
-    return redirect(url_for('main.index'))
+    mechanic_id = session['user_id']
+    completed_orders = get_mechanic_orders(mechanic_id, status='completed')
+    report_data = []
+    total_revenue = 0
+    for order in completed_orders:
+        order_total = sum(service.price for service in order.services)
+        report_data.append({
+            'order_id': order.id,
+            'date': order.appointment_date,
+            'client': order.client.name,
+            'services': ', '.join([service.service_name for service in order.services]),
+            'total': order_total
+        })
+        total_revenue += order_total
+    return render_template('employee/mechanic/report.html', report_data=report_data, total_revenue=total_revenue)
 
 @main.route('/manage_clients', methods=['GET', 'POST'])
+@role_required('manager')
 def manage_clients():
     """Обрабатывает управление клиентами."""
-    if 'role' in session and session['role'] == 'manager':
-        if request.method == 'POST':
-            if 'add_client' in request.form:
-                last_name = request.form.get('last_name')
-                first_name = request.form.get('first_name')
-                middle_name = request.form.get('middle_name')
-                email = request.form.get('email')
-                phone = request.form.get('phone')
-                password = request.form.get('password')
-                if not last_name or not first_name or not email or not phone or not password:
+    if request.method == 'POST':
+        if 'add_client' in request.form:
+            last_name = request.form.get('last_name')
+            first_name = request.form.get('first_name')
+            middle_name = request.form.get('middle_name')
+            email = request.form.get('email')
+            phone = request.form.get('phone')
+            password = request.form.get('password')
+            if not last_name or not first_name or not email or not phone or not password:
+                flash("Все поля обязательны для заполнения", "error")
+                return redirect(url_for('main.manage_clients'))
+            existing_client = Client.query.filter_by(email=email).first()
+            if existing_client:
+                flash("Клиент с таким email уже существует", "error")
+                return redirect(url_for('main.manage_clients'))
+            hashed_password = hash_password(password)
+            new_client = Client(
+                last_name=last_name,
+                first_name=first_name,
+                middle_name=middle_name,
+                email=email,
+                phone=phone,
+                password=hashed_password,
+                name=f"{last_name} {first_name} {middle_name}".strip()
+            )
+            db.session.add(new_client)
+            db.session.commit()
+            flash("Клиент успешно добавлен", "success")
+        elif 'edit_client' in request.form:
+            client_id = request.form.get('client_id')
+            last_name = request.form.get('last_name')
+            first_name = request.form.get('first_name')
+            middle_name = request.form.get('middle_name')
+            email = request.form.get('email')
+            phone = request.form.get('phone')
+            password = request.form.get('password')
+            client = Client.query.get(client_id)
+            if client:
+                if not last_name or not first_name or not email or not phone:
                     flash("Все поля обязательны для заполнения", "error")
                     return redirect(url_for('main.manage_clients'))
-                existing_client = Client.query.filter_by(email=email).first()
-                if existing_client:
-                    flash("Клиент с таким email уже существует", "error")
-                    return redirect(url_for('main.manage_clients'))
-                hashed_password = generate_password_hash(password)
-                new_client = Client(
-                    last_name=last_name,
-                    first_name=first_name,
-                    middle_name=middle_name,
-                    email=email,
-                    phone=phone,
-                    password=hashed_password,
-                    name=f"{last_name} {first_name} {middle_name}".strip()
-                )
-                db.session.add(new_client)
-                db.session.commit()
-                flash("Клиент успешно добавлен", "success")
-            elif 'edit_client' in request.form:
-                client_id = request.form.get('client_id')
-                last_name = request.form.get('last_name')
-                first_name = request.form.get('first_name')
-                middle_name = request.form.get('middle_name')
-                email = request.form.get('email')
-                phone = request.form.get('phone')
-                password = request.form.get('password')
-                client = Client.query.get(client_id)
-                if client:
-                    if not last_name or not first_name or not email or not phone:
-                        flash("Все поля обязательны для заполнения", "error")
+                if email != client.email:
+                    existing_client = Client.query.filter_by(email=email).first()
+                    if existing_client:
+                        flash("Клиент с таким email уже существует", "error")
                         return redirect(url_for('main.manage_clients'))
-                    if email != client.email:
-                        existing_client = Client.query.filter_by(email=email).first()
-                        if existing_client:
-                            flash("Клиент с таким email уже существует", "error")
-                            return redirect(url_for('main.manage_clients'))
-                    client.last_name = last_name
-                    client.first_name = first_name
-                    client.middle_name = middle_name
-                    client.email = email
-                    client.phone = phone
-                    client.name = f"{last_name} {first_name} {middle_name}".strip()
-                    if password is not None:
-                        hashed_password = generate_password_hash(password)
-                        client.password = hashed_password
-                    db.session.commit()
-                    flash("Клиент успешно отредактирован", "success")
-                else:
-                    flash("Клиент не найден", "error")
-            elif 'delete_client' in request.form:
-                client_id = request.form.get('client_id')
-                client = Client.query.get(client_id)
-                if client:
-                    db.session.delete(client)
-                    db.session.commit()
-                    flash("Клиент успешно удален", "success")
-                else:
-                    flash("Клиент не найден", "error")
-        clients = Client.query.all()
-        return render_template('employee/manager/manage_clients.html', clients=clients)
-    return redirect(url_for('main.index'))
+                client.last_name = last_name
+                client.first_name = first_name
+                client.middle_name = middle_name
+                client.email = email
+                client.phone = phone
+                client.name = f"{last_name} {first_name} {middle_name}".strip()
+                if password is not None:
+                    hashed_password = hash_password(password)
+                    client.password = hashed_password
+                db.session.commit()
+                user_cache.invalidate('client', client.id)
+                flash("Клиент успешно отредактирован", "success")
+            else:
+                flash("Клиент не найден", "error")
+        elif 'delete_client' in request.form:
+            client_id = request.form.get('client_id')
+            client = Client.query.get(client_id)
+            if client:
+                db.session.delete(client)
+                db.session.commit()
+                user_cache.invalidate('client', client.id)
+                flash("Клиент успешно удален", "success")
+            else:
+                flash("Клиент не найден", "error")
+    query = Client.query
+    date_from = parse_date_arg('date_from')
+    date_to = parse_date_arg('date_to')
+    if date_from:
+        query = query.filter(Client.created_at >= date_from)
+    if date_to:
+        query = query.filter(Client.created_at < date_to + timedelta(days=1))
+    page, next_url = paginate_request(query, Client)
+    if request.args.get('format') == 'json':
+        return page_to_json(page, client_to_dict)
+    return render_template('employee/manager/manage_clients.html', clients=page.items, next_url=next_url)
 
 @main.route('/delete_appointment/<int:appointment_id>', methods=['POST'])
+@role_required('manager')
 def delete_appointment(appointment_id):
     """Обрабатывает удаление записи."""
-    if 'role' in session and session['role'] == 'manager':
-        appointment = Order.query.get(appointment_id)
-        if appointment:
-            db.session.delete(appointment)
-            db.session.commit()
-            flash("Запись успешно удалена", "success")
-        else:
-            flash("Запись не найдена", "error")
-        return redirect(url_for('main.manage_appointments'))
-    return redirect(url_for('main.index'))
+    appointment = Order.query.options(*order_details_options(), selectinload(Order.tasks)).get(appointment_id)
+    if appointment:
+        forget_order(appointment)
+        for task in appointment.tasks:
+            record_task_status(task, task.status, None)
+        slot = slot_event(appointment.appointment_date, appointment.appointment_time, appointment.end_time)
+        tasks = [task_event(task, None) for task in appointment.tasks]
+        touch_booking_day(appointment.appointment_date)
+        db.session.delete(appointment)
+        db.session.commit()
+        publish_slot('slot_freed', slot)
+        for event in tasks:
+            publish_task(event)
+        flash("Запись успешно удалена", "success")
+    else:
+        flash("Запись не найдена", "error")
+    return redirect(url_for('main.manage_appointments'))
 
 @main.route('/manage_appointments')
+@role_required('manager')
 def manage_appointments():
     """Обрабатывает управление записями."""
-    if 'role' in session and session['role'] == 'manager':
-        appointments = Order.query.all()
-        return render_template('employee/manager/manage_appointments.html', appointments=appointments)
-    return redirect(url_for('main.index'))
+    query = filter_orders(Order.query.options(joinedload(Order.client), joinedload(Order.car)))
+    page, next_url = paginate_request(query, Order)
+    if request.args.get('format') == 'json':
+        return page_to_json(page, order_to_dict)
+    return render_template('employee/manager/manage_appointments.html', appointments=page.items, next_url=next_url)
 
 @main.route('/statistics')
+@role_required('manager')
 def statistics():
     """Статистика и аналитика."""
-    if 'role' in session and session['role'] == 'manager':
-        stats = calculate_statistics()
-        return render_template('statistics.html', **stats)
-    return redirect(url_for('main.index'))
+    stats = calculate_statistics(request.args.get('start_date'), request.args.get('end_date'))
+    return render_template('employee/manager/statistics.html', **stats)
@@ -0,0 +1,139 @@
+"""
+Распределение задач между механиками.
+
+Этот файл содержит расписание мастерской на день: для каждого механика строится
+своя шкала занятости по уже назначенным задачам, а новая задача достается
+наименее загруженному механику, свободному на всем интервале записи. Слот
+считается доступным, если для него найдется хотя бы один свободный механик.
+"""
+
+from datetime import timedelta
+import heapq
+from .models import Employee, Order, Task
+from .slots import DaySchedule, WORK_START, WORK_END, to_minutes
+from . import db
+
+
+class WorkshopSchedule:
+    """
+    Расписание всех механиков на один день.
+
+    Заказы без назначенного механика и удержания слотов не привязаны к
+    конкретному человеку, поэтому они уменьшают число свободных механиков
+    на своем интервале.
+    """
+
+    def __init__(self, mechanic_intervals, shared_intervals=(), work_start=WORK_START, work_end=WORK_END, horizon=0):
+        """
+        :param mechanic_intervals: Словарь {идентификатор механика: список пар (начало, окончание)}.
+        :param shared_intervals: Список пар (начало, окончание) без назначенного механика.
+        :param work_start: Начало рабочего дня (datetime.time).
+        :param work_end: Окончание рабочего дня (datetime.time).
+        :param horizon: Сколько минут после окончания рабочего дня учитывать (int).
+        """
+        self.start = to_minutes(work_start)
+        self.end = to_minutes(work_end)
+        self.mechanics = {
+            mechanic_id: DaySchedule(intervals, work_start, work_end, capacity=1, horizon=horizon)
+            for mechanic_id, intervals in mechanic_intervals.items()
+        }
+        self.shared = DaySchedule(shared_intervals, work_start, work_end, capacity=1, horizon=horizon)
+        self.load = {
+            mechanic_id: sum(
+                max(to_minutes(end) - to_minutes(start), 0)
+                for start, end in intervals if start is not None and end is not None
+            )
+            for mechanic_id, intervals in mechanic_intervals.items()
+        }
+
+    def free_mechanics(self, start_minute, duration):
+        """
+        Возвращает механиков, свободных на всем интервале.
+
+        :param start_minute: Начало интервала в минутах от начала суток (int).
+        :param duration: Длительность интервала в минутах (int).
+        :return: Список идентификаторов механиков.
+        """
+        return [
+            mechanic_id for mechanic_id, schedule in self.mechanics.items()
+            if schedule.is_free(start_minute, duration)
+        ]
+
+    def is_free(self, start_minute, duration):
+        """
+        Проверяет, хватает ли свободных механиков на интервал.
+
+        :param start_minute: Начало интервала в минутах от начала суток (int).
+        :param duration: Длительность интервала в минутах (int).
+        :return: True, если интервал можно занять (bool).
+        """
+        free = len(self.free_mechanics(start_minute, duration))
+        return free > 0 and free > self.shared.peak(start_minute, duration)
+
+    def assign(self, start_minute, duration):
+        """
+        Выбирает наименее загруженного механика, свободного на интервале.
+
+        Механики извлекаются из кучи по возрастанию загрузки за день, поэтому
+        поиск заканчивается на первом свободном.
+
+        :param start_minute: Начало интервала в минутах от начала суток (int).
+        :param duration: Длительность интервала в минутах (int).
+        :return: Идентификатор механика или None, если свободных нет.
+        """
+        if not self.is_free(start_minute, duration):
+            return None
+        heap = [(load, mechanic_id) for mechanic_id, load in self.load.items()]
+        heapq.heapify(heap)
+        while heap:
+            _, mechanic_id = heapq.heappop(heap)
+            if self.mechanics[mechanic_id].is_free(start_minute, duration):
+                return mechanic_id
+        return None
+
+
+def load_workshop_schedule(day, extra_intervals=(), horizon=0):
+    """
+    Загружает расписание механиков на дату.
+
+    :param day: Дата (datetime.date).
+    :param extra_intervals: Дополнительные интервалы без механика (например, удержания слотов).
+    :param horizon: Сколько минут после окончания рабочего дня учитывать (int).
+    :return: Объект WorkshopSchedule.
+    """
+    return load_workshop_schedules(day, day, {day: extra_intervals}, horizon)[day]
+
+
+def load_workshop_schedules(start_date, end_date, extra_intervals=None, horizon=0):
+    """
+    Загружает расписания механиков на каждый день периода одним запросом к заказам.
+
+    :param start_date: Первая дата периода (datetime.date).
+    :param end_date: Последняя дата периода включительно (datetime.date).
+    :param extra_intervals: Словарь {дата: интервалы без механика} или None.
+    :param horizon: Сколько минут после окончания рабочего дня учитывать (int).
+    :return: Словарь {дата: WorkshopSchedule} для всех дней периода.
+    """
+    extra_intervals = extra_intervals or {}
+    mechanic_ids = [
+        mechanic_id
+        for mechanic_id, in db.session.query(Employee.id).filter(Employee.role == 'mechanic')
+    ]
+    days = [start_date + timedelta(days=offset) for offset in range((end_date - start_date).days + 1)]
+    mechanic_intervals = {day: {mechanic_id: [] for mechanic_id in mechanic_ids} for day in days}
+    shared_intervals = {day: list(extra_intervals.get(day, ())) for day in days}
+    booked = (
+        db.session.query(Order.appointment_date, Order.appointment_time, Order.end_time, Task.employee_id)
+        .outerjoin(Task, Task.order_id == Order.id)
+        .filter(Order.appointment_date >= start_date, Order.appointment_date <= end_date)
+        .all()
+    )
+    for day, start, end, employee_id in booked:
+        if employee_id in mechanic_intervals[day]:
+            mechanic_intervals[day][employee_id].append((start, end))
+        elif employee_id is None:
+            shared_intervals[day].append((start, end))
+    return {
+        day: WorkshopSchedule(mechanic_intervals[day], shared_intervals[day], horizon=horizon)
+        for day in days
+    }
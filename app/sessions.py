@@ -0,0 +1,224 @@
+"""
+Хранение сессий на стороне сервера.
+
+Этот файл содержит интерфейс сессий Flask, который держит в cookie только
+случайный идентификатор сессии, а сами данные (пользователь, роль, выбранные
+услуги, flash-сообщения) хранит в локальной базе SQLite. Перед базой стоит
+LRU-кэш процесса; он сбрасывается, как только другой рабочий процесс изменит
+базу, поэтому процессы gunicorn видят одни и те же данные сессии.
+
+Бэкенд выбирается параметром SESSION_BACKEND: 'sqlite' или 'cookie'
+(стандартная подписанная cookie Flask).
+"""
+
+from collections import OrderedDict
+from threading import Lock
+import os
+import secrets
+import sqlite3
+import time
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+
+
+class ServerSession(CallbackDict, SessionMixin):
+    """Данные сессии, загруженные из хранилища по идентификатору."""
+
+    def __init__(self, initial=None, sid=None, new=False):
+        def on_update(session):
+            session.modified = True
+
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.modified = False
+        self.previous_sid = None
+
+    def regenerate(self):
+        """Выдает сессии новый идентификатор, например после входа пользователя."""
+        if self.previous_sid is None:
+            self.previous_sid = self.sid
+        self.sid = secrets.token_urlsafe(32)
+        self.modified = True
+
+
+class SqliteSessionStore:
+    """
+    Хранилище сессий в файле SQLite с LRU-кэшем в памяти процесса.
+
+    Соединение открывается отдельно в каждом процессе. Перед чтением из кэша
+    проверяется PRAGMA data_version: если другой процесс записал что-то в
+    базу, кэш очищается.
+    """
+
+    cleanup_every = 1000
+
+    def __init__(self, path, cache_size=10000):
+        """
+        :param path: Путь к файлу базы сессий (str).
+        :param cache_size: Сколько сессий держать в памяти процесса (int).
+        """
+        self.path = path
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = Lock()
+        self._connection = None
+        self._pid = None
+        self._data_version = None
+        self._saves = 0
+
+    def load(self, sid):
+        """
+        Читает данные сессии.
+
+        :param sid: Идентификатор сессии (str).
+        :return: Сериализованные данные (str) или None, если сессии нет или она истекла.
+        """
+        now = time.time()
+        with self._lock:
+            self._sync()
+            entry = self._cache.get(sid)
+            if entry is None:
+                entry = self._connect().execute(
+                    'SELECT data, expires FROM sessions WHERE sid = ?', (sid,)
+                ).fetchone()
+                if entry is None:
+                    return None
+                self._remember(sid, entry)
+            else:
+                self._cache.move_to_end(sid)
+            data, expires = entry
+            return data if expires > now else None
+
+    def save(self, sid, data, expires):
+        """
+        Сохраняет данные сессии.
+
+        :param sid: Идентификатор сессии (str).
+        :param data: Сериализованные данные (str).
+        :param expires: Время истечения (timestamp).
+        """
+        with self._lock:
+            self._sync()
+            connection = self._connect()
+            connection.execute(
+                'INSERT OR REPLACE INTO sessions (sid, data, expires) VALUES (?, ?, ?)',
+                (sid, data, expires)
+            )
+            self._saves += 1
+            if self._saves % self.cleanup_every == 0:
+                connection.execute('DELETE FROM sessions WHERE expires < ?', (time.time(),))
+            self._remember(sid, (data, expires))
+
+    def delete(self, sid):
+        """
+        Удаляет сессию.
+
+        :param sid: Идентификатор сессии (str).
+        """
+        with self._lock:
+            self._sync()
+            self._connect().execute('DELETE FROM sessions WHERE sid = ?', (sid,))
+            self._cache.pop(sid, None)
+
+    def _remember(self, sid, entry):
+        self._cache[sid] = entry
+        self._cache.move_to_end(sid)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def _sync(self):
+        data_version = self._connect().execute('PRAGMA data_version').fetchone()[0]
+        if data_version != self._data_version:
+            self._cache.clear()
+            self._data_version = data_version
+
+    def _connect(self):
+        if self._connection is None or self._pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS sessions '
+                '(sid TEXT PRIMARY KEY, data TEXT NOT NULL, expires REAL NOT NULL)'
+            )
+            self._connection = connection
+            self._pid = os.getpid()
+            self._data_version = None
+            self._cache.clear()
+        return self._connection
+
+
+class ServerSideSessionInterface(SessionInterface):
+    """Интерфейс сессий Flask поверх серверного хранилища."""
+
+    serializer = TaggedJSONSerializer()
+
+    def __init__(self, store):
+        """
+        :param store: Хранилище сессий (например, SqliteSessionStore).
+        """
+        self.store = store
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid:
+            data = self.store.load(sid)
+            if data is not None:
+                return ServerSession(self.serializer.loads(data), sid=sid)
+        return ServerSession(sid=secrets.token_urlsafe(32), new=True)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if session.previous_sid:
+            self.store.delete(session.previous_sid)
+
+        if not session:
+            if session.modified and not session.new:
+                self.store.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        if session.accessed:
+            response.vary.add('Cookie')
+
+        if session.modified or session.new:
+            expires = time.time() + app.permanent_session_lifetime.total_seconds()
+            self.store.save(session.sid, self.serializer.dumps(dict(session)), expires)
+
+        if session.new or session.previous_sid or self.should_set_cookie(app, session):
+            response.set_cookie(
+                name,
+                session.sid,
+                expires=self.get_expiration_time(app, session),
+                httponly=self.get_cookie_httponly(app),
+                domain=domain,
+                path=path,
+                secure=self.get_cookie_secure(app),
+                samesite=self.get_cookie_samesite(app),
+            )
+
+
+def rotate_session(session):
+    """
+    Меняет идентификатор серверной сессии, если бэкенд это поддерживает.
+
+    :param session: Текущая сессия Flask.
+    """
+    if isinstance(session, ServerSession):
+        session.regenerate()
+
+
+def init_sessions(app):
+    """
+    Подключает серверное хранилище сессий по настройке SESSION_BACKEND.
+
+    :param app: Приложение Flask.
+    """
+    if app.config['SESSION_BACKEND'] == 'sqlite':
+        store = SqliteSessionStore(app.config['SESSION_DB_PATH'], app.config['SESSION_CACHE_SIZE'])
+        app.session_interface = ServerSideSessionInterface(store)
@@ -0,0 +1,294 @@
+"""
+Расчет свободных слотов для записи.
+
+Этот файл содержит движок доступности слотов: занятость рабочего дня строится
+в виде поминутной шкалы за один проход по заказам, после чего все слоты
+проверяются за один проход по шкале, без перебора заказов для каждого слота.
+"""
+
+from datetime import time
+from threading import Lock
+from time import time as time_now
+import os
+import sqlite3
+
+WORK_START = time(9, 0)
+WORK_END = time(17, 0)
+
+
+def to_minutes(value):
+    """
+    Переводит время в количество минут от начала суток.
+
+    :param value: Время (datetime.time).
+    :return: Количество минут (int).
+    """
+    return value.hour * 60 + value.minute
+
+
+def format_minutes(minutes):
+    """
+    Переводит количество минут от начала суток в строку вида 'ЧЧ:ММ'.
+
+    :param minutes: Количество минут (int).
+    :return: Строка времени (str).
+    """
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+class DaySchedule:
+    """
+    Поминутная шкала занятости рабочего дня.
+
+    Каждая минута хранит число одновременно занятых постов. Шкала строится
+    через разностный массив, поэтому стоимость построения линейна по числу
+    заказов и длине шкалы.
+    """
+
+    def __init__(self, intervals, work_start=WORK_START, work_end=WORK_END, capacity=1, horizon=0):
+        """
+        Строит шкалу занятости.
+
+        :param intervals: Итерируемый набор пар (начало, окончание) типа datetime.time.
+        :param work_start: Начало рабочего дня (datetime.time).
+        :param work_end: Окончание рабочего дня (datetime.time).
+        :param capacity: Количество постов, работающих одновременно (int).
+        :param horizon: Сколько минут после окончания рабочего дня учитывать (int).
+        """
+        self.start = to_minutes(work_start)
+        self.end = to_minutes(work_end)
+        self.capacity = max(int(capacity), 0)
+        self.size = self.end - self.start + max(int(horizon), 0)
+
+        diff = [0] * (self.size + 1)
+        for interval_start, interval_end in intervals:
+            if interval_start is None or interval_end is None:
+                continue
+            first = max(to_minutes(interval_start) - self.start, 0)
+            last = min(to_minutes(interval_end) - self.start, self.size)
+            if first >= last:
+                continue
+            diff[first] += 1
+            diff[last] -= 1
+
+        self.occupancy = [0] * self.size
+        self.saturated = [0] * (self.size + 1)
+        occupancy = 0
+        for minute in range(self.size):
+            occupancy += diff[minute]
+            self.occupancy[minute] = occupancy
+            self.saturated[minute + 1] = self.saturated[minute] + (occupancy >= self.capacity)
+
+    def is_free(self, start_minute, duration):
+        """
+        Проверяет, есть ли свободный пост на всем интервале.
+
+        :param start_minute: Начало интервала в минутах от начала суток (int).
+        :param duration: Длительность интервала в минутах (int).
+        :return: True, если интервал свободен (bool).
+        """
+        first = start_minute - self.start
+        last = first + max(duration, 1)
+        if first < 0 or last > self.size:
+            return False
+        return self.saturated[last] == self.saturated[first]
+
+    def peak(self, start_minute, duration):
+        """
+        Возвращает наибольшую занятость на интервале.
+
+        :param start_minute: Начало интервала в минутах от начала суток (int).
+        :param duration: Длительность интервала в минутах (int).
+        :return: Наибольшее число одновременно занятых постов (int).
+        """
+        first = max(start_minute - self.start, 0)
+        last = min(first + max(duration, 1), self.size)
+        return max(self.occupancy[first:last], default=0)
+
+
+def compute_free_slots(schedule, duration, slot_minutes=30):
+    """
+    Рассчитывает доступность всех слотов рабочего дня.
+
+    :param schedule: Шкала занятости с методом is_free(начало, длительность) и
+        атрибутами start/end в минутах от начала суток.
+    :param duration: Длительность новой записи в минутах (int).
+    :param slot_minutes: Шаг сетки слотов в минутах (int).
+    :return: Список пар (время слота 'ЧЧ:ММ', доступен ли слот).
+    """
+    step = max(int(slot_minutes), 1)
+    return [
+        (format_minutes(minute), schedule.is_free(minute, duration))
+        for minute in range(schedule.start, schedule.end, step)
+    ]
+
+
+class MemoryHoldStore:
+    """Удержания слотов в памяти процесса."""
+
+    def __init__(self):
+        self._holds = {}
+        self._lock = Lock()
+
+    def _purge(self, now):
+        for owner in [owner for owner, hold in self._holds.items() if hold[3] <= now]:
+            del self._holds[owner]
+
+    def hold(self, owner, day, start, end, expires):
+        """
+        Сохраняет удержание владельца, заменяя предыдущее.
+
+        :param owner: Владелец удержания (str).
+        :param day: Дата (datetime.date).
+        :param start: Начало интервала (datetime.time).
+        :param end: Окончание интервала (datetime.time).
+        :param expires: Время истечения (timestamp).
+        """
+        with self._lock:
+            self._purge(time_now())
+            self._holds[owner] = (day, start, end, expires)
+
+    def release(self, owner):
+        """
+        Удаляет удержание владельца.
+
+        :param owner: Владелец удержания (str).
+        """
+        with self._lock:
+            self._holds.pop(owner, None)
+
+    def intervals(self, day, exclude_owner, now):
+        """
+        Возвращает действующие удержания на дату.
+
+        :param day: Дата (datetime.date).
+        :param exclude_owner: Владелец, чьи удержания не учитываются (str или None).
+        :param now: Текущее время (timestamp).
+        :return: Список пар (начало, окончание).
+        """
+        with self._lock:
+            self._purge(now)
+            return [
+                (start, end) for owner, (held_day, start, end, _) in self._holds.items()
+                if held_day == day and owner != exclude_owner
+            ]
+
+
+class SqliteHoldStore:
+    """
+    Удержания слотов в файле SQLite, общем для рабочих процессов сервера.
+
+    Соединение открывается отдельно в каждом процессе.
+    """
+
+    cleanup_every = 1000
+
+    def __init__(self, path):
+        """
+        :param path: Путь к файлу базы (str).
+        """
+        self.path = path
+        self._connection = None
+        self._pid = None
+        self._lock = Lock()
+        self._holds = 0
+
+    def hold(self, owner, day, start, end, expires):
+        """См. MemoryHoldStore.hold."""
+        with self._lock:
+            connection = self._connect()
+            connection.execute(
+                'INSERT OR REPLACE INTO slot_holds (owner, day, start, "end", expires) VALUES (?, ?, ?, ?, ?)',
+                (owner, day.isoformat(), start.strftime('%H:%M'), end.strftime('%H:%M'), expires)
+            )
+            self._holds += 1
+            if self._holds % self.cleanup_every == 0:
+                connection.execute('DELETE FROM slot_holds WHERE expires <= ?', (time_now(),))
+
+    def release(self, owner):
+        """См. MemoryHoldStore.release."""
+        with self._lock:
+            self._connect().execute('DELETE FROM slot_holds WHERE owner = ?', (owner,))
+
+    def intervals(self, day, exclude_owner, now):
+        """См. MemoryHoldStore.intervals."""
+        with self._lock:
+            rows = self._connect().execute(
+                'SELECT start, "end" FROM slot_holds WHERE day = ? AND expires > ? AND owner IS NOT ?',
+                (day.isoformat(), now, exclude_owner)
+            ).fetchall()
+        return [(time.fromisoformat(start), time.fromisoformat(end)) for start, end in rows]
+
+    def _connect(self):
+        if self._connection is None or self._pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS slot_holds (owner TEXT PRIMARY KEY, day TEXT NOT NULL, '
+                'start TEXT NOT NULL, "end" TEXT NOT NULL, expires REAL NOT NULL)'
+            )
+            connection.execute('CREATE INDEX IF NOT EXISTS ix_slot_holds_day ON slot_holds (day, expires)')
+            self._connection = connection
+            self._pid = os.getpid()
+        return self._connection
+
+
+class SlotHolds:
+    """
+    Кратковременные удержания слотов.
+
+    Пока клиент заполняет форму, выбранный им слот не предлагается другим
+    клиентам. Удержания истекают сами, поэтому окончательную проверку
+    занятости выполняет транзакция записи. Хранилище выбирается параметром
+    SLOT_HOLDS_BACKEND: 'sqlite' (файл SLOT_HOLDS_DB_PATH, общий для рабочих
+    процессов, чтобы удержание, сделанное через один процесс, видели все)
+    или 'memory'.
+    """
+
+    def __init__(self):
+        self.store = MemoryHoldStore()
+
+    def init_app(self, app):
+        """
+        Выбирает хранилище удержаний по настройке SLOT_HOLDS_BACKEND.
+
+        :param app: Приложение Flask.
+        """
+        if app.config['SLOT_HOLDS_BACKEND'] == 'sqlite':
+            self.store = SqliteHoldStore(app.config['SLOT_HOLDS_DB_PATH'])
+        else:
+            self.store = MemoryHoldStore()
+
+    def hold(self, owner, day, start, end, ttl):
+        """
+        Удерживает интервал за владельцем, заменяя его предыдущее удержание.
+
+        :param owner: Владелец удержания (например, идентификатор клиента).
+        :param day: Дата (datetime.date).
+        :param start: Начало интервала (datetime.time).
+        :param end: Окончание интервала (datetime.time).
+        :param ttl: Время жизни удержания в секундах (int).
+        """
+        self.store.hold(str(owner), day, start, end, time_now() + ttl)
+
+    def release(self, owner):
+        """
+        Снимает удержание владельца.
+
+        :param owner: Владелец удержания.
+        """
+        self.store.release(str(owner))
+
+    def intervals(self, day, exclude_owner=None):
+        """
+        Возвращает удерживаемые интервалы на дату.
+
+        :param day: Дата (datetime.date).
+        :param exclude_owner: Владелец, чьи удержания не учитываются.
+        :return: Список пар (начало, окончание).
+        """
+        return self.store.intervals(day, None if exclude_owner is None else str(exclude_owner), time_now())
+
+
+slot_holds = SlotHolds()
@@ -55,4 +55,52 @@ window.onclick = function(event) {
     if (event.target.classList.contains('modal')) {
         closeModal(event.target.id);
     }
-}
\ No newline at end of file
+}
+
+// Подписка на /events, пока вкладка видима. Если сервер отказал (лимит
+// потоков) или вкладка была скрыта, подключение повторяется позже, а onGap
+// заново загружает данные, чтобы не потерять пропущенные события.
+function subscribeEvents(handlers, onGap) {
+    const retryDelay = 30000;
+    let source = null;
+    let retryTimer = null;
+
+    function open() {
+        if (source || retryTimer || !window.EventSource || document.hidden) {
+            return;
+        }
+        source = new EventSource('/events');
+        Object.keys(handlers).forEach(name => source.addEventListener(name, handlers[name]));
+        source.onerror = function() {
+            if (source.readyState !== EventSource.CLOSED) {
+                return;
+            }
+            source = null;
+            retryTimer = setTimeout(function() {
+                retryTimer = null;
+                open();
+                onGap();
+            }, retryDelay);
+        };
+    }
+
+    function close() {
+        clearTimeout(retryTimer);
+        retryTimer = null;
+        if (source) {
+            source.close();
+            source = null;
+        }
+    }
+
+    document.addEventListener('visibilitychange', function() {
+        if (document.hidden) {
+            close();
+        } else {
+            open();
+            onGap();
+        }
+    });
+    window.addEventListener('pagehide', close);
+    open();
+}
@@ -1,22 +1,13 @@
-from flask import session, make_response, render_template
+from flask import g, session
 from .models import *
 from . import db
 from datetime import datetime
-from reportlab.lib.pagesizes import letter
-from reportlab.pdfgen import canvas
-from reportlab.lib.units import inch
-from reportlab.lib.colors import HexColor
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image, Table, TableStyle
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.enums import TA_CENTER
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from sqlalchemy import func, text
-from io import BytesIO
-import os
+from .catalog import list_services, list_car_models
+from .rollups import fold_stat_deltas, summarize_stats, summarize_stats_by_date
+from .logs import SAMPLED
 import logging
 
-logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
 
 STATUS_TRANSLATIONS = {
     'pending': 'В ожидании',
@@ -37,64 +28,31 @@ def get_current_user():
     """
     Возвращает текущего пользователя на основе данных сессии.
 
+    Пользователь загружается из базы не более одного раза за запрос.
+
     :return: Объект пользователя (Client или Employee) или None, если пользователь не найден.
     """
-    user_id = session.get('user_id')
-    role = session.get('role')
-    if role == 'client':
-        return Client.query.get(user_id)
-    elif role in ['mechanic', 'manager']:
-        return Employee.query.get(user_id)
-    return None
-
-def generate_pdf(order):
+    if 'current_user' not in g:
+        user_id = session.get('user_id')
+        role = session.get('role')
+        if role == 'client':
+            g.current_user = Client.query.get(user_id)
+        elif role in ['mechanic', 'manager']:
+            g.current_user = Employee.query.get(user_id)
+        else:
+            g.current_user = None
+    return g.current_user
+
+def parse_report_date(value):
     """
-    Генерирует PDF-документ для заказа.
+    Приводит дату периода отчета к datetime.date.
 
-    :param order: Объект заказа.
-    :return: BytesIO объект с содержимым PDF.
-    :raises ValueError: Если время или дата записи не указаны.
+    :param value: Дата (datetime.date, str 'ГГГГ-ММ-ДД' или None).
+    :return: Дата (datetime.date) или None.
     """
-    if not order.appointment_date or not order.appointment_time:
-        raise ValueError("Время и дата записи не могут быть None")
-
-    pdfmetrics.registerFont(TTFont('Arial', 'Arial.ttf'))
-
-    buffer = BytesIO()
-    pdf = canvas.Canvas(buffer, pagesize=letter)
-    pdf.setFont("Arial", 14)
-
-    logo_path = os.path.join(os.path.dirname(__file__), 'static', 'logo.png')
-    if os.path.exists(logo_path):
-        pdf.drawImage(logo_path, 1 * inch, 10.5 * inch, width=1.5 * inch, height=0.75 * inch)
-
-    pdf.drawString(2.5 * inch, 10.75 * inch, "Автосервис SkodaExpert")
-    pdf.setFont("Arial", 12)
-
-    pdf.drawString(1 * inch, 9.5 * inch, f"Номер заказ-наряда: {order.id}")
-    pdf.drawString(1 * inch, 9 * inch, f"Имя заказчика: {order.client.name}")
-    pdf.drawString(1 * inch, 8.5 * inch, f"Телефон: {order.client.phone}")
-    pdf.drawString(1 * inch, 8 * inch, f"Марка и модель авто: {order.car_brand} {order.car_model}")
-    pdf.drawString(1 * inch, 7.5 * inch, f"Год выпуска: {order.car.car_year}")
-    pdf.drawString(1 * inch, 7 * inch, f"Гос номер: {order.car.license_plate}")
-    pdf.drawString(1 * inch, 6.5 * inch, f"VIN код: {order.car.vin}")
-    formatted_date = order.appointment_date.strftime("%d.%m.%Y")
-    pdf.drawString(1 * inch, 6 * inch, f"Время записи: {formatted_date} {order.appointment_time}")
-
-    pdf.drawString(1 * inch, 5.5 * inch, "Выбранные услуги:")
-    y_position = 5 * inch
-    total_price = 0
-
-    for service in order.services:
-        pdf.drawString(1.5 * inch, y_position, f"- {service.service_name}: {service.price} руб.")
-        total_price += service.price
-        y_position -= 0.25 * inch
-
-    pdf.drawString(1 * inch, y_position - 0.5 * inch, f"Итоговая стоимость: {total_price} руб.")
-
-    pdf.save()
-    buffer.seek(0)
-    return buffer
+    if isinstance(value, str):
+        return datetime.strptime(value, '%Y-%m-%d').date() if value else None
+    return value
 
 def generate_manager_report(start_date=None, end_date=None):
     """
@@ -104,108 +62,90 @@ def generate_manager_report(start_date=None, end_date=None):
     - Общий доход
     - Финансовые показатели по услугам
 
+    Отчет строится одним запросом к дневной сводке daily_stats за период;
+    перед ним накопленные изменения сводки переносятся в daily_stats.
+
     :param start_date: Начальная дата периода (datetime.date, str или None).
-    :param end_date: Конечная дата периода (datetime.date, str или None).
+    :param end_date: Конечная дата периода включительно (datetime.date, str или None).
     :return: Словарь с данными отчета.
     """
     try:
-        logging.debug("Starting generate_manager_report function")
-        
-        if isinstance(start_date, str):
-            start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
-        if isinstance(end_date, str):
-            end_date = datetime.strptime(end_date, '%Y-%m-%d').date()
-        
-        params = {
-            "start_date": start_date.strftime('%Y-%m-%d') if start_date else "1900-01-01",
-            "end_date": end_date.strftime('%Y-%m-%d') if end_date else "9999-12-31",
-        }
-        
-        total_orders_query = """
-            SELECT 
-                COUNT(o.id) AS total_orders
-            FROM 
-                orders o
-            WHERE 
-                o.created_at >= COALESCE(:start_date, '1900-01-01')
-                AND o.created_at <= COALESCE(:end_date, '9999-12-31')
-        """
-        logging.debug(f"Executing total orders query: {total_orders_query} with params: {params}")
-        total_orders = db.session.execute(text(total_orders_query), params).scalar()
-        logging.debug(f"Total orders: {total_orders}")
-
-        orders_by_model_query = """
-            SELECT 
-                cm.brand,
-                cm.model_name,
-                COUNT(o.id) AS order_count
-            FROM 
-                car_models cm
-            JOIN 
-                cars c ON cm.id = c.car_model_id
-            JOIN 
-                orders o ON c.id = o.car_id
-            WHERE 
-                o.created_at >= COALESCE(:start_date, '1900-01-01')
-                AND o.created_at <= COALESCE(:end_date, '9999-12-31')
-            GROUP BY 
-                cm.brand, cm.model_name
-        """
-        logging.debug(f"Executing orders by model query: {orders_by_model_query} with params: {params}")
-        orders_by_model_result = db.session.execute(text(orders_by_model_query), params)
-        orders_by_model = [
-            {"brand": row[0], "model_name": row[1], "order_count": row[2]}
-            for row in orders_by_model_result
-        ]
-        logging.debug(f"Orders by model: {orders_by_model}")
-
-        revenue_query = """
-            SELECT 
-                CAST(COALESCE(SUM(s.price), 0) AS NUMERIC(10, 2)) AS total_revenue
-            FROM 
-                services s
-            JOIN 
-                order_services os ON s.id = os.service_id
-            JOIN 
-                orders o ON os.order_id = o.id
-            WHERE 
-                o.created_at >= COALESCE(:start_date, '1900-01-01')
-                AND o.created_at <= COALESCE(:end_date, '9999-12-31')
-        """
-        logging.debug(f"Executing revenue query: {revenue_query} with params: {params}")
-        total_revenue = db.session.execute(text(revenue_query), params).scalar()
-        logging.debug(f"Total revenue: {total_revenue}")
-
-        revenue_by_service_query = """
-            SELECT 
-                s.service_name,
-                CAST(COALESCE(SUM(s.price), 0) AS NUMERIC(10, 2)) AS revenue
-            FROM 
-                services s
-            JOIN 
-                order_services os ON s.id = os.service_id
-            JOIN 
-                orders o ON os.order_id = o.id
-            WHERE 
-                o.created_at >= COALESCE(:start_date, '1900-01-01')
-                AND o.created_at <= COALESCE(:end_date, '9999-12-31')
-            GROUP BY 
-                s.service_name
-        """
-        logging.debug(f"Executing revenue by service query: {revenue_by_service_query} with params: {params}")
-        revenue_by_service_result = db.session.execute(text(revenue_by_service_query), params)
-        revenue_by_service = [
-            {"service_name": row[0], "revenue": float(row[1])}
-            for row in revenue_by_service_result
-        ]
-        logging.debug(f"Revenue by service: {revenue_by_service}")
+        logger.debug("Starting generate_manager_report function", extra=SAMPLED)
+
+        fold_stat_deltas()
+        rows = summarize_stats(
+            ['orders', 'service', 'car_model'],
+            parse_report_date(start_date),
+            parse_report_date(end_date)
+        )
+        car_models = {model.id: model for model in list_car_models()}
+        services = {service.id: service for service in list_services()}
+
+        total_orders = 0
+        total_revenue = 0.0
+        orders_by_model = []
+        revenue_by_service = {}
+        for metric, item_id, _, quantity, amount in rows:
+            if metric == 'orders':
+                total_orders += quantity or 0
+                total_revenue += amount or 0.0
+            elif metric == 'car_model' and quantity:
+                model = car_models.get(item_id)
+                orders_by_model.append({
+                    "brand": model.brand if model else "",
+                    "model_name": model.model_name if model else f"#{item_id}",
+                    "order_count": quantity
+                })
+            elif metric == 'service' and quantity:
+                service = services.get(item_id)
+                service_name = service.service_name if service else f"#{item_id}"
+                revenue_by_service[service_name] = revenue_by_service.get(service_name, 0.0) + round(amount or 0.0, 2)
 
         return {
             "total_orders": total_orders,
             "orders_by_model": orders_by_model,
-            "total_revenue": float(total_revenue) if total_revenue else 0.0,
-            "revenue_by_service": revenue_by_service,
+            "total_revenue": round(total_revenue, 2),
+            "revenue_by_service": [
+                {"service_name": service_name, "revenue": revenue}
+                for service_name, revenue in revenue_by_service.items()
+            ],
         }
     except Exception as e:
-        logging.error(f"Error in generate_manager_report: {e}", exc_info=True)
+        logger.error("Error in generate_manager_report: %s", e, exc_info=True)
         raise
+
+def calculate_statistics(start_date=None, end_date=None):
+    """
+    Собирает данные для страницы статистики менеджера из дневной сводки.
+
+    :param start_date: Начальная дата периода (datetime.date, str или None).
+    :param end_date: Конечная дата периода включительно (datetime.date, str или None).
+    :return: Словарь с рядами для графиков заказов, услуг и задач механиков.
+    """
+    start_date = parse_report_date(start_date)
+    end_date = parse_report_date(end_date)
+    fold_stat_deltas()
+
+    orders_by_month = {}
+    for stat_date, quantity, amount in summarize_stats_by_date('orders', start_date, end_date):
+        month = stat_date.strftime('%m.%Y')
+        orders_by_month[month] = orders_by_month.get(month, 0) + (quantity or 0)
+
+    services = {service.id: service.service_name for service in list_services()}
+    employees = dict(db.session.query(Employee.id, Employee.name).filter(Employee.role == 'mechanic').all())
+    service_popularity = {}
+    tasks_by_mechanic = {}
+    for metric, item_id, label, quantity, _ in summarize_stats(['service', 'task'], start_date, end_date):
+        if metric == 'service' and quantity:
+            service_popularity[services.get(item_id, f"#{item_id}")] = quantity
+        elif metric == 'task' and quantity:
+            mechanic = tasks_by_mechanic.setdefault(employees.get(item_id, f"#{item_id}"), {})
+            mechanic[translate_status(label)] = quantity
+
+    return {
+        "order_labels": list(orders_by_month.keys()),
+        "order_counts": list(orders_by_month.values()),
+        "service_labels": list(service_popularity.keys()),
+        "service_counts": list(service_popularity.values()),
+        "tasks_by_mechanic": tasks_by_mechanic,
+    }
@@ -0,0 +1,129 @@
+"""
+Общие для рабочих процессов версии кэшируемых данных.
+
+Этот файл содержит счетчики версий, по которым кэши процессов (профили
+пользователей, справочники услуг и моделей) узнают, что данные изменил
+другой рабочий процесс: запись увеличивает версию ключа, а чтение из кэша
+сравнивает версию записи кэша с текущей.
+
+Хранилище выбирается параметром VERSIONS_BACKEND: 'sqlite' (файл
+VERSIONS_DB_PATH, общий для процессов gunicorn на одном сервере) или
+'memory' (один процесс, например в тестах).
+"""
+
+from threading import Lock
+import os
+import sqlite3
+
+
+class MemoryVersions:
+    """Версии в памяти процесса."""
+
+    def __init__(self):
+        self._versions = {}
+        self._lock = Lock()
+
+    def get(self, key):
+        """
+        Возвращает текущую версию ключа.
+
+        :param key: Ключ данных (str).
+        :return: Версия (int), 0 для ключа без изменений.
+        """
+        with self._lock:
+            return self._versions.get(key, 0)
+
+    def bump(self, key):
+        """
+        Увеличивает версию ключа после изменения данных.
+
+        :param key: Ключ данных (str).
+        """
+        with self._lock:
+            self._versions[key] = self._versions.get(key, 0) + 1
+
+
+class SqliteVersions:
+    """
+    Версии в файле SQLite, общем для рабочих процессов сервера.
+
+    Версии читаются в память процесса целиком и перечитываются, только когда
+    PRAGMA data_version показывает, что другой процесс изменил файл, поэтому
+    проверка версии обычно не читает таблицу. Соединение открывается
+    отдельно в каждом процессе.
+    """
+
+    def __init__(self, path):
+        """
+        :param path: Путь к файлу базы (str).
+        """
+        self.path = path
+        self._versions = {}
+        self._data_version = None
+        self._connection = None
+        self._pid = None
+        self._lock = Lock()
+
+    def get(self, key):
+        """См. MemoryVersions.get."""
+        with self._lock:
+            self._sync()
+            return self._versions.get(key, 0)
+
+    def bump(self, key):
+        """См. MemoryVersions.bump."""
+        with self._lock:
+            connection = self._connect()
+            connection.execute(
+                'INSERT INTO versions (key, version) VALUES (?, 1) '
+                'ON CONFLICT (key) DO UPDATE SET version = version + 1',
+                (key,)
+            )
+            self._data_version = None
+
+    def _sync(self):
+        connection = self._connect()
+        data_version = connection.execute('PRAGMA data_version').fetchone()[0]
+        if data_version != self._data_version:
+            self._versions = dict(connection.execute('SELECT key, version FROM versions'))
+            self._data_version = data_version
+
+    def _connect(self):
+        if self._connection is None or self._pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('CREATE TABLE IF NOT EXISTS versions (key TEXT PRIMARY KEY, version INTEGER NOT NULL)')
+            self._connection = connection
+            self._pid = os.getpid()
+            self._data_version = None
+        return self._connection
+
+
+class SharedVersions:
+    """Точка доступа к версиям поверх хранилища, выбранного настройкой VERSIONS_BACKEND."""
+
+    def __init__(self):
+        self.store = MemoryVersions()
+
+    def init_app(self, app):
+        """
+        Выбирает хранилище версий.
+
+        :param app: Приложение Flask.
+        """
+        if app.config['VERSIONS_BACKEND'] == 'sqlite':
+            self.store = SqliteVersions(app.config['VERSIONS_DB_PATH'])
+        else:
+            self.store = MemoryVersions()
+
+    def get(self, key):
+        """См. MemoryVersions.get."""
+        return self.store.get(key)
+
+    def bump(self, key):
+        """См. MemoryVersions.bump."""
+        self.store.bump(key)
+
+
+shared_versions = SharedVersions()
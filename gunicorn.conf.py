@@ -0,0 +1,46 @@
+"""
+Настройки gunicorn.
+
+Этот файл задает количество рабочих процессов и сбрасывает пул соединений
+с базой данных в каждом процессе после fork: приложение загружается один раз
+в главном процессе, а соединения, открытые до fork, не должны использоваться
+несколькими процессами одновременно.
+
+Каждый открытый поток /events занимает поток рабочего процесса на все время
+соединения (не дольше EVENT_STREAM_SECONDS). Приложение открывает в процессе
+не больше EVENT_MAX_STREAMS таких потоков, а post_fork уменьшает этот лимит
+до GUNICORN_THREADS - 1, чтобы хотя бы один поток всегда оставался обычным
+запросам. Асинхронные классы процессов (gevent, eventlet) не подходят:
+драйвер Firebird блокирует процесс целиком на время каждого запроса к базе.
+
+Адрес клиента берется из соединения. За обратным прокси привяжите gunicorn
+к 127.0.0.1 (GUNICORN_BIND) и задайте PROXY_FIX_X_FOR=1; без прокси
+PROXY_FIX_X_FOR оставляйте 0, иначе заголовок X-Forwarded-For подделывается.
+"""
+
+import multiprocessing
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = 100
+preload_app = True
+accesslog = '-'
+
+
+def post_fork(server, worker):
+    """
+    Отбрасывает унаследованные от главного процесса соединения с базой данных
+    и ограничивает число потоков /events числом потоков процесса.
+    """
+    from app import db
+    from app.events import event_bus
+    from wsgi import app
+
+    with app.app_context():
+        db.engine.dispose(close=False)
+    event_bus.max_streams = min(event_bus.max_streams, max(server.cfg.threads - 1, 0))
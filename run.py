@@ -1,8 +1,10 @@
 """
 Файл запуска приложения.
 
-Этот файл создает и запускает приложение Flask. Он также проверяет подключение к базе данных
-и выводит текущее время в базе данных.
+Этот файл создает и запускает приложение Flask на встроенном сервере для разработки.
+Он также проверяет подключение к базе данных и выводит текущее время в базе данных.
+Конфигурация выбирается переменной окружения FLASK_CONFIG; в производстве приложение
+запускается через gunicorn (см. wsgi.py и gunicorn.conf.py).
 """
 
 from app import create_app, db
@@ -23,4 +25,4 @@ if __name__ == '__main__':
                     print("Не удалось получить текущее время.")
         except Exception as e:
             print(f"Database connection error: {e}")
-    app.run(debug=True)
+    app.run(debug=app.config['DEBUG'])
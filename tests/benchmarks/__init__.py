@@ -0,0 +1,115 @@
+"""
+Замеры производительности.
+
+Этот пакет содержит сценарии замеров, которые запускаются вручную, например
+python -W ignore -m tests.benchmarks.bench_slots, и печатают таблицу результатов
+«до/после». Приложение в замерах работает с конфигурацией 'testing' поверх
+временной базы SQLite, поэтому абсолютные числа ниже, чем на Firebird в
+production, а сравнивать имеет смысл строки одной таблицы между собой.
+tests/test_benchmarks.py прогоняет каждый сценарий на малых размерах, чтобы
+сценарии не ломались вместе с кодом.
+"""
+
+from contextlib import contextmanager
+from datetime import time, timedelta
+import logging
+import os
+import shutil
+import tempfile
+import time as clock
+from app import create_app, db
+from app.catalog import car_models_cache, services_cache
+from app.models import Car, Client, Employee
+from ..conftest import add_order, next_workday, seed
+
+
+def quiet():
+    """Отключает журнал приложения, чтобы вывод замера содержал только таблицу."""
+    logging.disable(logging.ERROR)
+
+
+def measure(function, repeat=5, number=1):
+    """
+    Замеряет время выполнения функции.
+
+    :param function: Функция без аргументов.
+    :param repeat: Сколько раз повторить замер (int).
+    :param number: Сколько вызовов в одном замере (int).
+    :return: Лучшее время одного вызова в миллисекундах (float).
+    """
+    best = None
+    for _ in range(repeat):
+        started = clock.perf_counter()
+        for _ in range(number):
+            function()
+        elapsed = (clock.perf_counter() - started) / number
+        best = elapsed if best is None else min(best, elapsed)
+    return best * 1000
+
+
+@contextmanager
+def bench_app(**config):
+    """
+    Создает приложение с заполненной временной базой и удаляет ее после замера.
+
+    :param config: Параметры, которые заменяют значения конфигурации 'testing'.
+    :return: Приложение Flask.
+    """
+    directory = tempfile.mkdtemp(prefix='bench-')
+    app = create_app('testing', {
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + os.path.join(directory, 'bench.db'),
+        'PDF_CACHE_DIR': os.path.join(directory, 'pdf_cache'),
+        **config,
+    })
+    services_cache.invalidate()
+    car_models_cache.invalidate()
+    try:
+        with app.app_context():
+            db.create_all()
+            seed()
+        yield app
+    finally:
+        with app.app_context():
+            db.session.remove()
+            db.engine.dispose()
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def add_orders(count, day=None, days=1):
+    """
+    Добавляет заказы клиента из тестовых данных, по очереди назначая их механикам.
+
+    Вызывается внутри контекста приложения.
+
+    :param count: Число заказов (int).
+    :param day: Первая дата (datetime.date), по умолчанию ближайший рабочий день.
+    :param days: На сколько дней подряд распределить заказы (int).
+    :return: Первая дата (datetime.date).
+    """
+    day = day or next_workday()
+    client = Client.query.filter_by(email='client@example.com').one()
+    car = Car.query.filter_by(client_id=client.id).first()
+    mechanics = [mechanic_id for mechanic_id, in db.session.query(Employee.id).filter(Employee.role == 'mechanic')]
+    for number in range(count):
+        start = 9 * 60 + (number * 30) % (8 * 60)
+        add_order(client.id, car.id, mechanics[number % len(mechanics)], day + timedelta(days=number % days),
+                  time(start // 60, start % 60), time(start // 60 + 1, start % 60))
+    db.session.commit()
+    return day
+
+
+def print_table(title, headers, rows):
+    """
+    Печатает результаты замера таблицей.
+
+    :param title: Заголовок таблицы (str).
+    :param headers: Названия столбцов.
+    :param rows: Строки таблицы; числа печатаются с двумя знаками после запятой.
+    """
+    cells = [[f'{value:.2f}' if isinstance(value, float) else str(value) for value in row] for row in rows]
+    widths = [max(len(str(header)), *(len(row[index]) for row in cells)) for index, header in enumerate(headers)]
+    print(title)
+    print('  '.join(str(header).rjust(width) for header, width in zip(headers, widths)))
+    for row in cells:
+        print('  '.join(value.rjust(width) for value, width in zip(row, widths)))
+    print()
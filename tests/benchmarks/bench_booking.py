@@ -0,0 +1,125 @@
+"""
+Замер пропускной способности оформления записей.
+
+Этот файл сравнивает прежнее оформление записи (четыре коммита: автомобиль,
+заказ, услуги, задача механика) с create_booking, которая сохраняет все
+одной транзакцией, при 1, 4 и 8 параллельных клиентах на локальной базе
+SQLite. Каждый клиент оформляет записи на свои дни, поэтому замер показывает
+стоимость транзакций, а не ожидание блокировки одного дня.
+
+Запуск: python -W ignore -m tests.benchmarks.bench_booking [--clients 1 4 8] [--bookings 40]
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import argparse
+import time as clock
+from sqlalchemy import event, func
+from app import db
+from app.booking import calculate_end_time, create_booking
+from app.models import Car, CarModel, Client, Employee, Order, Service, Task
+from . import bench_app, print_table, quiet
+
+FIRST_DAY = datetime(2030, 1, 7).date()
+SLOTS_PER_DAY = 8
+
+
+def four_commit_booking(client_id, car_model, car_year, vin, license_plate, appointment_date, appointment_time, services):
+    """Прежнее оформление записи: каждый шаг фиксируется отдельным коммитом."""
+    new_car = Car(client_id=client_id, car_model_id=car_model.id, car_year=car_year, vin=vin,
+                  license_plate=license_plate)
+    db.session.add(new_car)
+    db.session.commit()
+    start_time = datetime.strptime(appointment_time, '%H:%M').time()
+    new_order = Order(client_id=client_id, car_id=new_car.id, car_brand=car_model.brand,
+                      car_model=car_model.model_name, appointment_date=appointment_date,
+                      appointment_time=start_time,
+                      end_time=calculate_end_time(appointment_date, start_time, services))
+    db.session.add(new_order)
+    db.session.commit()
+    for service in services:
+        new_order.services.append(db.session.get(Service, service.id))
+    mechanic_id = (
+        db.session.query(Employee.id)
+        .outerjoin(Task, Task.employee_id == Employee.id)
+        .filter(Employee.role == 'mechanic')
+        .group_by(Employee.id)
+        .order_by(func.count(Task.id))
+        .first()[0]
+    )
+    db.session.add(Task(employee_id=mechanic_id, order_id=new_order.id, status='pending'))
+    db.session.commit()
+    db.session.commit()
+    return new_order
+
+
+def book_many(app, book, client_number, count):
+    """
+    Оформляет count записей одного клиента на его собственные дни.
+
+    :return: Число оформленных записей (int).
+    """
+    with app.app_context():
+        client_id = Client.query.filter_by(email='client@example.com').one().id
+        car_model = CarModel.query.first()
+        services = Service.query.filter(Service.id == 1).all()
+    for number in range(count):
+        day = FIRST_DAY + timedelta(days=client_number * (count // SLOTS_PER_DAY + 1) + number // SLOTS_PER_DAY)
+        with app.app_context():
+            book(client_id, car_model, 2015, f'VIN{client_number:03d}{number:014d}', f'P{client_number}-{number}',
+                 day, f'{9 + number % SLOTS_PER_DAY:02d}:00', services)
+    return count
+
+
+def measure_throughput(book, clients, bookings):
+    """
+    Замеряет число записей в секунду и коммитов на запись.
+
+    :param book: Функция оформления записи.
+    :param clients: Число параллельных клиентов (int).
+    :param bookings: Число записей одного клиента (int).
+    :return: Кортеж (записей в секунду, коммитов на запись).
+    """
+    with bench_app() as app:
+        commits = []
+        with app.app_context():
+            engine = db.engine
+        event.listen(engine, 'commit', lambda connection: commits.append(1))
+        started = clock.perf_counter()
+        with ThreadPoolExecutor(clients) as executor:
+            total = sum(executor.map(lambda number: book_many(app, book, number, bookings), range(clients)))
+        elapsed = clock.perf_counter() - started
+    return total / elapsed, len(commits) / total
+
+
+def run(client_counts, bookings):
+    """
+    Выполняет замеры.
+
+    :param client_counts: Числа параллельных клиентов.
+    :param bookings: Число записей одного клиента (int).
+    :return: Список строк (клиентов, записей/с и коммитов на запись до и после).
+    """
+    rows = []
+    for clients in client_counts:
+        before, before_commits = measure_throughput(four_commit_booking, clients, bookings)
+        after, after_commits = measure_throughput(create_booking, clients, bookings)
+        rows.append((clients, before, after, before_commits, after_commits))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--clients', type=int, nargs='+', default=[1, 4, 8])
+    parser.add_argument('--bookings', type=int, default=40)
+    args = parser.parse_args(argv)
+    quiet()
+    print_table(
+        'Оформление записей на SQLite',
+        ['клиентов', 'записей/с до', 'записей/с после', 'коммитов до', 'коммитов после'],
+        run(args.clients, args.bookings),
+    )
+
+
+if __name__ == '__main__':
+    main()
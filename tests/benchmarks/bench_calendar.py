@@ -0,0 +1,82 @@
+"""
+Замер календаря свободных слотов на месяц.
+
+Этот файл сравнивает месяц в интерфейсе записи, собранный прежним способом
+(30 последовательных запросов /get_available_slots по одному дню), с одним
+запросом /availability_calendar на 30 дней, без кэша слотов и с ним, и
+считает SQL-запросы каждого способа.
+
+Запуск: python -W ignore -m tests.benchmarks.bench_calendar [--orders 300] [--days 30]
+"""
+
+from datetime import timedelta
+import argparse
+from sqlalchemy import event
+from app import db
+from app.availability import slot_memo
+from . import add_orders, bench_app, measure, print_table, quiet
+
+
+def run(orders=300, days=30, repeat=5):
+    """
+    Выполняет замеры.
+
+    :param orders: Число заказов, распределенных по дням периода (int).
+    :param days: Длина периода в днях (int).
+    :param repeat: Число повторов каждого замера (int).
+    :return: Список строк (способ, кэш, мс, SQL-запросов).
+    """
+    with bench_app() as app:
+        with app.app_context():
+            first_day = add_orders(orders, days=days)
+            engine = db.engine
+        dates = [(first_day + timedelta(days=offset)).isoformat() for offset in range(days)]
+        client = app.test_client()
+
+        def day_by_day():
+            for day in dates:
+                assert client.get(f'/get_available_slots?date={day}&services=1,2').status_code == 200
+
+        def calendar():
+            url = f'/availability_calendar?start={dates[0]}&end={dates[-1]}&services=1,2'
+            assert client.get(url).status_code == 200
+
+        def cold(function):
+            def call():
+                slot_memo._entries.clear()
+                function()
+            return call
+
+        def statements(function):
+            executed = []
+            listener = lambda *args: executed.append(1)
+            event.listen(engine, 'before_cursor_execute', listener)
+            try:
+                function()
+            finally:
+                event.remove(engine, 'before_cursor_execute', listener)
+            return len(executed)
+
+        rows = []
+        for title, function in ((f'{days} запросов по дню', day_by_day), ('/availability_calendar', calendar)):
+            rows.append((title, 'нет', measure(cold(function), repeat), statements(cold(function))))
+            function()
+            rows.append((title, 'есть', measure(function, repeat), statements(function)))
+        return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--orders', type=int, default=300)
+    parser.add_argument('--days', type=int, default=30)
+    args = parser.parse_args(argv)
+    quiet()
+    print_table(
+        f'Свободные слоты на {args.days} дней, {args.orders} заказов, лучшее время из повторов',
+        ['способ', 'кэш слотов', 'мс', 'SQL-запросов'],
+        run(args.orders, args.days),
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,215 @@
+"""
+Нагрузочный замер потоков /events.
+
+Этот файл запускает приложение под gunicorn (один рабочий процесс с
+достаточным числом потоков), открывает N одновременных потоков
+server-sent events и замеряет загрузку процессора сервером за окно
+замера; для сравнения те же N клиентов опрашивают /get_available_slots
+раз в --interval секунд, как страницы до появления /events. Потоки
+открываются по нарастающей на одном сервере (закрытый клиентом поток
+освобождает поток сервера только при следующей записи), а опрос
+замеряется на отдельном сервере. Загрузка считается по /proc, поэтому
+замер работает только в Linux. Приложение работает с конфигурацией
+'testing', то есть с брокером событий в памяти процесса.
+
+Запуск: python -W ignore -m tests.benchmarks.bench_events [--connections 0 25 50 100] [--seconds 5]
+"""
+
+from threading import Event, Thread
+from urllib.parse import urlencode
+import argparse
+import http.client
+import os
+import shutil
+import signal
+import socket
+import subprocess
+import tempfile
+import time as clock
+from ..conftest import PASSWORD
+from .bench_workers import free_port, prepare, start_server, stop_server, wait_ready
+from . import print_table, quiet
+
+
+def process_tree(root_pid):
+    """
+    Возвращает процессорное время процесса и всех его потомков.
+
+    :param root_pid: Идентификатор корневого процесса (int).
+    :return: Словарь {идентификатор процесса: utime + stime в тиках}.
+    """
+    stats = {}
+    for name in os.listdir('/proc'):
+        if not name.isdigit():
+            continue
+        try:
+            with open(f'/proc/{name}/stat') as stat:
+                fields = stat.read().rsplit(')', 1)[1].split()
+        except OSError:
+            continue
+        stats[int(name)] = (int(fields[1]), int(fields[11]) + int(fields[12]))
+    tree = {}
+    for pid in sorted(stats):
+        if pid == root_pid or stats[pid][0] in tree:
+            tree[pid] = stats[pid][1]
+    return tree
+
+
+def cpu_percent(pid, seconds):
+    """Замеряет загрузку процессора процессом и его потомками за seconds секунд, в процентах одного ядра."""
+    started = sum(process_tree(pid).values())
+    clock.sleep(seconds)
+    return (sum(process_tree(pid).values()) - started) / os.sysconf('SC_CLK_TCK') / seconds * 100
+
+
+def kill_server(server):
+    """
+    Останавливает сервер с открытыми потоками /events.
+
+    Рабочий процесс gunicorn при остановке ждет завершения потоков, а поток
+    замечает закрытое клиентом соединение только при следующей записи,
+    поэтому процессы, не завершившиеся за 2 секунды, убиваются.
+    """
+    tree = process_tree(server.pid)
+    server.send_signal(signal.SIGINT)
+    try:
+        server.wait(timeout=2)
+    except subprocess.TimeoutExpired:
+        for pid in tree:
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        server.wait(timeout=30)
+
+
+def login_cookie(port):
+    """Входит клиентом из тестовых данных и возвращает cookie сессии."""
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    connection.request('POST', '/login', urlencode({'email': 'client@example.com', 'password': PASSWORD}),
+                       {'Content-Type': 'application/x-www-form-urlencoded'})
+    response = connection.getresponse()
+    response.read()
+    connection.close()
+    return response.getheader('Set-Cookie').split(';', 1)[0]
+
+
+def open_stream(port, cookie):
+    """
+    Открывает поток /events и читает заголовки ответа.
+
+    :return: Сокет открытого потока.
+    """
+    stream = socket.create_connection(('127.0.0.1', port), timeout=30)
+    stream.sendall(
+        f'GET /events HTTP/1.1\r\nHost: 127.0.0.1\r\nCookie: {cookie}\r\nAccept: text/event-stream\r\n\r\n'.encode()
+    )
+    head = b''
+    while b'\r\n\r\n' not in head:
+        head += stream.recv(4096)
+    if not head.startswith(b'HTTP/1.1 200'):
+        raise RuntimeError(head.split(b'\r\n', 1)[0].decode())
+    return stream
+
+
+def poll(port, path, interval, stop):
+    """
+    Запрашивает path раз в interval секунд, пока не установлен stop.
+
+    Каждый запрос идет по новому соединению: gunicorn закрывает простаивающие
+    соединения keep-alive через 2 секунды.
+    """
+    while not stop.is_set():
+        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        connection.request('GET', path)
+        connection.getresponse().read()
+        connection.close()
+        stop.wait(interval)
+
+
+def measure_streams(directory, path, connection_counts, threads, seconds):
+    """
+    Открывает потоки /events по нарастающей и замеряет загрузку при каждом их числе.
+
+    :return: Список процентов ядра в порядке connection_counts.
+    """
+    port = free_port()
+    server = start_server(directory, port, 1, threads, EVENT_MAX_STREAMS=str(threads))
+    streams = []
+    try:
+        wait_ready(port, path)
+        cookie = login_cookie(port)
+        result = []
+        for count in sorted(connection_counts):
+            streams.extend(open_stream(port, cookie) for _ in range(count - len(streams)))
+            clock.sleep(1)
+            result.append(cpu_percent(server.pid, seconds))
+        return result
+    finally:
+        for stream in streams:
+            stream.close()
+        kill_server(server)
+
+
+def measure_polling(directory, path, count, threads, seconds, interval):
+    """
+    Замеряет загрузку сервера, который опрашивают count клиентов.
+
+    :return: Процент ядра (float).
+    """
+    port = free_port()
+    server = start_server(directory, port, 1, threads)
+    stop = Event()
+    pollers = [Thread(target=poll, args=(port, path, interval, stop)) for _ in range(count)]
+    try:
+        wait_ready(port, path)
+        for poller in pollers:
+            poller.start()
+        clock.sleep(1)
+        return cpu_percent(server.pid, seconds)
+    finally:
+        stop.set()
+        for poller in pollers:
+            poller.join()
+        stop_server(server)
+
+
+def run(connection_counts, seconds=5, interval=2):
+    """
+    Выполняет замеры.
+
+    :param connection_counts: Числа одновременных клиентов.
+    :param seconds: Длительность окна замера (float).
+    :param interval: Интервал опроса в сравнении (float).
+    :return: Список строк (клиентов, % ядра с потоками /events, % ядра при опросе).
+    """
+    connection_counts = sorted(connection_counts)
+    threads = connection_counts[-1] + 4
+    directory = tempfile.mkdtemp(prefix='bench-events-')
+    try:
+        path = prepare(directory)
+        streaming = measure_streams(directory, path, connection_counts, threads, seconds)
+        return [
+            (count, cpu, measure_polling(directory, path, count, threads, seconds, interval))
+            for count, cpu in zip(connection_counts, streaming)
+        ]
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--connections', type=int, nargs='+', default=[0, 25, 50, 100])
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--interval', type=float, default=2)
+    args = parser.parse_args(argv)
+    quiet()
+    print_table(
+        f'Загрузка процессора сервером, % одного ядра (опрос раз в {args.interval:g} с)',
+        ['клиентов', 'потоки /events', 'опрос /get_available_slots'],
+        run(args.connections, args.seconds, args.interval),
+    )
+
+
+if __name__ == '__main__':
+    main()
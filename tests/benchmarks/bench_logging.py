@@ -0,0 +1,98 @@
+"""
+Замер отчета менеджера при разных настройках журналирования.
+
+Этот файл замеряет generate_manager_report при выключенном журнале, уровне
+INFO (production), DEBUG с выборкой 1% и DEBUG без выборки, а также
+отдельно стоимость прежних отладочных сообщений отчета (текст SQL и списки
+результатов, собранные f-строками до проверки уровня, поэтому она платится
+и при уровне INFO) и нынешнего сообщения с ленивым форматированием и
+пометкой SAMPLED. Записи журнала пишутся в память, а не в терминал.
+
+Запуск: python -W ignore -m tests.benchmarks.bench_logging [--orders 10000]
+"""
+
+from io import StringIO
+import argparse
+import logging
+from app.logs import HANDLER_NAME, SAMPLED, init_logging
+from app.utils import generate_manager_report, logger
+from .bench_report import BASELINE_QUERIES, fill_orders
+from . import bench_app, measure, print_table, quiet
+
+CONFIGURATIONS = [
+    ('выключен (WARNING)', 'WARNING', 1.0),
+    ('INFO', 'INFO', 0.01),
+    ('DEBUG, выборка 1%', 'DEBUG', 0.01),
+    ('DEBUG, без выборки', 'DEBUG', 1.0),
+]
+
+
+def eager_messages(report):
+    """Прежние отладочные сообщения отчета, которые форматируются при любом уровне."""
+    params = {'start_date': '1900-01-01', 'end_date': '9999-12-31'}
+    logging.debug(f"Starting generate_manager_report function")
+    for query in BASELINE_QUERIES:
+        logging.debug(f"Executing query: {query} with params: {params}")
+    logging.debug(f"Total orders: {report['total_orders']}")
+    logging.debug(f"Orders by model: {report['orders_by_model']}")
+    logging.debug(f"Total revenue: {report['total_revenue']}")
+    logging.debug(f"Revenue by service: {report['revenue_by_service']}")
+
+
+def lazy_message():
+    """Нынешнее отладочное сообщение отчета."""
+    logger.debug("Starting generate_manager_report function", extra=SAMPLED)
+
+
+def configure(app, level, sample_rate):
+    """Перенастраивает журнал приложения и направляет его записи в память."""
+    app.config.update(LOG_LEVEL=level, LOG_DEBUG_SAMPLE_RATE=sample_rate)
+    init_logging(app)
+    for handler in logging.getLogger().handlers:
+        if handler.get_name() == HANDLER_NAME:
+            handler.setStream(StringIO())
+
+
+def run(orders, number=200):
+    """
+    Выполняет замеры.
+
+    :param orders: Число заказов в базе (int).
+    :param number: Число отчетов в одном замере (int).
+    :return: Список строк (журнал, отчет мс, прежние сообщения мкс, нынешнее сообщение мкс).
+    """
+    disabled = logging.root.manager.disable
+    with bench_app() as app, app.app_context():
+        fill_orders(orders)
+        report = generate_manager_report()
+        logging.disable(logging.NOTSET)
+        try:
+            rows = []
+            for title, level, sample_rate in CONFIGURATIONS:
+                configure(app, level, sample_rate)
+                rows.append((
+                    title,
+                    measure(generate_manager_report, number=number),
+                    measure(lambda: eager_messages(report), number=number) * 1000,
+                    measure(lazy_message, number=number) * 1000,
+                ))
+            return rows
+        finally:
+            logging.disable(disabled)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--orders', type=int, default=10000)
+    parser.add_argument('--number', type=int, default=200)
+    args = parser.parse_args(argv)
+    quiet()
+    print_table(
+        'Отчет менеджера и его отладочные сообщения, лучшее время из повторов',
+        ['журнал', 'отчет, мс', 'прежние сообщения, мкс', 'нынешнее сообщение, мкс'],
+        run(args.orders, args.number),
+    )
+
+
+if __name__ == '__main__':
+    main()
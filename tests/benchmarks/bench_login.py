@@ -0,0 +1,121 @@
+"""
+Замер входа пользователей.
+
+Этот файл сравнивает прежний поиск учетной записи (запрос к сотрудникам, а
+при промахе второй запрос к клиентам) с find_identity, которая ищет в обеих
+таблицах одним запросом, при 10 000 клиентов, и замеряет число входов
+клиента в секунду через POST /login на одно ядро при разных параметрах
+PASSWORD_HASH_METHOD, а также первый вход после смены параметров, когда
+хэш пароля пересчитывается.
+
+Запуск: python -W ignore -m tests.benchmarks.bench_login [--clients 10000] [--logins 10]
+"""
+
+from datetime import datetime
+import argparse
+from sqlalchemy import event, insert
+from werkzeug.security import generate_password_hash
+from app import db
+from app.auth import find_identity
+from app.models import Client, Employee
+from ..conftest import PASSWORD
+from . import bench_app, measure, print_table, quiet
+
+HASH_METHODS = ['pbkdf2:sha256:600000', 'pbkdf2:sha256:260000', 'pbkdf2:sha256:100000']
+BATCH_SIZE = 5000
+
+
+def two_query_lookup(email):
+    """Прежний поиск учетной записи: сотрудник, а при промахе клиент."""
+    user = Employee.query.filter_by(email=email).first()
+    if not user:
+        user = Client.query.filter_by(email=email).first()
+    return user
+
+
+def fill_clients(count, password_hash):
+    """
+    Добавляет count клиентов с одинаковым хэшем пароля.
+
+    Вызывается внутри контекста приложения.
+    """
+    for first in range(0, count, BATCH_SIZE):
+        db.session.execute(insert(Client), [
+            {'name': f'Клиент {number}', 'first_name': 'Имя', 'last_name': 'Фамилия',
+             'email': f'client{number}@example.com', 'phone': f'+7{number:010d}',
+             'password': password_hash, 'created_at': datetime(2030, 1, 1)}
+            for number in range(first, min(first + BATCH_SIZE, count))
+        ])
+    db.session.commit()
+
+
+def count_statements(function):
+    """Возвращает число SQL-запросов, выполненных функцией."""
+    statements = []
+    listener = lambda *args: statements.append(1)
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        function()
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', listener)
+    return len(statements)
+
+
+def set_password_hash(email, method):
+    """Сохраняет хэш пароля клиента, созданный с параметрами method."""
+    db.session.query(Client).filter(Client.email == email).update(
+        {'password': generate_password_hash(PASSWORD, method=method)}
+    )
+    db.session.commit()
+
+
+def run(clients, logins=10, hash_methods=HASH_METHODS):
+    """
+    Выполняет замеры.
+
+    :param clients: Число клиентов в базе (int).
+    :param logins: Число входов в одном замере (int).
+    :param hash_methods: Параметры хэширования паролей.
+    :return: Кортеж (строки поиска: способ, мкс, запросов; строки входа: параметры, входов/с).
+    """
+    email = f'client{clients - 1}@example.com'
+    with bench_app() as app:
+        with app.app_context():
+            fill_clients(clients, generate_password_hash(PASSWORD, method=hash_methods[-1]))
+            lookups = [
+                ('два запроса', measure(lambda: two_query_lookup(email), number=200) * 1000,
+                 count_statements(lambda: two_query_lookup(email))),
+                ('find_identity', measure(lambda: find_identity(email), number=200) * 1000,
+                 count_statements(lambda: find_identity(email))),
+            ]
+        client = app.test_client()
+
+        def login():
+            response = client.post('/login', data={'email': email, 'password': PASSWORD})
+            assert response.status_code == 302
+
+        throughput = []
+        for method in hash_methods:
+            app.config['PASSWORD_HASH_METHOD'] = method
+            with app.app_context():
+                set_password_hash(email, method)
+            throughput.append((method, 1000 / measure(login, repeat=3, number=logins)))
+        with app.app_context():
+            set_password_hash(email, hash_methods[0])
+        throughput.append((f'{hash_methods[0]} -> {hash_methods[-1]}, первый вход', 1000 / measure(login, repeat=1)))
+        return lookups, throughput
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--clients', type=int, default=10000)
+    parser.add_argument('--logins', type=int, default=10)
+    args = parser.parse_args(argv)
+    quiet()
+    lookups, throughput = run(args.clients, args.logins)
+    print_table(f'Поиск учетной записи клиента среди {args.clients}', ['способ', 'мкс', 'запросов'], lookups)
+    print_table('POST /login клиента, одно ядро', ['PASSWORD_HASH_METHOD', 'входов/с'], throughput)
+
+
+if __name__ == '__main__':
+    main()
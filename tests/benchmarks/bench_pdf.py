@@ -0,0 +1,135 @@
+"""
+Замер формирования PDF заказ-наряда.
+
+Этот файл сравнивает прежнюю отрисовку (регистрация TTF-шрифта и чтение
+логотипа при каждом документе, шапка рисуется заново, изображения в ASCII85)
+с render_order_pdf, которая использует загруженные один раз ресурсы и шапку
+в form XObject, и печатает число документов в секунду.
+
+По умолчанию берется шрифт из PDF_FONT_PATH, а если файла нет - Vera.ttf
+из поставки ReportLab (в нем нет кириллицы, но стоимость разбора шрифта та
+же); логотип - app/static/logo.jpg.
+
+Запуск: python -W ignore -m tests.benchmarks.bench_pdf [--documents 200] [--font PATH] [--logo PATH]
+"""
+
+from contextlib import contextmanager
+from io import BytesIO
+import argparse
+import os
+import reportlab
+from reportlab import rl_config
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.units import inch
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+from app.pdf import render_order_pdf, resources
+from config import Config
+from . import measure, print_table, quiet
+
+LOGO_PATH = os.path.join(os.path.dirname(Config.PDF_LOGO_PATH), 'logo.jpg')
+SHEET = {
+    'id': 1,
+    'client_name': 'Иванов Иван',
+    'client_phone': '+7 900 000-00-00',
+    'car': 'Skoda Octavia',
+    'car_year': 2015,
+    'license_plate': 'A001AA77',
+    'vin': 'TMBAAAAAAAA000001',
+    'appointment': '02.01.2030 10:00:00',
+    'services': [('Замена масла', 1000), ('Шиномонтаж', 500)],
+}
+
+
+def default_font():
+    """Возвращает путь к шрифту из конфигурации или к Vera.ttf из ReportLab."""
+    if os.path.exists(Config.PDF_FONT_PATH):
+        return Config.PDF_FONT_PATH
+    return os.path.join(os.path.dirname(reportlab.__file__), 'fonts', 'Vera.ttf')
+
+
+@contextmanager
+def ascii85_images():
+    """Включает на время прежнее кодирование изображений ASCII85."""
+    use_a85 = rl_config.useA85
+    rl_config.useA85 = 1
+    try:
+        yield
+    finally:
+        rl_config.useA85 = use_a85
+
+
+def baseline_order_pdf(sheet, font_path, logo_path):
+    """Прежняя отрисовка заказ-наряда: шрифт и логотип загружаются для каждого документа."""
+    pdfmetrics.registerFont(TTFont('BaselineFont', font_path))
+    buffer = BytesIO()
+    pdf = canvas.Canvas(buffer, pagesize=letter)
+    pdf.setFont('BaselineFont', 14)
+    if os.path.exists(logo_path):
+        pdf.drawImage(logo_path, 1 * inch, 10.5 * inch, width=1.5 * inch, height=0.75 * inch)
+    pdf.drawString(2.5 * inch, 10.75 * inch, "Автосервис SkodaExpert")
+    pdf.setFont('BaselineFont', 12)
+    lines = [
+        f"Номер заказ-наряда: {sheet['id']}",
+        f"Имя заказчика: {sheet['client_name']}",
+        f"Телефон: {sheet['client_phone']}",
+        f"Марка и модель авто: {sheet['car']}",
+        f"Год выпуска: {sheet['car_year']}",
+        f"Гос номер: {sheet['license_plate']}",
+        f"VIN код: {sheet['vin']}",
+        f"Время записи: {sheet['appointment']}",
+        "Выбранные услуги:",
+    ]
+    for number, line in enumerate(lines):
+        pdf.drawString(1 * inch, (9.5 - number * 0.5) * inch, line)
+    y_position = 5 * inch
+    total_price = 0
+    for service_name, price in sheet['services']:
+        pdf.drawString(1.5 * inch, y_position, f"- {service_name}: {price} руб.")
+        total_price += price
+        y_position -= 0.25 * inch
+    pdf.drawString(1 * inch, y_position - 0.5 * inch, f"Итоговая стоимость: {total_price} руб.")
+    pdf.save()
+    return buffer.getvalue()
+
+
+def run(documents, font_path=None, logo_path=LOGO_PATH):
+    """
+    Выполняет замер.
+
+    :param documents: Число документов в одном замере (int).
+    :param font_path: Путь к TTF-шрифту или None для шрифта по умолчанию.
+    :param logo_path: Путь к логотипу.
+    :return: Список из одной строки (документов/с до, документов/с после, размер PDF до и после в байтах).
+    """
+    font_path = font_path or default_font()
+    loaded = resources.font_name, resources.logo, resources.loaded
+    resources.loaded = False
+    resources.load(font_path, logo_path)
+    try:
+        with ascii85_images():
+            before = measure(lambda: baseline_order_pdf(SHEET, font_path, logo_path), repeat=3, number=documents)
+            before_size = len(baseline_order_pdf(SHEET, font_path, logo_path))
+        after = measure(lambda: render_order_pdf(SHEET), repeat=3, number=documents)
+        return [(1000 / before, 1000 / after, before_size, len(render_order_pdf(SHEET)))]
+    finally:
+        resources.font_name, resources.logo, resources.loaded = loaded
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--documents', type=int, default=200)
+    parser.add_argument('--font')
+    parser.add_argument('--logo', default=LOGO_PATH)
+    args = parser.parse_args(argv)
+    quiet()
+    print_table(
+        'Заказ-наряд PDF',
+        ['PDF/с до', 'PDF/с после', 'байт до', 'байт после'],
+        run(args.documents, args.font, args.logo),
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+"""
+Замер отчета менеджера.
+
+Этот файл сравнивает прежний отчет (четыре запроса по таблице orders с
+датами-строками в COALESCE) с generate_manager_report, которая читает
+дневную сводку daily_stats, при 10 000, 100 000 и 1 000 000 заказов за год.
+Отчет строится за последние 30 дней и за всю историю.
+
+Запуск: python -W ignore -m tests.benchmarks.bench_report [--orders 10000 100000 1000000]
+"""
+
+from datetime import datetime, time, timedelta
+import argparse
+from sqlalchemy import event, insert, text
+from app import db
+from app.models import Car, Client, Order, OrderService
+from app.rollups import rebuild_daily_stats
+from app.utils import generate_manager_report
+from . import bench_app, measure, print_table, quiet
+
+LAST_DAY = datetime(2030, 12, 31)
+BATCH_SIZE = 10000
+
+BASELINE_QUERIES = [
+    """
+    SELECT COUNT(o.id) AS total_orders FROM orders o
+    WHERE o.created_at >= COALESCE(:start_date, '1900-01-01') AND o.created_at <= COALESCE(:end_date, '9999-12-31')
+    """,
+    """
+    SELECT cm.brand, cm.model_name, COUNT(o.id) AS order_count
+    FROM car_models cm JOIN cars c ON cm.id = c.car_model_id JOIN orders o ON c.id = o.car_id
+    WHERE o.created_at >= COALESCE(:start_date, '1900-01-01') AND o.created_at <= COALESCE(:end_date, '9999-12-31')
+    GROUP BY cm.brand, cm.model_name
+    """,
+    """
+    SELECT CAST(COALESCE(SUM(s.price), 0) AS NUMERIC(10, 2)) AS total_revenue
+    FROM services s JOIN order_services os ON s.id = os.service_id JOIN orders o ON os.order_id = o.id
+    WHERE o.created_at >= COALESCE(:start_date, '1900-01-01') AND o.created_at <= COALESCE(:end_date, '9999-12-31')
+    """,
+    """
+    SELECT s.service_name, CAST(COALESCE(SUM(s.price), 0) AS NUMERIC(10, 2)) AS revenue
+    FROM services s JOIN order_services os ON s.id = os.service_id JOIN orders o ON os.order_id = o.id
+    WHERE o.created_at >= COALESCE(:start_date, '1900-01-01') AND o.created_at <= COALESCE(:end_date, '9999-12-31')
+    GROUP BY s.service_name
+    """,
+]
+
+
+def baseline_report(start_date=None, end_date=None):
+    """Прежний отчет: четыре запроса по заказам за период."""
+    params = {
+        'start_date': start_date.strftime('%Y-%m-%d') if start_date else '1900-01-01',
+        'end_date': end_date.strftime('%Y-%m-%d') if end_date else '9999-12-31',
+    }
+    return [db.session.execute(text(query), params).all() for query in BASELINE_QUERIES]
+
+
+def fill_orders(count):
+    """
+    Добавляет count заказов с одной услугой, равномерно распределенных по году, и пересчитывает сводку.
+
+    Вызывается внутри контекста приложения.
+    """
+    client = Client.query.filter_by(email='client@example.com').one()
+    car = Car.query.filter_by(client_id=client.id).first()
+    for first in range(0, count, BATCH_SIZE):
+        numbers = range(first, min(first + BATCH_SIZE, count))
+        created = [LAST_DAY - timedelta(minutes=number * 365 * 24 * 60 // count) for number in numbers]
+        ids = db.session.execute(
+            insert(Order).returning(Order.id),
+            [{'client_id': client.id, 'car_id': car.id, 'car_brand': 'Skoda', 'car_model': 'Octavia',
+              'car_model_id': 1, 'created_at': created_at, 'appointment_date': created_at.date(),
+              'appointment_time': time(10, 0), 'end_time': time(11, 0)} for created_at in created]
+        ).scalars().all()
+        db.session.execute(insert(OrderService), [
+            {'order_id': order_id, 'service_id': 1 + order_id % 2, 'price': 1000 if order_id % 2 == 0 else 500}
+            for order_id in ids
+        ])
+        db.session.commit()
+    rebuild_daily_stats()
+
+
+def count_statements(function):
+    """Возвращает число SQL-запросов, выполненных функцией."""
+    statements = []
+    listener = lambda *args: statements.append(1)
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        function()
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', listener)
+    return len(statements)
+
+
+def run(order_counts, repeat=3):
+    """
+    Выполняет замеры.
+
+    :param order_counts: Числа заказов.
+    :param repeat: Число повторов каждого замера (int).
+    :return: Список строк (заказов, период, прежний отчет мс, новый отчет мс, запросов до, запросов после).
+    """
+    rows = []
+    for count in order_counts:
+        with bench_app() as app, app.app_context():
+            fill_orders(count)
+            generate_manager_report()
+            for period, start_date in (('30 дней', (LAST_DAY - timedelta(days=30)).date()), ('вся история', None)):
+                before = measure(lambda: baseline_report(start_date, LAST_DAY.date()), repeat)
+                after = measure(lambda: generate_manager_report(start_date, LAST_DAY.date()), repeat)
+                rows.append((
+                    count, period, before, after,
+                    count_statements(lambda: baseline_report(start_date, LAST_DAY.date())),
+                    count_statements(lambda: generate_manager_report(start_date, LAST_DAY.date())),
+                ))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--orders', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(argv)
+    quiet()
+    print_table(
+        'Отчет менеджера, лучшее время из повторов, мс',
+        ['заказов', 'период', 'до', 'после', 'запросов до', 'запросов после'],
+        run(args.orders, args.repeat),
+    )
+
+
+if __name__ == '__main__':
+    main()
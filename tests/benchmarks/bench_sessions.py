@@ -0,0 +1,106 @@
+"""
+Замер проверки пользователя на каждом запросе.
+
+Этот файл сравнивает прежний способ (данные сессии, в том числе список
+выбранных услуг, в подписанной cookie, а пользователь загружается из базы
+на каждый запрос) с role_required, которая берет профиль из кэша, при
+стандартной cookie Flask и при серверных сессиях SQLite (в cookie только
+идентификатор). Замеряется запрос к пустому маршруту, поэтому время ответа
+почти целиком состоит из чтения сессии и проверки пользователя.
+
+Запуск: python -W ignore -m tests.benchmarks.bench_sessions [--services 20]
+"""
+
+import argparse
+import os
+import shutil
+import tempfile
+from flask import session
+from sqlalchemy import event
+from app import db
+from app.auth import role_required
+from app.models import Client
+from ..conftest import PASSWORD
+from . import bench_app, measure, print_table, quiet
+
+
+def query_each_request():
+    """Прежняя проверка: роль из cookie и пользователь из базы."""
+    if session.get('role') != 'client' or db.session.get(Client, session['user_id']) is None:
+        return '', 403
+    return ''
+
+
+@role_required('client')
+def cached_profile():
+    """Проверка через role_required и кэш профиля."""
+    return ''
+
+
+def session_cookie(app, client):
+    """Возвращает значение cookie сессии тестового клиента."""
+    name = app.config['SESSION_COOKIE_NAME']
+    return next(cookie.value for cookie in client.cookie_jar if cookie.name == name)
+
+
+def measure_auth(backend, view, services, number):
+    """
+    Замеряет запрос к маршруту с проверкой пользователя.
+
+    :return: Кортеж (мкс на запрос, запросов к базе, байт в cookie сессии).
+    """
+    directory = tempfile.mkdtemp(prefix='bench-sessions-')
+    try:
+        with bench_app(SESSION_BACKEND=backend, SESSION_DB_PATH=os.path.join(directory, 'sessions.db')) as app:
+            app.add_url_rule('/bench_auth', 'bench_auth', view)
+            client = app.test_client()
+            assert client.post('/login', data={'email': 'client@example.com', 'password': PASSWORD}).status_code == 302
+            with client.session_transaction() as current:
+                current['selected_services'] = [str(service_id) for service_id in range(1, services + 1)]
+
+            def request():
+                assert client.get('/bench_auth').status_code == 200
+
+            request()
+            statements = []
+            with app.app_context():
+                engine = db.engine
+            listener = lambda *args: statements.append(1)
+            event.listen(engine, 'before_cursor_execute', listener)
+            request()
+            event.remove(engine, 'before_cursor_execute', listener)
+            return measure(request, number=number) * 1000, len(statements), len(session_cookie(app, client))
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def run(services=20, number=500):
+    """
+    Выполняет замеры.
+
+    :param services: Сколько услуг лежит в сессии (int).
+    :param number: Число запросов в одном замере (int).
+    :return: Список строк (способ, мкс на запрос, запросов к базе, байт в cookie).
+    """
+    return [
+        ('cookie, пользователь из базы', *measure_auth('cookie', query_each_request, services, number)),
+        ('cookie, role_required', *measure_auth('cookie', cached_profile, services, number)),
+        ('sqlite, role_required', *measure_auth('sqlite', cached_profile, services, number)),
+    ]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--services', type=int, default=20)
+    parser.add_argument('--number', type=int, default=500)
+    args = parser.parse_args(argv)
+    quiet()
+    print_table(
+        f'Запрос с проверкой клиента, {args.services} услуг в сессии',
+        ['способ', 'мкс', 'запросов к базе', 'байт в cookie'],
+        run(args.services, args.number),
+    )
+
+
+if __name__ == '__main__':
+    main()
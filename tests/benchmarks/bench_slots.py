@@ -0,0 +1,108 @@
+"""
+Замер расчета свободных слотов дня.
+
+Этот файл сравнивает прежний расчет (для каждого слота перебор всех заказов
+дня) с поминутной шкалой занятости из app.slots при 10, 100 и 1000 заказах
+на день, а также время ответа /get_available_slots без кэша слотов. Прежний
+расчет прекращает перебор на первом пересечении, поэтому замеряются два
+случая: случайные короткие заказы за сутки и худший для перебора случай,
+когда ни один заказ не пересекает слоты и каждый слот проверяет все заказы.
+
+Запуск: python -W ignore -m tests.benchmarks.bench_slots [--orders 10 100 1000]
+"""
+
+from datetime import datetime, time, timedelta
+import argparse
+import random
+from app.availability import slot_memo
+from app.slots import DaySchedule, compute_free_slots
+from . import add_orders, bench_app, measure, print_table, quiet
+
+DURATION = 90
+
+
+def nested_loop_slots(day, intervals, duration):
+    """Прежний расчет слотов: O(слоты × заказы)."""
+    current_time = datetime.combine(day, time(9, 0))
+    available_slots = []
+    while current_time.time() < time(17, 0):
+        slot_end_time = current_time + timedelta(minutes=duration)
+        is_available = True
+        for start, end in intervals:
+            if end is None:
+                continue
+            if not (slot_end_time <= datetime.combine(day, start) or current_time >= datetime.combine(day, end)):
+                is_available = False
+                break
+        available_slots.append((current_time.strftime('%H:%M'), is_available))
+        current_time += timedelta(minutes=30)
+    return available_slots
+
+
+def sweep_slots(intervals, duration):
+    """Расчет слотов по поминутной шкале занятости."""
+    return compute_free_slots(DaySchedule(intervals, horizon=duration), duration)
+
+
+def random_intervals(count, seed=1):
+    """Возвращает count коротких интервалов в случайное время суток."""
+    generator = random.Random(seed)
+    intervals = []
+    for _ in range(count):
+        start = generator.randrange(0, 23 * 60)
+        end = start + generator.choice((5, 10, 15))
+        intervals.append((time(start // 60, start % 60), time(min(end // 60, 23), end % 60)))
+    return intervals
+
+
+def evening_intervals(count):
+    """Возвращает count интервалов после окончания рабочего дня с учетом длительности услуги."""
+    return [(time(19, minute % 60), time(20, minute % 60)) for minute in range(count)]
+
+
+def run(order_counts, repeat=5):
+    """
+    Выполняет замеры.
+
+    :param order_counts: Числа заказов на день.
+    :param repeat: Число повторов каждого замера (int).
+    :return: Список строк (заказов, перебор и шкала на случайных заказах, перебор и шкала
+        в худшем случае, ответ /get_available_slots) со временем в мс.
+    """
+    day = datetime(2030, 1, 2).date()
+    rows = []
+    for count in order_counts:
+        timings = []
+        for intervals in (random_intervals(count), evening_intervals(count)):
+            timings.append(measure(lambda: nested_loop_slots(day, intervals, DURATION), repeat))
+            timings.append(measure(lambda: sweep_slots(intervals, DURATION), repeat))
+        with bench_app() as app:
+            with app.app_context():
+                day_with_orders = add_orders(count)
+            client = app.test_client()
+            url = f'/get_available_slots?date={day_with_orders.isoformat()}&services=1,2'
+
+            def request_slots():
+                slot_memo._entries.clear()
+                assert client.get(url).status_code == 200
+
+            endpoint = measure(request_slots, repeat)
+        rows.append((count, *timings, endpoint))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--orders', type=int, nargs='+', default=[10, 100, 1000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args(argv)
+    quiet()
+    print_table(
+        'Расчет слотов дня, лучшее время из повторов, мс',
+        ['заказов', 'перебор', 'шкала', 'перебор (худший)', 'шкала (худший)', '/get_available_slots'],
+        run(args.orders, args.repeat),
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,190 @@
+"""
+Нагрузочный замер числа рабочих процессов gunicorn.
+
+Этот файл запускает приложение под gunicorn с gunicorn.conf.py при разном
+числе рабочих процессов (и, для сравнения, прежним способом: сервер
+разработки Werkzeug с debug=True в одном процессе), нагружает его
+параллельными клиентами с keep-alive и печатает число запросов в секунду.
+Приложение работает с конфигурацией 'testing' поверх временной базы SQLite.
+Рост с числом процессов ограничен числом ядер машины, на которой идет замер.
+
+Запуск: python -W ignore -m tests.benchmarks.bench_workers [--workers 1 2 4] [--clients 16] [--seconds 5]
+"""
+
+from multiprocessing import Pool
+import argparse
+import http.client
+import os
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time as clock
+from app import create_app
+from . import add_orders, bench_app, print_table, quiet
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+WSGI_MODULE = '''import sys
+sys.path.insert(0, {repo!r})
+from tests.benchmarks.bench_workers import load_app
+app = load_app({directory!r})
+'''
+
+
+def load_app(directory):
+    """
+    Создает приложение поверх базы замера; вызывается из wsgi.py во временном каталоге.
+
+    :param directory: Каталог замера с файлом bench.db.
+    :return: Приложение Flask.
+    """
+    quiet()
+    return create_app('testing', {
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + os.path.join(directory, 'bench.db'),
+        'PDF_CACHE_DIR': os.path.join(directory, 'pdf_cache'),
+    })
+
+
+def free_port():
+    """Возвращает свободный TCP-порт на 127.0.0.1."""
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        return probe.getsockname()[1]
+
+
+def prepare(directory):
+    """
+    Создает в каталоге заполненную базу замера и wsgi.py, загружающий приложение поверх нее.
+
+    :param directory: Каталог замера.
+    :return: Адрес запроса свободных слотов на день с заказами (str).
+    """
+    with bench_app(SQLALCHEMY_DATABASE_URI='sqlite:///' + os.path.join(directory, 'bench.db')) as app:
+        with app.app_context():
+            day = add_orders(100, days=5)
+    with open(os.path.join(directory, 'wsgi.py'), 'w') as module:
+        module.write(WSGI_MODULE.format(repo=REPO_DIR, directory=directory))
+    return f'/get_available_slots?date={day.isoformat()}&services=1,2'
+
+
+def start_server(directory, port, workers, threads, **environ):
+    """
+    Запускает gunicorn с gunicorn.conf.py или, если workers равно 0, сервер разработки.
+
+    :param environ: Дополнительные переменные окружения сервера.
+    :return: Процесс сервера (subprocess.Popen).
+    """
+    env = dict(os.environ, GUNICORN_BIND=f'127.0.0.1:{port}', GUNICORN_WORKERS=str(workers),
+               GUNICORN_THREADS=str(threads), GUNICORN_MAX_REQUESTS='0', **environ)
+    if workers:
+        command = [sys.executable, '-m', 'gunicorn', '-c', os.path.join(REPO_DIR, 'gunicorn.conf.py'),
+                   '--chdir', directory, 'wsgi:app']
+    else:
+        command = [sys.executable, '-c',
+                   f'import wsgi; wsgi.app.run(host="127.0.0.1", port={port}, debug=True, use_reloader=False)']
+    return subprocess.Popen(command, cwd=directory, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def stop_server(server):
+    """Останавливает сервер без ожидания открытых соединений (SIGINT)."""
+    server.send_signal(signal.SIGINT)
+    server.wait(timeout=30)
+
+
+def wait_ready(port, path, timeout=30):
+    """Ждет, пока сервер не начнет отвечать."""
+    deadline = clock.monotonic() + timeout
+    while clock.monotonic() < deadline:
+        try:
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+            connection.request('GET', path)
+            connection.getresponse().read()
+            connection.close()
+            return
+        except OSError:
+            clock.sleep(0.2)
+    raise RuntimeError(f'Сервер на порту {port} не запустился за {timeout} с')
+
+
+def hammer(port, path, seconds):
+    """
+    Отправляет запросы по одному соединению keep-alive в течение seconds секунд.
+
+    :return: Число успешных ответов (int).
+    """
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    deadline = clock.monotonic() + seconds
+    done = 0
+    while clock.monotonic() < deadline:
+        connection.request('GET', path)
+        response = connection.getresponse()
+        response.read()
+        if response.status < 500:
+            done += 1
+        if response.will_close:
+            connection.close()
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    connection.close()
+    return done
+
+
+def measure_server(directory, workers, threads, clients, seconds, path):
+    """
+    Замеряет число запросов в секунду к серверу.
+
+    :return: Запросов в секунду (float).
+    """
+    port = free_port()
+    server = start_server(directory, port, workers, threads)
+    try:
+        wait_ready(port, path)
+        with Pool(clients) as pool:
+            done = pool.starmap(hammer, [(port, path, seconds)] * clients)
+        return sum(done) / seconds
+    finally:
+        stop_server(server)
+
+
+def run(worker_counts, clients=16, seconds=5, threads=4, dev_server=True):
+    """
+    Выполняет замеры.
+
+    :param worker_counts: Числа рабочих процессов gunicorn.
+    :param clients: Число параллельных клиентов (int).
+    :param seconds: Длительность замера для одного сервера (float).
+    :param threads: Число потоков рабочего процесса (int).
+    :param dev_server: Замерить ли также сервер разработки (bool).
+    :return: Список строк (сервер, процессов, запросов в секунду).
+    """
+    directory = tempfile.mkdtemp(prefix='bench-workers-')
+    try:
+        path = prepare(directory)
+        rows = []
+        if dev_server:
+            rows.append(('werkzeug debug', 1, measure_server(directory, 0, threads, clients, seconds, path)))
+        for workers in worker_counts:
+            rows.append(('gunicorn', workers, measure_server(directory, workers, threads, clients, seconds, path)))
+        return rows
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--threads', type=int, default=4)
+    args = parser.parse_args(argv)
+    quiet()
+    print_table(
+        f'GET /get_available_slots, {args.clients} клиентов, ядер: {os.cpu_count()}',
+        ['сервер', 'процессов', 'запросов/с'],
+        run(args.workers, args.clients, args.seconds, args.threads),
+    )
+
+
+if __name__ == '__main__':
+    main()
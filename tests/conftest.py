@@ -0,0 +1,113 @@
+"""
+Общие фикстуры тестов.
+
+Этот файл содержит приложение с конфигурацией 'testing' поверх временной
+базы SQLite, заполненной минимальным набором данных, вход пользователей
+через тестовый клиент и счетчик SQL-запросов.
+"""
+
+from datetime import date, time, timedelta
+from contextlib import contextmanager
+import pytest
+from sqlalchemy import event
+from werkzeug.security import generate_password_hash
+from app import create_app, db
+from app.catalog import car_models_cache, services_cache
+from app.models import Car, CarModel, Client, Employee, Order, OrderService, Service, Task
+
+PASSWORD = 'secret'
+
+
+def next_workday(days=3):
+    """
+    Возвращает рабочий день (не воскресенье) не раньше чем через days дней.
+
+    :param days: Минимальное число дней от сегодняшней даты (int).
+    :return: Дата (datetime.date).
+    """
+    day = date.today() + timedelta(days=days)
+    return day + timedelta(days=1) if day.weekday() == 6 else day
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = create_app('testing', {
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + str(tmp_path / 'test.db'),
+        'PDF_CACHE_DIR': str(tmp_path / 'pdf_cache'),
+    })
+    services_cache.invalidate()
+    car_models_cache.invalidate()
+    with app.app_context():
+        db.create_all()
+        seed()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+
+def seed():
+    """Добавляет менеджера, двух механиков, клиента, модель, две услуги и один заказ."""
+    password = generate_password_hash(PASSWORD)
+    db.session.add_all([
+        Employee(name='Менеджер', email='manager@example.com', phone='100', password=password, role='manager'),
+        Employee(name='Механик 1', email='mechanic1@example.com', phone='101', password=password, role='mechanic'),
+        Employee(name='Механик 2', email='mechanic2@example.com', phone='102', password=password, role='mechanic'),
+        Client(name='Клиент', first_name='Иван', last_name='Иванов', email='client@example.com',
+               phone='200', password=password),
+        CarModel(brand='Skoda', model_name='Octavia'),
+        Service(service_name='Замена масла', price=1000, duration=60),
+        Service(service_name='Шиномонтаж', price=500, duration=30),
+    ])
+    db.session.commit()
+    client = Client.query.filter_by(email='client@example.com').one()
+    mechanic = Employee.query.filter_by(email='mechanic1@example.com').one()
+    car = Car(client_id=client.id, car_model_id=1, car_year=2015, vin='TMBAAAAAAAA000001', license_plate='A001AA')
+    db.session.add(car)
+    db.session.flush()
+    add_order(client.id, car.id, mechanic.id, next_workday(), time(10, 0), time(11, 0))
+    db.session.commit()
+
+
+def add_order(client_id, car_id, employee_id, appointment_date, start_time, end_time, service_id=1):
+    """
+    Добавляет заказ с одной услугой и задачей механика в текущую транзакцию.
+
+    :return: Новый заказ.
+    """
+    order = Order(client_id=client_id, car_id=car_id, car_brand='Skoda', car_model='Octavia',
+                  appointment_date=appointment_date, appointment_time=start_time, end_time=end_time)
+    db.session.add(order)
+    db.session.flush()
+    db.session.execute(OrderService.__table__.insert().values(order_id=order.id, service_id=service_id))
+    db.session.add(Task(employee_id=employee_id, order_id=order.id, status='pending'))
+    return order
+
+
+@pytest.fixture
+def login(app):
+    def login(email):
+        client = app.test_client()
+        response = client.post('/login', data={'email': email, 'password': PASSWORD})
+        assert response.status_code == 302
+        return client
+    return login
+
+
+@pytest.fixture
+def count_queries(app):
+    @contextmanager
+    def count_queries():
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        with app.app_context():
+            engine = db.engine
+        event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+        try:
+            yield statements
+        finally:
+            event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+    return count_queries
@@ -0,0 +1,60 @@
+"""
+Тесты проверки доступа.
+
+Этот файл проверяет, что доступ к маршрутам зависит от учетной записи в
+базе, а не только от роли, сохраненной в сессии: изменение или удаление
+пользователя сбрасывает его кэшированный профиль во всех процессах, а
+пока профиль не сброшен, проверка роли не обращается к базе.
+"""
+
+from werkzeug.security import generate_password_hash
+from app import db
+from app.auth import user_cache
+from app.models import Client, Employee
+from app.versions import SqliteVersions
+from .conftest import PASSWORD
+
+
+def test_demoted_employee_loses_access(app, login):
+    client = login('manager@example.com')
+    assert client.get('/manager_dashboard').status_code == 200
+    with app.app_context():
+        manager = Employee.query.filter_by(email='manager@example.com').one()
+        manager.role = 'mechanic'
+        db.session.commit()
+        user_cache.invalidate('manager', manager.id)
+    response = client.get('/manager_dashboard')
+    assert response.status_code == 302
+    assert client.get('/mechanic_dashboard').status_code == 302
+
+
+def test_deleted_client_loses_access(app, login):
+    with app.app_context():
+        db.session.add(Client(name='Петров Петр', first_name='Петр', last_name='Петров', email='new@example.com',
+                              phone='201', password=generate_password_hash(PASSWORD)))
+        db.session.commit()
+    client = login('new@example.com')
+    assert client.get('/order_history').status_code == 200
+    with app.app_context():
+        client_id = Client.query.filter_by(email='new@example.com').one().id
+        Client.query.filter_by(email='new@example.com').delete()
+        db.session.commit()
+        user_cache.invalidate('client', client_id)
+    assert client.get('/order_history').status_code == 302
+
+
+def test_cached_profile_skips_user_queries(login, count_queries):
+    client = login('client@example.com')
+    assert client.get('/order_history').status_code == 200
+    with count_queries() as statements:
+        assert client.get('/order_history').status_code == 200
+    assert not [statement for statement in statements if 'WHERE clients.id = ?' in statement], statements
+
+
+def test_versions_are_shared_between_processes(tmp_path):
+    first, second = SqliteVersions(str(tmp_path / 'versions.db')), SqliteVersions(str(tmp_path / 'versions.db'))
+    assert second.get('user:client:1') == 0
+    first.bump('user:client:1')
+    assert second.get('user:client:1') == 1
+    second.bump('user:client:1')
+    assert first.get('user:client:1') == 2
@@ -0,0 +1,74 @@
+"""
+Тесты ETag свободных слотов.
+
+Этот файл проверяет, что ETag ответа со свободными слотами меняется не
+только при записи на день, но и при изменении состава механиков, что
+некорректный запрос удержания слота и календарь с некорректной датой
+отклоняются с кодом 400, и что
+удержания в SQLite видны всем рабочим процессам.
+"""
+
+from datetime import time
+import time as clock
+import pytest
+from app import db
+from app.models import Employee
+from app.slots import SqliteHoldStore
+from .conftest import next_workday
+
+
+def test_etag_changes_when_mechanic_leaves(app, login):
+    client = login('client@example.com')
+    url = f'/get_available_slots?date={next_workday()}&services=1'
+    response = client.get(url)
+    etag = response.headers['ETag']
+    assert dict(response.get_json())['10:00'] is True
+    assert client.get(url, headers={'If-None-Match': etag}).status_code == 304
+
+    with app.app_context():
+        Employee.query.filter_by(email='mechanic2@example.com').update({'role': 'manager'})
+        db.session.commit()
+
+    response = client.get(url, headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+    assert dict(response.get_json())['10:00'] is False
+
+
+@pytest.mark.parametrize('kwargs', [
+    {},
+    {'data': 'not json', 'content_type': 'application/json'},
+    {'json': ['2030-01-02', '10:00']},
+    {'json': {'time': '10:00'}},
+    {'json': {'date': '02.01.2030', 'time': '10:00'}},
+    {'json': {'date': '2030-01-02'}},
+    {'json': {'date': '2030-01-02', 'time': 1000}},
+])
+def test_malformed_hold_request_is_rejected(login, kwargs):
+    response = login('client@example.com').post('/hold_slot', **kwargs)
+    assert response.status_code == 400
+    assert response.get_json()['held'] is False
+
+
+@pytest.mark.parametrize('query', ['start=2030-13-01', 'start=2030-01-01&end=tomorrow'])
+def test_calendar_rejects_invalid_date(app, query):
+    response = app.test_client().get(f'/availability_calendar?{query}&services=1')
+    assert response.status_code == 400
+    assert response.get_json() == {'error': "Некорректная дата"}
+
+
+def test_hold_slot(login):
+    client = login('client@example.com')
+    response = client.post('/hold_slot', json={'date': next_workday().isoformat(), 'time': '12:00', 'services': [1]})
+    assert response.get_json() == {'held': True}
+
+
+def test_holds_are_shared_between_processes(tmp_path):
+    first, second = SqliteHoldStore(str(tmp_path / 'holds.db')), SqliteHoldStore(str(tmp_path / 'holds.db'))
+    day, now = next_workday(), clock.time()
+    first.hold('1', day, time(10, 0), time(11, 0), now + 60)
+    first.hold('2', day, time(12, 0), time(13, 0), now - 1)
+    assert second.intervals(day, None, now) == [(time(10, 0), time(11, 0))]
+    assert second.intervals(day, '1', now) == []
+    second.release('1')
+    assert first.intervals(day, None, now) == []
@@ -0,0 +1,67 @@
+"""
+Тесты сценариев замеров.
+
+Этот файл прогоняет сценарии из tests/benchmarks на малых размерах, чтобы
+они не ломались вместе с кодом, и проверяет, что сравниваемые в них варианты
+дают одинаковый результат, а новые варианты делают меньше обращений к базе.
+"""
+
+from datetime import date
+from .benchmarks import bench_booking, bench_calendar, bench_events, bench_logging, bench_login, bench_pdf, bench_report, bench_sessions, bench_slots, bench_workers
+
+
+def test_bench_slots_matches_nested_loop():
+    day = date(2030, 1, 2)
+    for seed in range(20):
+        intervals = bench_slots.random_intervals(30, seed)
+        for duration in (30, 90):
+            assert bench_slots.sweep_slots(intervals, duration) == bench_slots.nested_loop_slots(day, intervals, duration)
+    assert len(bench_slots.run([10], repeat=1)) == 1
+
+
+def test_bench_booking_saves_booking_in_one_transaction():
+    (_, _, _, before_commits, after_commits), = bench_booking.run([2], 3)
+    assert (before_commits, after_commits) == (3, 2)
+
+
+def test_bench_report_reads_daily_stats():
+    for _, _, _, _, before_statements, after_statements in bench_report.run([200], repeat=1):
+        assert (before_statements, after_statements) == (4, 2)
+
+
+def test_bench_pdf_embeds_logo_without_ascii85():
+    (_, _, before_size, after_size), = bench_pdf.run(2)
+    assert after_size < before_size
+
+
+def test_bench_workers_serves_under_gunicorn():
+    (server, workers, requests_per_second), = bench_workers.run([2], clients=2, seconds=0.5, dev_server=False)
+    assert (server, workers) == ('gunicorn', 2)
+    assert requests_per_second > 0
+
+
+def test_bench_logging_covers_each_configuration():
+    rows = bench_logging.run(50, number=2)
+    assert [row[0] for row in rows] == [title for title, _, _ in bench_logging.CONFIGURATIONS]
+
+
+def test_bench_login_finds_identity_in_one_query():
+    lookups, throughput = bench_login.run(20, logins=1, hash_methods=['pbkdf2:sha256:2000', 'pbkdf2:sha256:1000'])
+    assert [statements for _, _, statements in lookups] == [2, 1]
+    assert len(throughput) == 3
+
+
+def test_bench_sessions_skips_user_query_and_shrinks_cookie():
+    (_, _, *before), (_, _, *cookie), (_, _, *sqlite) = bench_sessions.run(services=5, number=2)
+    assert [before[0], cookie[0], sqlite[0]] == [1, 0, 0]
+    assert sqlite[1] < cookie[1]
+
+
+def test_bench_calendar_query_count_does_not_grow_with_days():
+    short, long = bench_calendar.run(orders=10, days=3, repeat=1), bench_calendar.run(orders=10, days=9, repeat=1)
+    assert short[2][3] == long[2][3] < short[0][3] < long[0][3]
+
+
+def test_bench_events_holds_streams_open():
+    rows = bench_events.run([3, 0], seconds=0.5, interval=0.2)
+    assert [count for count, _, _ in rows] == [0, 3]
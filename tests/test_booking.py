@@ -0,0 +1,125 @@
+"""
+Тесты оформления записи.
+
+Этот файл содержит нагрузочную проверку параллельной записи на одно время:
+успешных записей не больше, чем механиков, и интервалы задач одного
+механика не пересекаются. Также он проверяет поиск автомобиля клиента
+по VIN и госномеру.
+"""
+
+from collections import defaultdict
+from datetime import time
+from threading import Barrier, Thread
+import pytest
+from werkzeug.security import generate_password_hash
+from app import db
+from app.booking import CarOwnershipError, SlotUnavailableError, create_booking
+from app.catalog import get_car_model, get_services
+from app.models import BookingDay, Car, Client, Employee, Order, Task
+from .conftest import next_workday
+
+THREADS = 12
+
+
+def book_concurrently(app, appointment_date, appointment_time):
+    barrier = Barrier(THREADS)
+    results = [None] * THREADS
+
+    def book(index):
+        with app.app_context():
+            car_model = get_car_model(1)
+            services = get_services([1])
+            barrier.wait()
+            try:
+                order = create_booking(
+                    client_id=1, car_model=car_model, car_year=2020,
+                    vin=f'VIN{index:014d}', license_plate=f'T{index:03d}TT',
+                    appointment_date=appointment_date, appointment_time=appointment_time,
+                    services=services
+                )
+                results[index] = order.id
+            except Exception as e:
+                results[index] = e
+
+    threads = [Thread(target=book, args=(index,)) for index in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_concurrent_bookings_never_overlap(app):
+    appointment_date = next_workday(5)
+    results = book_concurrently(app, appointment_date, '14:00')
+
+    booked = [result for result in results if isinstance(result, int)]
+    errors = [result for result in results if not isinstance(result, int)]
+    with app.app_context():
+        mechanics = Employee.query.filter_by(role='mechanic').count()
+        assert len(booked) == mechanics
+        assert all(isinstance(error, SlotUnavailableError) for error in errors), errors
+
+        intervals = defaultdict(list)
+        rows = (
+            db.session.query(Task.employee_id, Order.appointment_time, Order.end_time)
+            .join(Order, Task.order_id == Order.id)
+            .filter(Order.appointment_date == appointment_date)
+            .all()
+        )
+        for employee_id, start, end in rows:
+            intervals[employee_id].append((start, end))
+        for employee_intervals in intervals.values():
+            employee_intervals.sort()
+            for (_, previous_end), (next_start, _) in zip(employee_intervals, employee_intervals[1:]):
+                assert previous_end <= next_start
+        assert db.session.get(BookingDay, appointment_date).version == mechanics
+
+
+def test_booking_rejected_when_mechanics_busy(app):
+    appointment_date = next_workday()
+    with app.app_context():
+        car_model = get_car_model(1)
+        services = get_services([1])
+        create_booking(1, car_model, 2020, 'VIN00000000000100', 'B100BB', appointment_date, '10:00', services)
+        try:
+            create_booking(1, car_model, 2020, 'VIN00000000000101', 'B101BB', appointment_date, '10:30', services)
+        except SlotUnavailableError:
+            pass
+        else:
+            raise AssertionError("Третья запись на занятое время должна быть отклонена")
+        assert Order.query.filter_by(appointment_date=appointment_date).count() == 2
+        assert Order.query.filter(Order.appointment_time == time(10, 30)).count() == 0
+
+
+def test_new_vin_with_own_plate_updates_the_car(app):
+    with app.app_context():
+        car_model, services = get_car_model(1), get_services([1])
+        order = create_booking(1, car_model, 2021, 'TMBAAAAAAAA000099', 'A001AA', next_workday(), '12:00', services)
+        assert Car.query.count() == 1
+        car = Car.query.one()
+        assert (order.car_id, car.vin, car.car_year) == (car.id, 'TMBAAAAAAAA000099', 2021)
+
+
+def test_car_of_another_client_is_rejected(app):
+    with app.app_context():
+        db.session.add(Client(name='Петров Петр', first_name='Петр', last_name='Петров', email='other@example.com',
+                              phone='202', password=generate_password_hash('secret')))
+        db.session.commit()
+        other_id = Client.query.filter_by(email='other@example.com').one().id
+        car_model, services = get_car_model(1), get_services([1])
+        with pytest.raises(CarOwnershipError):
+            create_booking(other_id, car_model, 2020, 'TMBAAAAAAAA000077', 'A001AA', next_workday(), '12:00', services)
+        with pytest.raises(CarOwnershipError):
+            create_booking(other_id, car_model, 2020, 'TMBAAAAAAAA000001', 'X777XX', next_workday(), '12:00', services)
+        assert Car.query.count() == 1
+
+
+def test_vin_and_plate_of_two_own_cars_are_rejected(app):
+    with app.app_context():
+        db.session.add(Car(client_id=1, car_model_id=1, car_year=2018, vin='TMBAAAAAAAA000002', license_plate='B002BB'))
+        db.session.commit()
+        car_model, services = get_car_model(1), get_services([1])
+        with pytest.raises(ValueError, match='B002BB'):
+            create_booking(1, car_model, 2020, 'TMBAAAAAAAA000001', 'B002BB', next_workday(), '12:00', services)
+        assert Order.query.count() == 1
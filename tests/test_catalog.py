@@ -0,0 +1,28 @@
+"""
+Тесты кэша справочников.
+
+Этот файл проверяет, что кэш услуг процесса перечитывается, когда
+справочник изменил другой рабочий процесс (увеличил общую версию), и не
+обращается к базе, пока версия не изменилась.
+"""
+
+from app import db
+from app.catalog import get_services, services_cache
+from app.models import Service
+from app.versions import shared_versions
+
+
+def test_services_reload_after_change_in_another_process(app, count_queries):
+    with app.app_context():
+        assert get_services([1])[0].price == 1000
+        with count_queries() as statements:
+            assert get_services([1])[0].price == 1000
+        assert statements == []
+
+        db.session.query(Service).filter(Service.id == 1).update({'price': 1200, 'duration': 90})
+        db.session.commit()
+        assert get_services([1])[0].price == 1000
+
+        shared_versions.bump(f'catalog:{services_cache.name}')
+        service = get_services([1])[0]
+        assert (service.price, service.duration) == (1200, 90)
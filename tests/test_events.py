@@ -0,0 +1,57 @@
+"""
+Тесты уведомлений в реальном времени.
+
+Этот файл проверяет лимит одновременно открытых потоков /events в процессе
+и доставку событий через SqliteBroker между брокерами разных процессов,
+включая повтор пропущенных событий по Last-Event-ID.
+"""
+
+from types import SimpleNamespace
+from app.events import RESYNC, SLOTS_CHANNEL, SqliteBroker, event_bus
+
+
+def make_broker(path):
+    return SqliteBroker(SimpleNamespace(config={
+        'EVENT_QUEUE_SIZE': 100,
+        'EVENT_DB_PATH': str(path),
+        'EVENT_POLL_SECONDS': 0.05,
+        'EVENT_REPLAY_SECONDS': 300,
+    }))
+
+
+def test_stream_limit_per_process(login, monkeypatch):
+    monkeypatch.setattr(event_bus, 'max_streams', 1)
+    client = login('client@example.com')
+    first = client.get('/events', buffered=False)
+    assert first.status_code == 200
+    second = login('client@example.com').get('/events', buffered=False)
+    assert second.status_code == 503
+    assert second.headers['Retry-After'] == str(event_bus.retry_after)
+    first.close()
+    third = client.get('/events', buffered=False)
+    assert third.status_code == 200
+    third.close()
+
+
+def test_sqlite_broker_delivers_across_processes(tmp_path):
+    publisher, listener = make_broker(tmp_path / 'events.db'), make_broker(tmp_path / 'events.db')
+    try:
+        subscription = listener.subscribe([SLOTS_CHANNEL])
+        publisher.publish(SLOTS_CHANNEL, 'slot_taken', {'date': '2030-01-02', 'start': '10:00'})
+        publisher.publish('other', 'slot_taken', {})
+        event = subscription.get(timeout=2)
+        assert (event.name, event.data['start']) == ('slot_taken', '10:00')
+        assert subscription.get(timeout=0.2) is None
+
+        subscription.close()
+        watcher = listener.subscribe([SLOTS_CHANNEL])
+        publisher.publish(SLOTS_CHANNEL, 'slot_freed', {'date': '2030-01-02', 'start': '10:00'})
+        assert watcher.get(timeout=2).name == 'slot_freed'
+        replayed = listener.subscribe([SLOTS_CHANNEL], last_event_id=event.id)
+        assert replayed.get(timeout=0).name == 'slot_freed'
+
+        publisher._connect().execute('DELETE FROM events')
+        assert listener.subscribe([SLOTS_CHANNEL], last_event_id=event.id - 1).get(timeout=0) is RESYNC
+    finally:
+        publisher.stop()
+        listener.stop()
@@ -0,0 +1,56 @@
+"""
+Тесты выгрузок заказов.
+
+Этот файл проверяет заголовки ответа выгрузки в CSV, экранирование
+текстовых ячеек, которые табличный редактор принял бы за формулу, и
+ограничение периода выгрузки заказ-нарядов.
+"""
+
+from datetime import timedelta
+import csv
+from io import StringIO
+import pytest
+from app import db
+from app.models import Client
+from .conftest import next_workday
+
+
+def read_csv(response):
+    return list(csv.reader(StringIO(response.get_data(as_text=True).lstrip('\ufeff'))))
+
+
+def test_export_orders_csv_is_text_csv(login):
+    response = login('manager@example.com').get('/export_orders_csv')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/csv'
+    assert response.headers['Content-Disposition'] == 'attachment; filename=orders.csv'
+    header, *rows = read_csv(response)
+    assert len(rows) == 1
+
+
+def test_export_orders_csv_escapes_formulas(app, login):
+    with app.app_context():
+        client = Client.query.filter_by(email='client@example.com').one()
+        client.name = '=HYPERLINK("http://example.com")'
+        client.phone = '+79001234567'
+        db.session.commit()
+    header, row = read_csv(login('manager@example.com').get('/export_orders_csv'))
+    assert row[header.index('Клиент')] == '\'=HYPERLINK("http://example.com")'
+    assert row[header.index('Телефон')] == "'+79001234567"
+    assert row[header.index('Марка')] == 'Skoda'
+    assert row[header.index('Цена')] == '1000.0'
+
+
+@pytest.mark.parametrize('args', [
+    {'date_from': '2030-02-30'},
+    {'date_from': '2030-01-01', 'date_to': '2030-03-01'},
+    {'date_from': '2030-01-02', 'date_to': '2030-01-01'},
+])
+def test_export_orders_rejects_bad_period(login, args):
+    assert login('manager@example.com').get('/export_orders', query_string=args).status_code == 400
+
+
+def test_export_orders_single_date_is_one_day(login):
+    day_before_order = (next_workday() - timedelta(days=1)).isoformat()
+    response = login('manager@example.com').get('/export_orders', query_string={'date_from': day_before_order})
+    assert response.status_code == 302
@@ -0,0 +1,76 @@
+"""
+Тесты /metrics.
+
+Этот файл проверяет доступ к /metrics по адресу клиента и токену и
+суммирование метрик рабочих процессов через общий файл SQLite: счетчики
+завершившихся процессов сохраняются, а их показатели-состояния отбрасываются.
+"""
+
+import subprocess
+import sys
+from app import create_app
+from app.instrumentation import SqliteMetricsStore
+from config import ProductionConfig
+
+REMOTE = {'REMOTE_ADDR': '203.0.113.9'}
+
+
+def test_forwarded_for_is_ignored_by_default(app):
+    client = app.test_client()
+    assert client.get('/metrics', environ_base=REMOTE).status_code == 403
+    response = client.get('/metrics', environ_base=REMOTE, headers={'X-Forwarded-For': '127.0.0.1'})
+    assert response.status_code == 403
+    assert client.get('/metrics').status_code == 200
+
+
+def test_production_does_not_trust_forwarded_for():
+    assert 'PROXY_FIX_X_FOR' not in vars(ProductionConfig)
+
+
+def dead_pid():
+    process = subprocess.Popen([sys.executable, '-c', 'pass'])
+    process.wait()
+    return process.pid
+
+
+def test_counters_are_summed_over_workers(tmp_path):
+    path = str(tmp_path / 'metrics.db')
+    first, second = SqliteMetricsStore(path), SqliteMetricsStore(path)
+    first.publish([('db_pool_checkouts_total', 'db_pool_checkouts_total', '', 3),
+                   ('db_checked_out', 'db_checked_out', '', 1)])
+    second.publish([('db_pool_checkouts_total', 'db_pool_checkouts_total', '', 4),
+                    ('db_checked_out', 'db_checked_out', '', 2)])
+    first.publish([('db_pool_checkouts_total', 'db_pool_checkouts_total', '', 5),
+                   ('db_checked_out', 'db_checked_out', '', 0)])
+    assert {name: value for _, name, _, value in second.collect()} == {
+        'db_pool_checkouts_total': 9, 'db_checked_out': 2,
+    }
+
+
+def test_dead_worker_counters_are_archived(tmp_path):
+    path = str(tmp_path / 'metrics.db')
+    live = SqliteMetricsStore(path)
+    live.publish([('db_pool_checkouts_total', 'db_pool_checkouts_total', '', 1)])
+    live._connection.executemany(
+        'INSERT INTO metric_samples (worker, seq, family, name, labels, value, gauge) VALUES (?, ?, ?, ?, ?, ?, ?)',
+        [(f'{dead_pid()}:0', 0, 'db_pool_checkouts_total', 'db_pool_checkouts_total', '', 10, 0),
+         (f'{dead_pid()}:0', 1, 'db_checked_out', 'db_checked_out', '', 5, 1)]
+    )
+    expected = {'db_pool_checkouts_total': 11}
+    assert {name: value for _, name, _, value in live.collect()} == expected
+    live.publish([('db_pool_checkouts_total', 'db_pool_checkouts_total', '', 2)])
+    assert {name: value for _, name, _, value in live.collect()} == {'db_pool_checkouts_total': 12}
+
+
+def test_metrics_endpoint_sums_workers(tmp_path):
+    app = create_app('testing', {
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + str(tmp_path / 'test.db'),
+        'METRICS_BACKEND': 'sqlite',
+        'METRICS_DB_PATH': str(tmp_path / 'metrics.db'),
+    })
+    other = SqliteMetricsStore(str(tmp_path / 'metrics.db'))
+    other.publish([('db_pool_checkouts_total', 'db_pool_checkouts_total', '', 1000)])
+    body = app.test_client().get('/metrics').get_data(as_text=True)
+    assert '# TYPE db_pool_checkouts_total counter' in body
+    checkouts = next(line for line in body.splitlines() if line.startswith('db_pool_checkouts_total '))
+    assert float(checkouts.split()[1]) >= 1000
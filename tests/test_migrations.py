@@ -0,0 +1,76 @@
+"""
+Тесты миграций и индексов.
+
+Этот файл проверяет, что миграции применяются повторно без изменений, что
+каждый индекс моделей создается какой-либо миграцией, и что планы горячих
+запросов (EXPLAIN QUERY PLAN в SQLite) используют индексы, а не полный
+просмотр таблицы. Столбцы внешних ключей (например, order_history.client_id)
+Firebird индексирует сам, поэтому здесь проверяются только индексы моделей.
+"""
+
+from datetime import date, datetime, timedelta
+import pytest
+from sqlalchemy import text
+from app import db
+from app.migrations import MIGRATIONS, upgrade
+from app.models import Client, Employee, Order, Task
+
+
+def test_upgrade_is_idempotent(app):
+    with app.app_context():
+        applied = upgrade()
+        assert [version for version, _ in applied] == [version for version, _, _ in MIGRATIONS]
+        assert upgrade() == []
+
+
+def test_every_model_index_is_created_by_a_migration(app):
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        with db.engine.begin() as connection:
+            for model in (Employee, Client, Order, Task):
+                for index in model.__table__.indexes:
+                    index.drop(connection)
+        upgrade()
+        with db.engine.connect() as connection:
+            existing = {row[0] for row in connection.execute(text("SELECT name FROM sqlite_master WHERE type = 'index'"))}
+    declared = {index.name for model in (Employee, Client, Order, Task) for index in model.__table__.indexes}
+    assert declared <= existing
+
+
+HOT_QUERIES = {
+    'schedule_range': lambda: (
+        db.session.query(Order.appointment_date, Order.appointment_time, Order.end_time)
+        .filter(Order.appointment_date >= date(2024, 1, 1), Order.appointment_date <= date(2024, 1, 31))
+    ),
+    'mechanic_tasks_by_status': lambda: (
+        db.session.query(Task.id).filter(Task.employee_id == 2, Task.status == 'pending')
+    ),
+    'orders_page': lambda: (
+        Order.query.order_by(Order.created_at.desc(), Order.id.desc()).limit(51)
+    ),
+    'client_orders_page': lambda: (
+        Order.query.filter(Order.client_id == 1).order_by(Order.created_at.desc(), Order.id.desc()).limit(51)
+    ),
+    'employees_page': lambda: (
+        Employee.query.filter(Employee.role == 'mechanic')
+        .order_by(Employee.created_at.desc(), Employee.id.desc()).limit(51)
+    ),
+    'clients_page': lambda: (
+        Client.query.order_by(Client.created_at.desc(), Client.id.desc()).limit(51)
+    ),
+    'orders_created_between': lambda: (
+        db.session.query(Order.id)
+        .filter(Order.created_at >= datetime(2024, 1, 1), Order.created_at < datetime(2024, 1, 1) + timedelta(days=31))
+    ),
+}
+
+
+@pytest.mark.parametrize('name', sorted(HOT_QUERIES))
+def test_hot_query_uses_index(app, name):
+    with app.app_context():
+        upgrade()
+        statement = HOT_QUERIES[name]().statement.compile(db.engine, compile_kwargs={'literal_binds': True})
+        plan = [row[-1] for row in db.session.execute(text(f'EXPLAIN QUERY PLAN {statement}'))]
+    full_scans = [step for step in plan if step.startswith('SCAN') and 'INDEX' not in step]
+    assert not full_scans, plan
@@ -0,0 +1,48 @@
+"""
+Тесты числа SQL-запросов на страницах со списками.
+
+Этот файл проверяет, что число запросов на странице не зависит от числа
+строк: связи заказов и задач загружаются заранее, а не отдельным запросом
+на каждую строку шаблона.
+"""
+
+from datetime import date, time, timedelta
+import pytest
+from app import db
+from app.models import Car, Client, Employee
+from .conftest import add_order
+
+PAGES = [
+    ('client@example.com', '/client_dashboard'),
+    ('client@example.com', '/order_history'),
+    ('mechanic1@example.com', '/mechanic_dashboard'),
+    ('mechanic1@example.com', '/mechanic_all_orders'),
+    ('mechanic1@example.com', '/tasks'),
+    ('manager@example.com', '/manage_appointments'),
+    ('manager@example.com', '/view_orders'),
+]
+
+
+def add_orders(app, count):
+    with app.app_context():
+        client = Client.query.filter_by(email='client@example.com').one()
+        car = Car.query.filter_by(client_id=client.id).first()
+        mechanic = Employee.query.filter_by(email='mechanic1@example.com').one()
+        start = date.today() - timedelta(days=count)
+        for offset in range(count):
+            add_order(client.id, car.id, mechanic.id, start + timedelta(days=offset), time(9, 0), time(10, 0))
+        db.session.commit()
+
+
+@pytest.mark.parametrize('email, url', PAGES)
+def test_page_query_count_does_not_grow_with_rows(app, login, count_queries, email, url):
+    client = login(email)
+    assert client.get(url).status_code == 200
+    with count_queries() as few_rows:
+        assert client.get(url).status_code == 200
+
+    add_orders(app, 20)
+    with count_queries() as many_rows:
+        assert client.get(url).status_code == 200
+
+    assert len(many_rows) == len(few_rows), many_rows
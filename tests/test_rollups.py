@@ -0,0 +1,77 @@
+"""
+Тесты дневных сводок.
+
+Этот файл проверяет, что удаление заказа вычитает из сводки ровно то, что
+было учтено при записи, даже если цены услуг или модель автомобиля с тех
+пор изменились, что статус задачи принимается только из списка допустимых,
+и что запись и смена статуса не обновляют общие строки daily_stats, а
+перенос изменений в сводку не меняет итогов.
+"""
+
+from app import db
+from app.booking import create_booking
+from app.catalog import get_car_model, get_services, services_cache
+from app.models import Car, CarModel, DailyStat, Order, Service, StatDelta, Task
+from app.rollups import fold_stat_deltas, summarize_stats
+from .conftest import next_workday
+
+
+def stat_totals():
+    return {
+        (metric, item_id): (quantity, amount)
+        for metric, item_id, _, quantity, amount in summarize_stats(['orders', 'service', 'car_model'])
+    }
+
+
+def test_deleted_order_is_subtracted_at_booked_values(app, login):
+    with app.app_context():
+        order = create_booking(1, get_car_model(1), 2020, 'VIN00000000000200', 'C200CC',
+                               next_workday(), '13:00', get_services([1, 2]))
+        order_id = order.id
+        assert stat_totals()[('orders', 0)] == (1, 1500)
+
+        db.session.add(CarModel(brand='Skoda', model_name='Kodiaq'))
+        db.session.query(Service).filter(Service.id == 1).update({'price': 3000})
+        db.session.query(Car).filter(Car.vin == 'VIN00000000000200').update({'car_model_id': 2})
+        db.session.commit()
+        services_cache.invalidate()
+
+    response = login('manager@example.com').post(f'/delete_appointment/{order_id}')
+    assert response.status_code == 302
+
+    with app.app_context():
+        assert db.session.get(Order, order_id) is None
+        assert all(totals == (0, 0) for totals in stat_totals().values()), stat_totals()
+
+
+def test_unknown_task_status_is_rejected(app, login):
+    client = login('mechanic1@example.com')
+    with app.app_context():
+        task_id = Task.query.first().id
+    assert client.post(f'/update_task_status/{task_id}', data={'status': 'archived'}).status_code == 400
+    assert client.post(f'/update_task_status/{task_id}', data={'status': 'completed'}).status_code == 302
+    with app.app_context():
+        assert db.session.get(Task, task_id).status == 'completed'
+
+
+def test_booking_and_task_status_only_append_stat_deltas(app, login, count_queries):
+    with app.app_context():
+        car_model, services = get_car_model(1), get_services([1, 2])
+        with count_queries() as statements:
+            order = create_booking(1, car_model, 2020, 'VIN00000000000300', 'C300CC',
+                                   next_workday(), '14:00', services)
+        task_id = order.tasks[0].id
+    assert not [statement for statement in statements if 'daily_stats' in statement], statements
+
+    client = login('mechanic1@example.com')
+    with count_queries() as statements:
+        assert client.post(f'/update_task_status/{task_id}', data={'status': 'in_progress'}).status_code == 302
+    assert not [statement for statement in statements if 'daily_stats' in statement], statements
+
+    with app.app_context():
+        before = stat_totals()
+        assert before[('orders', 0)] == (1, 1500)
+        assert fold_stat_deltas() > 0
+        assert StatDelta.query.count() == 0
+        assert DailyStat.query.count() > 0
+        assert stat_totals() == before
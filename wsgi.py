@@ -0,0 +1,13 @@
+"""
+Точка входа WSGI для производства.
+
+Этот файл создает приложение с конфигурацией из переменной окружения FLASK_CONFIG
+(по умолчанию 'production') для запуска под gunicorn:
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+"""
+
+import os
+from app import create_app
+
+app = create_app(os.environ.get('FLASK_CONFIG', 'production'))